@@ -39,6 +39,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "zodbapp.middleware.RequestProfilingMiddleware",
     "zodbapp.middleware.ZODBTransactionMiddleware",
 ]
 
@@ -65,7 +66,7 @@ WSGI_APPLICATION = "config.wsgi.application"
 
 DATABASES = {
     "default": {
-        "ENGINE": "django.contrib.gis.db.backends.postgis",
+        "ENGINE": env("DATABASE_ENGINE", default="django.contrib.gis.db.backends.postgis"),
         "NAME": env("POSTGRES_DB", default="gis"),
         "USER": env("POSTGRES_USER", default="gis"),
         "PASSWORD": env("POSTGRES_PASSWORD", default="gis"),
@@ -87,8 +88,131 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 
 # ZODB configuration
+# "file" opens ZODB_FILE_PATH directly (single process); "zeo" connects to a ZEO server
+ZODB_STORAGE = env("ZODB_STORAGE", default="file")
 ZODB_FILE_PATH = env(
     "ZODB_FILE_PATH", default=str(BASE_DIR / "var" / "zodb.fs")
 )
-
-
+ZODB_POOL_SIZE = env.int("ZODB_POOL_SIZE", default=7)
+ZODB_CACHE_SIZE = env.int("ZODB_CACHE_SIZE", default=400)
+# Memory budget per connection cache; 0 means only ZODB_CACHE_SIZE (object count) applies
+ZODB_CACHE_SIZE_BYTES = env.int("ZODB_CACHE_SIZE_BYTES", default=0)
+ZODB_METRICS_ENABLED = env.bool("ZODB_METRICS_ENABLED", default=DEBUG)
+# Times a request or ZODBManager.attempts() block is re-run after a ConflictError,
+# with full-jitter exponential backoff starting at BACKOFF_MS
+ZODB_CONFLICT_RETRIES = env.int("ZODB_CONFLICT_RETRIES", default=3)
+ZODB_CONFLICT_BACKOFF_MS = env.float("ZODB_CONFLICT_BACKOFF_MS", default=10.0)
+# Group commit: coalesce concurrent creates arriving within WINDOW_MS (or MAX_BATCH of them)
+# into one ZODB transaction and one multi-row PostGIS insert
+ZODB_GROUP_COMMIT_ENABLED = env.bool("ZODB_GROUP_COMMIT_ENABLED", default=False)
+ZODB_GROUP_COMMIT_WINDOW_MS = env.float("ZODB_GROUP_COMMIT_WINDOW_MS", default=5.0)
+ZODB_GROUP_COMMIT_MAX_BATCH = env.int("ZODB_GROUP_COMMIT_MAX_BATCH", default=64)
+# Per-request phase timings (SQL, ZODB open/commit, app) in a Server-Timing header, and the
+# SLOWEST requests per process at /api/_debug/requests (shown when ZODB_METRICS_ENABLED)
+REQUEST_PROFILING_ENABLED = env.bool("REQUEST_PROFILING_ENABLED", default=False)
+REQUEST_PROFILING_SLOWEST = env.int("REQUEST_PROFILING_SLOWEST", default=50)
+# Fraction of requests whose stack is sampled every INTERVAL_MS; those slower than
+# THRESHOLD_MS leave a collapsed-stack (flamegraph) file in REQUEST_PROFILING_DIR
+REQUEST_PROFILING_SAMPLE_RATE = env.float("REQUEST_PROFILING_SAMPLE_RATE", default=0.0)
+REQUEST_PROFILING_SAMPLE_INTERVAL_MS = env.float("REQUEST_PROFILING_SAMPLE_INTERVAL_MS", default=5.0)
+REQUEST_PROFILING_SAMPLE_THRESHOLD_MS = env.float("REQUEST_PROFILING_SAMPLE_THRESHOLD_MS", default=250.0)
+REQUEST_PROFILING_DIR = env("REQUEST_PROFILING_DIR", default=str(BASE_DIR / "var" / "profiles"))
+
+ZEO_ADDRESS = env("ZEO_ADDRESS", default="127.0.0.1:8100")
+ZEO_WAIT_TIMEOUT = env.float("ZEO_WAIT_TIMEOUT", default=30.0)
+# Persistent client cache files live here; empty means an in-memory cache per process
+ZEO_CLIENT_CACHE_DIR = env("ZEO_CLIENT_CACHE_DIR", default=str(BASE_DIR / "var" / "zeo-cache"))
+ZEO_CLIENT_CACHE_NAME = env("ZEO_CLIENT_CACHE_NAME", default="places")
+ZEO_CLIENT_CACHE_SIZE_MB = env.int("ZEO_CLIENT_CACHE_SIZE_MB", default=200)
+ZEO_CLIENT_CACHE_SLOTS = env.int("ZEO_CLIENT_CACHE_SLOTS", default=64)
+
+
+
+# Number of place OIDs each worker reserves from the shared counter at a time
+PLACES_OID_BLOCK_SIZE = env.int("PLACES_OID_BLOCK_SIZE", default=1000)
+
+# Places written per ZODB commit / PostGIS bulk insert by the bulk endpoint
+PLACES_BULK_BATCH_SIZE = env.int("PLACES_BULK_BATCH_SIZE", default=1000)
+
+# Spatial index used by create/nearby: "postgis" (PlaceIndex) or "zodb" (geohash cells in ZODB)
+PLACES_SPATIAL_BACKEND = env("PLACES_SPATIAL_BACKEND", default="postgis")
+
+# gRPC server started by `manage.py rungrpc`
+PLACES_GRPC_ADDRESS = env("PLACES_GRPC_ADDRESS", default="[::]:50051")
+PLACES_GRPC_WORKERS = env.int("PLACES_GRPC_WORKERS", default=10)
+
+# Default and maximum page size for /api/places/nearby
+PLACES_NEARBY_PAGE_SIZE = env.int("PLACES_NEARBY_PAGE_SIZE", default=50)
+PLACES_NEARBY_MAX_PAGE_SIZE = env.int("PLACES_NEARBY_MAX_PAGE_SIZE", default=500)
+# Largest buffer and longest line accepted by POST /api/places/corridor
+PLACES_CORRIDOR_MAX_BUFFER_M = env.float("PLACES_CORRIDOR_MAX_BUFFER_M", default=5000.0)
+PLACES_CORRIDOR_MAX_POINTS = env.int("PLACES_CORRIDOR_MAX_POINTS", default=10000)
+# Named regions for /api/places/within: stored shapes are simplified with this tolerance
+# (degrees), and parsed/prepared shapes are kept per process for CACHE_TTL seconds
+PLACES_REGION_SIMPLIFY_TOLERANCE = env.float("PLACES_REGION_SIMPLIFY_TOLERANCE", default=0.0001)
+PLACES_REGION_CACHE_TTL = env.float("PLACES_REGION_CACHE_TTL", default=300.0)
+PLACES_REGION_CACHE_MAX_ENTRIES = env.int("PLACES_REGION_CACHE_MAX_ENTRIES", default=256)
+PLACES_REGION_MAX_POINTS = env.int("PLACES_REGION_MAX_POINTS", default=100000)
+# Most query points accepted by one POST /api/places/nearby/batch
+PLACES_NEARBY_BATCH_MAX_QUERIES = env.int("PLACES_NEARBY_BATCH_MAX_QUERIES", default=1000)
+
+# Opt-in cache for nearby pages. Queries snap to a GRID_DEG grid and KM_STEP radius steps;
+# inserts invalidate the REGION_DEG regions they fall in. An empty ALIAS keeps the LRU in
+# process, otherwise pages and generations live in that Django cache (shared by workers).
+PLACES_NEARBY_CACHE_ENABLED = env.bool("PLACES_NEARBY_CACHE_ENABLED", default=False)
+PLACES_NEARBY_CACHE_ALIAS = env("PLACES_NEARBY_CACHE_ALIAS", default="")
+PLACES_NEARBY_CACHE_GRID_DEG = env.float("PLACES_NEARBY_CACHE_GRID_DEG", default=0.005)
+PLACES_NEARBY_CACHE_KM_STEP = env.float("PLACES_NEARBY_CACHE_KM_STEP", default=0.5)
+PLACES_NEARBY_CACHE_MAX_KM = env.float("PLACES_NEARBY_CACHE_MAX_KM", default=25.0)
+PLACES_NEARBY_CACHE_REGION_DEG = env.float("PLACES_NEARBY_CACHE_REGION_DEG", default=0.1)
+PLACES_NEARBY_CACHE_TTL = env.float("PLACES_NEARBY_CACHE_TTL", default=30.0)
+PLACES_NEARBY_CACHE_MAX_ENTRIES = env.int("PLACES_NEARBY_CACHE_MAX_ENTRIES", default=10000)
+
+# "sync" writes PlaceIndex rows in the request; "outbox" queues them in ZODB for `manage.py run_indexer`
+PLACES_INDEX_MODE = env("PLACES_INDEX_MODE", default="sync")
+PLACES_INDEXER_BATCH_SIZE = env.int("PLACES_INDEXER_BATCH_SIZE", default=1000)
+
+# New places containers are split into this many OOBTree shards by OID hash (1 = single tree)
+PLACES_SHARDS = env.int("PLACES_SHARDS", default=16)
+
+# Vector tiles at /api/places/tiles/{z}/{x}/{y}.mvt (PostGIS backend). Rendered tiles are kept in
+# an in-process LRU and, unless CACHE_DIR is empty, as z/x/y.mvt files shared by all workers.
+# New places drop the tiles they touch at every zoom up to MAX_ZOOM.
+PLACES_TILE_MAX_ZOOM = env.int("PLACES_TILE_MAX_ZOOM", default=18)
+PLACES_TILE_EXTENT = env.int("PLACES_TILE_EXTENT", default=4096)
+PLACES_TILE_BUFFER = env.int("PLACES_TILE_BUFFER", default=64)
+PLACES_TILE_CACHE_DIR = env("PLACES_TILE_CACHE_DIR", default=str(BASE_DIR / "var" / "tiles"))
+PLACES_TILE_MEMORY_TTL = env.float("PLACES_TILE_MEMORY_TTL", default=300.0)
+PLACES_TILE_MEMORY_MAX_ENTRIES = env.int("PLACES_TILE_MEMORY_MAX_ENTRIES", default=2000)
+# Tile files older than this (seconds) are rendered again, bounding staleness from anything that
+# changed PlaceIndex without indexing a place (e.g. reindex_places repairs); 0 keeps them forever
+PLACES_TILE_DISK_TTL = env.float("PLACES_TILE_DISK_TTL", default=86400.0)
+
+# Cluster pyramid for /api/places/clusters: CELLS_PER_TILE grid cells across each map tile at
+# zooms 0..MAX_ZOOM. Counted by run_indexer with PLACES_INDEX_MODE=outbox; otherwise kept by
+# running `manage.py rebuild_clusters` periodically
+PLACES_CLUSTERS_ENABLED = env.bool("PLACES_CLUSTERS_ENABLED", default=False)
+PLACES_CLUSTER_MAX_ZOOM = env.int("PLACES_CLUSTER_MAX_ZOOM", default=16)
+PLACES_CLUSTER_CELLS_PER_TILE = env.int("PLACES_CLUSTER_CELLS_PER_TILE", default=4)
+PLACES_CLUSTER_MAX_RESULTS = env.int("PLACES_CLUSTER_MAX_RESULTS", default=5000)
+
+# Reverse geofence lookup for every indexed place (places.signals.geofences_matched). Fences are
+# bucketed into GRID_DEG cells in process; fences wider than MAX_CELLS cells are tested by envelope.
+# The fence table is re-checked for changes every REFRESH_SECONDS and the index rebuilt in a thread.
+PLACES_GEOFENCES_ENABLED = env.bool("PLACES_GEOFENCES_ENABLED", default=True)
+PLACES_GEOFENCE_GRID_DEG = env.float("PLACES_GEOFENCE_GRID_DEG", default=0.05)
+PLACES_GEOFENCE_MAX_CELLS = env.int("PLACES_GEOFENCE_MAX_CELLS", default=4096)
+PLACES_GEOFENCE_REFRESH_SECONDS = env.float("PLACES_GEOFENCE_REFRESH_SECONDS", default=30.0)
+
+# Text search (/api/places/search) over an inverted index in ZODB: each query token also matches
+# up to MAX_EXPANSIONS terms it prefixes; with lat/lng/km, text hits are intersected with the
+# SPATIAL_LIMIT closest places and closeness adds up to DISTANCE_WEIGHT to the BM25 score
+PLACES_SEARCH_MAX_EXPANSIONS = env.int("PLACES_SEARCH_MAX_EXPANSIONS", default=50)
+PLACES_SEARCH_SPATIAL_LIMIT = env.int("PLACES_SEARCH_SPATIAL_LIMIT", default=10000)
+PLACES_SEARCH_DISTANCE_WEIGHT = env.float("PLACES_SEARCH_DISTANCE_WEIGHT", default=1.0)
+PLACES_SEARCH_ADMIN_LIMIT = env.int("PLACES_SEARCH_ADMIN_LIMIT", default=1000)
+
+# Places read per ZODB chunk (and rows per Parquet row group) by export_places and
+# /api/places/export; the endpoint exposes every place, so it is off outside DEBUG by default
+PLACES_EXPORT_CHUNK_SIZE = env.int("PLACES_EXPORT_CHUNK_SIZE", default=5000)
+PLACES_EXPORT_HTTP_ENABLED = env.bool("PLACES_EXPORT_HTTP_ENABLED", default=DEBUG)
@@ -6,4 +6,7 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 
 application = get_wsgi_application()
 
+# Start building the geofence index before the first request needs it.
+from places import geofences  # noqa: E402
 
+geofences.warm()
@@ -1,5 +1,7 @@
+from django.conf import settings
 from django.contrib import admin
 
+from . import search
 from .models import PlaceIndex
 
 
@@ -8,4 +10,13 @@ class PlaceIndexAdmin(admin.ModelAdmin):
     list_display = ("oid", "name", "created_at")
     search_fields = ("oid", "name")
 
+    def get_search_results(self, request, queryset, search_term):
+        # Name and description matches come from the ZODB text index instead
+        # of a LIKE '%..%' scan; an exact OID still matches directly.
+        if not search_term:
+            return queryset, False
+        hits = search.search(request.zodb_root, search_term, settings.PLACES_SEARCH_ADMIN_LIMIT)
+        oids = [hit.oid for hit in hits] + [search_term.strip()]
+        return queryset.filter(oid__in=oids), False
+
 
@@ -5,4 +5,20 @@ class PlacesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "places"
 
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
 
+        from zodbapp.metrics import registry
+
+        from . import cache, geofences, outbox, regions, tiles
+        from .models import Geofence, Region
+        from .signals import places_indexed
+
+        registry.add_collector(outbox.lag)
+        places_indexed.connect(cache.on_places_indexed, dispatch_uid="places.cache")
+        places_indexed.connect(tiles.on_places_indexed, dispatch_uid="places.tiles")
+        places_indexed.connect(geofences.on_places_indexed, dispatch_uid="places.geofences")
+        post_save.connect(geofences.on_geofence_changed, sender=Geofence, dispatch_uid="places.geofences.save")
+        post_delete.connect(geofences.on_geofence_changed, sender=Geofence, dispatch_uid="places.geofences.delete")
+        post_save.connect(regions.on_region_changed, sender=Region, dispatch_uid="places.regions.save")
+        post_delete.connect(regions.on_region_changed, sender=Region, dispatch_uid="places.regions.delete")
@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import geohash
+from .spatial import EARTH_RADIUS_M
+
+
+KM_PER_DEGREE = EARTH_RADIUS_M / 1000.0 * math.pi / 180.0
+
+
+@dataclass
+class CachedPage:
+    body: bytes
+    etag: str
+    last_modified: float
+
+
+class LocalStore:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._generations: dict[str, int] = {}
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, keys: Iterable[str]) -> None:
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def generations(self, keys: list[str]) -> list[int]:
+        with self._lock:
+            return [self._generations.get(key, 0) for key in keys]
+
+    def bump(self, keys: Iterable[str]) -> None:
+        with self._lock:
+            for key in keys:
+                self._generations[key] = self._generations.get(key, 0) + 1
+
+
+class DjangoCacheStore:
+    # Shared across workers, so an insert handled by one process invalidates
+    # pages cached by all of them.
+    def __init__(self, alias: str):
+        self.cache = caches[alias]
+
+    def get(self, key: str) -> Any:
+        return self.cache.get(key)
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        self.cache.set(key, value, ttl)
+
+    def generations(self, keys: list[str]) -> list[int]:
+        found = self.cache.get_many(keys)
+        return [found.get(key, 0) for key in keys]
+
+    def bump(self, keys: Iterable[str]) -> None:
+        for key in keys:
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                if not self.cache.add(key, 1, timeout=None):
+                    self.cache.incr(key)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                alias = settings.PLACES_NEARBY_CACHE_ALIAS
+                if alias:
+                    _store = DjangoCacheStore(alias)
+                else:
+                    _store = LocalStore(settings.PLACES_NEARBY_CACHE_MAX_ENTRIES)
+    return _store
+
+
+def enabled() -> bool:
+    return settings.PLACES_NEARBY_CACHE_ENABLED
+
+
+def snap(lat: float, lng: float, km: float) -> tuple[float, float, float]:
+    grid = settings.PLACES_NEARBY_CACHE_GRID_DEG
+    step = settings.PLACES_NEARBY_CACHE_KM_STEP
+    # The centre moves by up to half a cell on each axis, at most
+    # grid * sqrt(2) / 2 degrees of latitude away. Growing the radius by that
+    # much before rounding up means the snapped circle always contains the
+    # requested one; it can also return places somewhat beyond it.
+    shift_km = grid * math.sqrt(2) / 2 * KM_PER_DEGREE
+    return (
+        round(round(lat / grid) * grid, 9),
+        round(round(lng / grid) * grid, 9),
+        round(math.ceil((km + shift_km) / step) * step, 9),
+    )
+
+
+def cacheable(km: float) -> bool:
+    return enabled() and km <= settings.PLACES_NEARBY_CACHE_MAX_KM
+
+
+def _region_key(row: int, col: int) -> str:
+    return f"places:nearby:gen:{row}:{col}"
+
+
+def _region(lat: float, lng: float) -> tuple[int, int]:
+    size = settings.PLACES_NEARBY_CACHE_REGION_DEG
+    return math.floor(lat / size), math.floor(((lng + 180.0) % 360.0) / size)
+
+
+def _regions_covering(lat: float, lng: float, km: float) -> list[str]:
+    size = settings.PLACES_NEARBY_CACHE_REGION_DEG
+    columns = math.ceil(360.0 / size)
+    min_lat, min_lng, max_lat, max_lng = geohash.bounding_box(lat, lng, km)
+    rows = range(math.floor(min_lat / size), math.floor(max_lat / size) + 1)
+    # Bounding box longitudes are unwrapped; fold them back across the antimeridian.
+    cols = sorted(
+        {col % columns for col in range(math.floor((min_lng + 180.0) / size), math.floor((max_lng + 180.0) / size) + 1)}
+    )
+    return [_region_key(row, col) for row in rows for col in cols]
+
+
+def page_key(lat: float, lng: float, km: float, *params: Any) -> str:
+    # The key embeds the generation of every region the query circle touches,
+    # so bumping one region orphans exactly the pages that could contain it.
+    store = get_store()
+    regions = _regions_covering(lat, lng, km)
+    generations = store.generations(regions)
+    raw = repr((lat, lng, km, params, tuple(zip(regions, generations))))
+    return "places:nearby:page:" + hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def get_page(key: str) -> Optional[CachedPage]:
+    return get_store().get(key)
+
+
+def set_page(key: str, body: bytes) -> CachedPage:
+    page = CachedPage(
+        body=body,
+        etag='"%s"' % hashlib.sha1(body).hexdigest()[:20],
+        last_modified=time.time(),
+    )
+    get_store().set(key, page, settings.PLACES_NEARBY_CACHE_TTL)
+    return page
+
+
+def invalidate_points(points: Iterable[tuple[float, float]]) -> None:
+    if not enabled():
+        return
+    get_store().bump({_region_key(*_region(lat, lng)) for lat, lng in points})
+
+
+def on_places_indexed(sender, rows, **kwargs) -> None:
+    invalidate_points((row.lat, row.lng) for row in rows)
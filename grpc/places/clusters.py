@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import math
+from collections import defaultdict
+from typing import Any, Iterable
+
+from django.conf import settings
+from django.db import connection, transaction as db_transaction
+from django.db.models import Q
+
+from .models import PlaceCluster, PlaceIndex
+from .spatial import PlaceRow, get_backend
+from .tiles import MAX_LAT, tile_fraction
+
+
+# The pyramid is a grid per zoom level, PLACES_CLUSTER_CELLS_PER_TILE cells
+# across each web-mercator tile. A cell row holds the point count, coordinate
+# sums (so the centroid survives incremental updates) and the earliest OID
+# indexed into it. A viewport reads only the cells it covers.
+UPSERT_CHUNK = 500
+
+
+def enabled() -> bool:
+    # Kept next to PlaceIndex, and rebuilt from it.
+    return settings.PLACES_CLUSTERS_ENABLED and get_backend().name == "postgis"
+
+
+def _cells(zoom: int) -> int:
+    return 2**zoom * settings.PLACES_CLUSTER_CELLS_PER_TILE
+
+
+def cell_for(lat: float, lng: float, zoom: int) -> tuple[int, int]:
+    cells = _cells(zoom)
+    fx, fy = tile_fraction(lat, lng, zoom)
+    per_tile = settings.PLACES_CLUSTER_CELLS_PER_TILE
+    cx = min(max(math.floor(fx * per_tile), 0), cells - 1)
+    cy = min(max(math.floor(fy * per_tile), 0), cells - 1)
+    return cx, cy
+
+
+def _aggregate(rows: Iterable[PlaceRow]) -> list[tuple]:
+    # Aggregate the rows per cell first: a batch usually lands in few cells at
+    # low zoom, so each zoom costs a handful of rows. Sorted so concurrent
+    # writers lock cells in the same order.
+    cells: dict[tuple[int, int, int], list[Any]] = defaultdict(lambda: [0, 0.0, 0.0, None])
+    for row in rows:
+        for zoom in range(settings.PLACES_CLUSTER_MAX_ZOOM + 1):
+            cx, cy = cell_for(row.lat, row.lng, zoom)
+            agg = cells[(zoom, cx, cy)]
+            agg[0] += 1
+            agg[1] += row.lat
+            agg[2] += row.lng
+            if agg[3] is None:
+                agg[3] = row.oid
+    return [(*key, *agg) for key, agg in sorted(cells.items())]
+
+
+def add_rows(rows: Iterable[PlaceRow]) -> None:
+    # Called by the outbox drain and reindex_places, in the transaction that
+    # upserts the rows into PlaceIndex, never inside a request: the low zooms
+    # are a few rows every place lands in, so counting in request
+    # transactions would serialize all creates.
+    values = _aggregate(rows)
+    if not values:
+        return
+    table = connection.ops.quote_name(PlaceCluster._meta.db_table)
+    with db_transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, len(values), UPSERT_CHUNK):
+            chunk = values[start : start + UPSERT_CHUNK]
+            cursor.execute(
+                f"INSERT INTO {table} (zoom, cell_x, cell_y, count, sum_lat, sum_lng, oid) "
+                f"VALUES {', '.join(['(%s, %s, %s, %s, %s, %s, %s)'] * len(chunk))} "
+                f"ON CONFLICT (zoom, cell_x, cell_y) DO UPDATE SET "
+                f"count = {table}.count + EXCLUDED.count, "
+                f"sum_lat = {table}.sum_lat + EXCLUDED.sum_lat, "
+                f"sum_lng = {table}.sum_lng + EXCLUDED.sum_lng",
+                [value for row in chunk for value in row],
+            )
+
+
+def remove_rows(rows: Iterable[PlaceRow]) -> None:
+    # The reverse of add_rows, for rows deleted from PlaceIndex or moved
+    # (reindex_places). Emptied cells are dropped; a cell keeps its
+    # representative oid even if that place was removed, until
+    # rebuild_clusters runs.
+    values = [value[:6] for value in _aggregate(rows)]
+    if not values:
+        return
+    table = connection.ops.quote_name(PlaceCluster._meta.db_table)
+    with db_transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, len(values), UPSERT_CHUNK):
+            chunk = values[start : start + UPSERT_CHUNK]
+            cursor.execute(
+                f"UPDATE {table} SET count = {table}.count - v.count, "
+                f"sum_lat = {table}.sum_lat - v.sum_lat, sum_lng = {table}.sum_lng - v.sum_lng "
+                f"FROM (VALUES {', '.join(['(%s, %s, %s, %s, %s::float8, %s::float8)'] * len(chunk))}) "
+                f"AS v (zoom, cell_x, cell_y, count, sum_lat, sum_lng) "
+                f"WHERE {table}.zoom = v.zoom AND {table}.cell_x = v.cell_x AND {table}.cell_y = v.cell_y",
+                [value for row in chunk for value in row],
+            )
+            cursor.execute(
+                f"DELETE FROM {table} WHERE count <= 0 AND (zoom, cell_x, cell_y) IN "
+                f"({', '.join(['(%s, %s, %s)'] * len(chunk))})",
+                [value for row in chunk for value in row[:3]],
+            )
+
+
+_REBUILD_SQL = """
+INSERT INTO {clusters} (zoom, cell_x, cell_y, count, sum_lat, sum_lng, oid)
+SELECT %(zoom)s, cx, cy, count(*), sum(lat), sum(lng), min(oid)
+FROM (
+    SELECT oid, lat, lng,
+           LEAST(floor((lng + 180.0) / 360.0 * %(cells)s), %(cells)s - 1)::int AS cx,
+           LEAST(GREATEST(floor(
+               (1.0 - asinh(tan(radians(LEAST(GREATEST(lat, -{max_lat}), {max_lat})))) / pi()) / 2.0 * %(cells)s
+           ), 0), %(cells)s - 1)::int AS cy
+    FROM (
+        SELECT oid, ST_Y(location::geometry) AS lat, ST_X(location::geometry) AS lng FROM {places}
+    ) AS points
+) AS grid
+GROUP BY cx, cy
+"""
+
+
+def rebuild(stdout=None) -> int:
+    # PostgreSQL only: recomputes every zoom from PlaceIndex in one
+    # transaction, so readers see either the old pyramid or the new one.
+    sql = _REBUILD_SQL.format(
+        clusters=connection.ops.quote_name(PlaceCluster._meta.db_table),
+        places=connection.ops.quote_name(PlaceIndex._meta.db_table),
+        max_lat=MAX_LAT,
+    )
+    total = 0
+    with db_transaction.atomic(), connection.cursor() as cursor:
+        PlaceCluster.objects.all().delete()
+        for zoom in range(settings.PLACES_CLUSTER_MAX_ZOOM + 1):
+            cursor.execute(sql, {"zoom": zoom, "cells": _cells(zoom)})
+            total += cursor.rowcount
+            if stdout is not None:
+                stdout.write(f"zoom {zoom}: {cursor.rowcount} clusters")
+    return total
+
+
+def _x_ranges(min_lng: float, max_lng: float, zoom: int) -> list[tuple[int, int]]:
+    # A bbox crossing the antimeridian (min_lng > max_lng) covers both ends
+    # of the grid.
+    cells = _cells(zoom)
+    low = cell_for(0.0, min_lng, zoom)[0]
+    high = cell_for(0.0, max_lng, zoom)[0]
+    if min_lng <= max_lng:
+        return [(low, high)]
+    return [(low, cells - 1), (0, high)]
+
+
+def in_bbox(
+    min_lng: float, min_lat: float, max_lng: float, max_lat: float, zoom: int, limit: int
+) -> tuple[list[dict[str, Any]], bool]:
+    zoom = max(0, min(zoom, settings.PLACES_CLUSTER_MAX_ZOOM))
+    # Cell rows grow southwards, so the northern edge gives the lower bound.
+    y_low = cell_for(max_lat, 0.0, zoom)[1]
+    y_high = cell_for(min_lat, 0.0, zoom)[1]
+    x_filter = Q()
+    for low, high in _x_ranges(min_lng, max_lng, zoom):
+        x_filter |= Q(cell_x__gte=low, cell_x__lte=high)
+    rows = list(
+        PlaceCluster.objects.filter(x_filter, zoom=zoom, cell_y__gte=y_low, cell_y__lte=y_high)
+        .order_by("-count")
+        .values_list("count", "sum_lat", "sum_lng", "oid")[: limit + 1]
+    )
+    clusters = [
+        {"lat": sum_lat / count, "lng": sum_lng / count, "count": count, "oid": oid}
+        for count, sum_lat, sum_lng, oid in rows[:limit]
+    ]
+    return clusters, len(rows) > limit
@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import json
+from itertools import islice
+from typing import Any, Iterator, Optional
+
+import transaction
+from django.db import connection as db_connection
+
+from zodbapp.zodb import get_db
+
+from .models import PlaceIndex
+from .spatial import get_backend
+from .store import get_places
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - only the parquet/arrow formats need it
+    pa = pq = None
+
+
+EXPORT_FIELDS = ("oid", "name", "description", "lat", "lng")
+
+
+def _index_coordinates(chunk_size: int) -> Iterator[tuple[str, float, float]]:
+    # A server-side cursor streams PlaceIndex in the same order as the
+    # OOBTree keys: COLLATE "C" compares code points, as Python does.
+    table = db_connection.ops.quote_name(PlaceIndex._meta.db_table)
+    with db_connection.chunked_cursor() as cursor:
+        cursor.execute(
+            f'SELECT oid, ST_Y(location::geometry), ST_X(location::geometry) FROM {table} ORDER BY oid COLLATE "C"'
+        )
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return
+            yield from rows
+
+
+def iter_places(chunk_size: int) -> Iterator[dict[str, Any]]:
+    # Walks the places tree in key ranges of chunk_size, aborting and
+    # minimizing the pickle cache between them, so memory stays flat however
+    # many places there are. Coordinates missing on a Place (stored before
+    # Place had them) are merge-joined from PlaceIndex.
+    tm = transaction.TransactionManager()
+    connection = get_db().open(transaction_manager=tm)
+    index = _index_coordinates(chunk_size) if get_backend().name == "postgis" else iter(())
+    pending: Optional[tuple[str, float, float]] = next(index, None)
+    last = None
+    try:
+        while True:
+            items = get_places(connection.root()).items(min=last)
+            if last is not None:
+                items = (item for item in items if item[0] != last)
+            chunk = list(islice(items, chunk_size))
+            if not chunk:
+                return
+            for oid, place in chunk:
+                while pending is not None and pending[0] < oid:
+                    pending = next(index, None)
+                lat, lng = place.lat, place.lng
+                if (lat is None or lng is None) and pending is not None and pending[0] == oid:
+                    lat, lng = pending[1], pending[2]
+                yield {
+                    "oid": oid,
+                    "name": place.name,
+                    "description": getattr(place, "description", ""),
+                    "lat": lat,
+                    "lng": lng,
+                }
+            last = chunk[-1][0]
+            tm.abort()
+            connection.cacheMinimize()
+    finally:
+        tm.abort()
+        connection.close()
+
+
+def write_ndjson(rows: Iterator[dict[str, Any]], chunk_size: int) -> Iterator[bytes]:
+    while True:
+        batch = list(islice(rows, chunk_size))
+        if not batch:
+            return
+        yield "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in batch).encode("utf-8")
+
+
+def _feature(row: dict[str, Any]) -> dict[str, Any]:
+    geometry = None
+    if row["lat"] is not None and row["lng"] is not None:
+        geometry = {"type": "Point", "coordinates": [row["lng"], row["lat"]]}
+    return {
+        "type": "Feature",
+        "id": row["oid"],
+        "geometry": geometry,
+        "properties": {"name": row["name"], "description": row["description"]},
+    }
+
+
+def write_geojson(rows: Iterator[dict[str, Any]], chunk_size: int) -> Iterator[bytes]:
+    yield b'{"type":"FeatureCollection","features":[\n'
+    first = True
+    while True:
+        batch = list(islice(rows, chunk_size))
+        if not batch:
+            break
+        parts = [json.dumps(_feature(row), ensure_ascii=False) for row in batch]
+        yield (("" if first else ",\n") + ",\n".join(parts)).encode("utf-8")
+        first = False
+    yield b"\n]}\n"
+
+
+class _Sink:
+    # Write target for pyarrow that hands its bytes back to the generator
+    # after each batch instead of buffering the whole file.
+    def __init__(self):
+        self.parts: list[bytes] = []
+        self.closed = False
+        self.position = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.parts.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data, self.parts = b"".join(self.parts), []
+        return data
+
+
+def _schema():
+    return pa.schema(
+        [
+            ("oid", pa.string()),
+            ("name", pa.string()),
+            ("description", pa.string()),
+            ("lat", pa.float64()),
+            ("lng", pa.float64()),
+        ]
+    )
+
+
+def _columnar(rows: Iterator[dict[str, Any]], chunk_size: int, open_writer) -> Iterator[bytes]:
+    if pa is None:
+        raise RuntimeError("The parquet and arrow formats need pyarrow installed")
+    schema = _schema()
+    sink = _Sink()
+    writer = open_writer(pa.PythonFile(sink, mode="w"), schema)
+    # One record batch (one Parquet row group) per chunk.
+    while True:
+        batch = list(islice(rows, chunk_size))
+        if not batch:
+            break
+        columns = {name: [row[name] for row in batch] for name in EXPORT_FIELDS}
+        writer.write_batch(pa.record_batch(columns, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def write_parquet(rows: Iterator[dict[str, Any]], chunk_size: int) -> Iterator[bytes]:
+    return _columnar(rows, chunk_size, lambda out, schema: pq.ParquetWriter(out, schema, compression="zstd"))
+
+
+def write_arrow(rows: Iterator[dict[str, Any]], chunk_size: int) -> Iterator[bytes]:
+    return _columnar(rows, chunk_size, lambda out, schema: pa.ipc.new_stream(out, schema))
+
+
+FORMATS = {
+    "ndjson": ("application/x-ndjson", write_ndjson),
+    "geojson": ("application/geo+json", write_geojson),
+    "parquet": ("application/vnd.apache.parquet", write_parquet),
+    "arrow": ("application/vnd.apache.arrow.stream", write_arrow),
+}
+
+
+def available(fmt: str) -> bool:
+    return fmt in FORMATS and (fmt in ("ndjson", "geojson") or pa is not None)
+
+
+def export(fmt: str, chunk_size: int) -> Iterator[bytes]:
+    _content_type, writer = FORMATS[fmt]
+    return writer(iter_places(chunk_size), chunk_size)
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import logging
+import math
+import threading
+import time
+from collections import defaultdict
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.contrib.gis.geos import GEOSGeometry, Point, Polygon
+from django.db import connections
+from django.db.models import Count, Max
+
+from .models import Geofence
+from .signals import geofences_matched
+
+
+logger = logging.getLogger(__name__)
+
+# Reverse lookup: which fences contain a point. Fences are bucketed into a
+# fixed lat/lng grid; a cell lists the fences wholly covering it (a match
+# without any geometry test) and the fences crossing it (tested with their
+# prepared geometry). A lookup touches one cell, so its cost follows the
+# fences near the point rather than the number of fences.
+class GeofenceIndex:
+    def __init__(self, grid_deg: float, max_cells: int):
+        self.grid_deg = grid_deg
+        self.max_cells = max_cells
+        self.covering: dict[tuple[int, int], list[int]] = defaultdict(list)
+        self.crossing: dict[tuple[int, int], list[int]] = defaultdict(list)
+        # Fences spanning more than max_cells cells are tested on every lookup
+        # whose point falls inside their envelope.
+        self.oversized: list[tuple[int, tuple[float, float, float, float]]] = []
+        self.prepared: dict[int, object] = {}
+        # GEOS prepared geometries are not safe to share between threads.
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.prepared)
+
+    def _cell(self, lat: float, lng: float) -> tuple[int, int]:
+        return math.floor(lat / self.grid_deg), math.floor(lng / self.grid_deg)
+
+    def add(self, fence_id: int, geometry: GEOSGeometry) -> None:
+        prepared = geometry.prepared
+        self.prepared[fence_id] = prepared
+        min_lng, min_lat, max_lng, max_lat = geometry.extent
+        row_lo, col_lo = self._cell(min_lat, min_lng)
+        row_hi, col_hi = self._cell(max_lat, max_lng)
+        if (row_hi - row_lo + 1) * (col_hi - col_lo + 1) > self.max_cells:
+            self.oversized.append((fence_id, geometry.extent))
+            return
+        size = self.grid_deg
+        for row in range(row_lo, row_hi + 1):
+            for col in range(col_lo, col_hi + 1):
+                box = Polygon.from_bbox((col * size, row * size, (col + 1) * size, (row + 1) * size))
+                if prepared.contains(box):
+                    self.covering[(row, col)].append(fence_id)
+                elif prepared.intersects(box):
+                    self.crossing[(row, col)].append(fence_id)
+
+    def lookup(self, lat: float, lng: float) -> list[int]:
+        cell = self._cell(lat, lng)
+        matches = list(self.covering.get(cell, ()))
+        candidates = list(self.crossing.get(cell, ()))
+        candidates.extend(
+            fence_id
+            for fence_id, (min_lng, min_lat, max_lng, max_lat) in self.oversized
+            if min_lat <= lat <= max_lat and min_lng <= lng <= max_lng
+        )
+        if candidates:
+            point = Point(lng, lat, srid=4326)
+            with self._lock:
+                matches.extend(fence_id for fence_id in candidates if self.prepared[fence_id].intersects(point))
+        return matches
+
+
+def build_index(fences: Iterable[tuple[int, GEOSGeometry]]) -> GeofenceIndex:
+    index = GeofenceIndex(settings.PLACES_GEOFENCE_GRID_DEG, settings.PLACES_GEOFENCE_MAX_CELLS)
+    for fence_id, geometry in fences:
+        index.add(fence_id, geometry)
+    return index
+
+
+def enabled() -> bool:
+    return settings.PLACES_GEOFENCES_ENABLED
+
+
+_index: Optional[GeofenceIndex] = None
+_index_version = None
+_checked_at = 0.0
+_changes = 0
+_refresh_lock = threading.Lock()
+_refresh_thread: Optional[threading.Thread] = None
+
+
+def _refresh() -> None:
+    global _index, _index_version, _checked_at
+    changes = _changes
+    try:
+        stats = Geofence.objects.aggregate(count=Count("id"), updated=Max("updated_at"))
+        version = (stats["count"], stats["updated"])
+        if _index is None or version != _index_version:
+            index = build_index(Geofence.objects.values_list("id", "geometry").iterator(chunk_size=1000))
+            _index, _index_version = index, version
+        # A fence saved while this refresh ran may be missing; check again on
+        # the next lookup.
+        _checked_at = time.monotonic() if changes == _changes else 0.0
+    except Exception:
+        logger.exception("Could not refresh the geofence index")
+        _checked_at = time.monotonic()
+    finally:
+        connections.close_all()
+
+
+def refresh(wait: bool = False) -> None:
+    # Builds in a thread of its own, so no caller pays for preparing every
+    # fence; at most one build runs per process.
+    global _refresh_thread
+    with _refresh_lock:
+        thread = _refresh_thread
+        if thread is None or not thread.is_alive():
+            thread = _refresh_thread = threading.Thread(target=_refresh, name="geofence-index", daemon=True)
+            thread.start()
+    if wait:
+        thread.join()
+
+
+def warm() -> None:
+    # Called at process start so the index is usually built before the
+    # first place is indexed.
+    if enabled():
+        refresh()
+
+
+def get_index() -> Optional[GeofenceIndex]:
+    # Other processes may add fences, so the table's (count, last update) is
+    # re-read every PLACES_GEOFENCE_REFRESH_SECONDS and the index rebuilt in
+    # the background when it moved. Changes saved in this process reset the
+    # check immediately. Lookups keep using the current index until the new
+    # one is swapped in; None means the first build has not finished.
+    if time.monotonic() - _checked_at >= settings.PLACES_GEOFENCE_REFRESH_SECONDS:
+        refresh()
+    return _index
+
+
+def on_geofence_changed(sender, **kwargs) -> None:
+    global _checked_at, _changes
+    _changes += 1
+    _checked_at = 0.0
+
+
+def _query_fences(lat: float, lng: float) -> list[int]:
+    # Used until the index is built: the GiST index answers one point at a
+    # time, slower than the grid but without waiting for the build.
+    point = Point(lng, lat, srid=4326)
+    return list(Geofence.objects.filter(geometry__intersects=point).values_list("id", flat=True))
+
+
+def match_rows(rows) -> dict[str, list[int]]:
+    index = get_index()
+    if index is not None and not len(index):
+        return {}
+    lookup = _query_fences if index is None else index.lookup
+    matches = {}
+    for row in rows:
+        fence_ids = lookup(row.lat, row.lng)
+        if fence_ids:
+            matches[row.oid] = fence_ids
+    return matches
+
+
+def on_places_indexed(sender, rows, **kwargs) -> None:
+    if not enabled():
+        return
+    matches = match_rows(rows)
+    if matches:
+        geofences_matched.send(sender=Geofence, matches=matches)
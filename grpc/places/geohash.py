@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import math
+
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+MAX_PRECISION = 12
+
+
+def encode(lat: float, lng: float, precision: int) -> str:
+    lat_lo, lat_hi = -90.0, 90.0
+    lng_lo, lng_hi = -180.0, 180.0
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lng_lo + lng_hi) / 2
+            if lng >= mid:
+                value = (value << 1) | 1
+                lng_lo = mid
+            else:
+                value <<= 1
+                lng_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                value = (value << 1) | 1
+                lat_lo = mid
+            else:
+                value <<= 1
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = 0
+            value = 0
+    return "".join(chars)
+
+
+def cell_size(precision: int) -> tuple[float, float]:
+    total = 5 * precision
+    lng_bits = (total + 1) // 2
+    lat_bits = total // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+
+def bounding_box(lat: float, lng: float, km: float) -> tuple[float, float, float, float]:
+    dlat = math.degrees(km / 6371.0088)
+    coslat = math.cos(math.radians(lat))
+    dlng = 180.0 if coslat < 1e-9 else min(180.0, dlat / coslat)
+    return max(-90.0, lat - dlat), lng - dlng, min(90.0, lat + dlat), lng + dlng
+
+
+def covering_cells(
+    lat: float, lng: float, km: float, max_cells: int = 16, max_precision: int = MAX_PRECISION
+) -> set[str]:
+    # Cells are used as key prefixes, so they must not be finer than the
+    # precision the points were stored at, however small the radius.
+    min_lat, min_lng, max_lat, max_lng = bounding_box(lat, lng, km)
+    precision = max_precision
+    while precision > 1:
+        height, width = cell_size(precision)
+        rows = math.floor(max_lat / height) - math.floor(min_lat / height) + 1
+        cols = math.floor(max_lng / width) - math.floor(min_lng / width) + 1
+        if rows * cols <= max_cells:
+            break
+        precision -= 1
+    height, width = cell_size(precision)
+
+    cells = set()
+    cell_lat = min_lat
+    while True:
+        cell_lng = min_lng
+        while True:
+            wrapped = (cell_lng + 180.0) % 360.0 - 180.0
+            cells.add(encode(min(cell_lat, 90.0 - 1e-9), wrapped, precision))
+            if cell_lng >= max_lng:
+                break
+            cell_lng = min(cell_lng + width, max_lng)
+        if cell_lat >= max_lat:
+            break
+        cell_lat = min(cell_lat + height, max_lat)
+    return cells
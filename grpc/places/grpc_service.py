@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import os
+from concurrent import futures
+from typing import Optional
+
+import grpc
+from django.conf import settings
+from django.db import close_old_connections
+from django.db import transaction as db_transaction
+
+from zodbapp.zodb import ZODBManager
+
+from . import services
+from .ingest import PlaceBatchWriter
+from .store import parse_place_payload
+
+
+PROTO_PATH = os.path.join("places", "protos", "places.proto")
+DEFAULT_KM = 5.0
+
+# Message classes and stubs are generated from the .proto at import time, so
+# there is no checked-in generated code to keep in sync.
+places_pb2, places_pb2_grpc = grpc.protos_and_services(PROTO_PATH)
+
+
+def _payload(message) -> dict:
+    return {
+        "name": message.name,
+        "description": message.description,
+        "lat": message.lat,
+        "lng": message.lng,
+    }
+
+
+def _result(hit, place):
+    return places_pb2.PlaceResult(
+        oid=hit.oid,
+        name=hit.name,
+        lat=hit.lat,
+        lng=hit.lng,
+        description=getattr(place, "description", ""),
+        distance_m=hit.distance_m,
+    )
+
+
+def _radius(request) -> tuple[float, Optional[int]]:
+    return request.km or DEFAULT_KM, request.limit or None
+
+
+class PlacesServicer(places_pb2_grpc.PlacesServicer):
+    def CreatePlace(self, request, context):
+        close_old_connections()
+        try:
+            name, description, lat, lng = parse_place_payload(_payload(request))
+        except ValueError as exc:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(exc))
+        if settings.ZODB_GROUP_COMMIT_ENABLED:
+            oid = services.create_place_grouped(name, description, lat, lng)
+        else:
+            for manager in ZODBManager.attempts():
+                # The ZODB commit happens inside the SQL transaction, which is
+                # rolled back when the attempt conflicts and is retried.
+                with db_transaction.atomic():
+                    with manager as ctx:
+                        oid = services.create_place(ctx.root, name, description, lat, lng)
+                    if manager.conflicted:
+                        db_transaction.set_rollback(True)
+        return places_pb2.CreatePlaceReply(oid=oid, name=name)
+
+    def BulkCreatePlaces(self, request_iterator, context):
+        close_old_connections()
+        reply = places_pb2.BulkCreateReply()
+        with PlaceBatchWriter(settings.PLACES_BULK_BATCH_SIZE) as writer:
+            for index, message in enumerate(request_iterator):
+                reply.received += 1
+                try:
+                    writer.add(_payload(message))
+                except ValueError as exc:
+                    reply.errors.add(index=index, error=str(exc))
+                if writer.full:
+                    self._record_batch(reply, writer.flush())
+            self._record_batch(reply, writer.flush())
+            reply.written = writer.written
+            reply.batches = writer.batches
+        return reply
+
+    def _record_batch(self, reply, result) -> None:
+        if result is None:
+            return
+        for error in result.errors:
+            reply.errors.add(index=-1, error=error["error"])
+
+    def StreamNearby(self, request, context):
+        close_old_connections()
+        km, limit = _radius(request)
+        with ZODBManager() as ctx:
+            for hit, place in services.iter_nearby(
+                ctx.connection, ctx.root, request.lat, request.lng, km, limit
+            ):
+                if not context.is_active():
+                    return
+                yield _result(hit, place)
+
+    def TrackNearby(self, request_iterator, context):
+        close_old_connections()
+        last = None
+        sequence = 0
+        for position in request_iterator:
+            key = (position.lat, position.lng, position.km, position.limit)
+            if key == last:
+                continue
+            last = key
+            sequence += 1
+            km, limit = _radius(position)
+            # A fresh transaction per position so each update sees new places.
+            with ZODBManager() as ctx:
+                places = [
+                    _result(hit, place)
+                    for hit, place in services.iter_nearby(
+                        ctx.connection, ctx.root, position.lat, position.lng, km, limit or 50
+                    )
+                ]
+            yield places_pb2.NearbyUpdate(sequence=sequence, position=position, places=places)
+
+
+def build_server(address: str, max_workers: int = 10) -> tuple[grpc.Server, int]:
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers))
+    places_pb2_grpc.add_PlacesServicer_to_server(PlacesServicer(), server)
+    port = server.add_insecure_port(address)
+    return server, port
@@ -0,0 +1,279 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from .jsonstream import iter_json_records
+
+try:
+    import osmium
+except ImportError:  # pragma: no cover - only the osm format needs it
+    osmium = None
+
+
+FORMATS = ("geojson", "csv", "osm")
+LAT_FIELDS = ("lat", "latitude", "y")
+LNG_FIELDS = ("lng", "lon", "long", "longitude", "x")
+# OSM tags that describe what a named node is, in order of preference.
+OSM_KIND_TAGS = ("amenity", "shop", "tourism", "leisure", "historic", "office", "craft", "place")
+# Skipped before the first value: UTF-8 BOM, whitespace and the record
+# separator of GeoJSON text sequences.
+LEADING_BYTES = frozenset(b"\xef\xbb\xbf \t\r\n\x1e")
+HEADER_SCAN_LIMIT = 16 * 1024 * 1024
+
+
+def detect_format(path: str) -> str:
+    name = path.lower()
+    if name.endswith((".osm.pbf", ".pbf", ".osm")):
+        return "osm"
+    if name.endswith((".csv", ".tsv")):
+        return "csv"
+    return "geojson"
+
+
+class CountingReader(io.RawIOBase):
+    # Wraps a binary file and counts the bytes handed out, for progress.
+    def __init__(self, raw):
+        self.raw = raw
+        self.count = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self.raw.read(len(buffer))
+        buffer[: len(data)] = data
+        self.count += len(data)
+        return len(data)
+
+
+class _Prefixed(io.RawIOBase):
+    def __init__(self, prefix: bytes, raw):
+        self.prefix = prefix
+        self.raw = raw
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self.prefix:
+            data, self.prefix = self.prefix[: len(buffer)], self.prefix[len(buffer) :]
+        else:
+            data = self.raw.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+
+def _features_stream(raw):
+    # A FeatureCollection is one huge object; skip to its "features" array
+    # so iter_json_records streams the features one by one. Only a key of
+    # the first top-level object counts: a "features" property nested in a
+    # record, or in the collection before its own array, is skipped over
+    # with its value. NDJSON / GeoJSON text sequences (whose first object
+    # closes without one) and bare arrays pass through untouched.
+    head = bytearray()
+
+    def at(i: int) -> Optional[int]:
+        while i >= len(head):
+            if len(head) >= HEADER_SCAN_LIMIT:
+                return None
+            chunk = raw.read(64 * 1024)
+            if not chunk:
+                return None
+            head.extend(chunk)
+        return head[i]
+
+    def passthrough(start: int = 0):
+        return io.BufferedReader(_Prefixed(bytes(head[start:]), raw))
+
+    i = 0
+    while at(i) is not None and head[i] in LEADING_BYTES:
+        i += 1
+    if at(i) != ord("{"):
+        return passthrough()
+
+    depth = 0
+    in_string = escaped = expect_key = False
+    key_start = None
+    key = None
+    while True:
+        c = at(i)
+        if c is None:
+            return passthrough()
+        if in_string:
+            if escaped:
+                escaped = False
+            elif c == 0x5C:  # backslash
+                escaped = True
+            elif c == 0x22:  # closing quote
+                in_string = False
+                if key_start is not None:
+                    key, key_start = bytes(head[key_start:i]), None
+        elif c == 0x22:
+            in_string = True
+            if depth == 1 and expect_key:
+                key_start, expect_key = i + 1, False
+        elif c in b"{[":
+            if depth == 1 and c == ord("[") and key == b"features":
+                return passthrough(i)
+            depth += 1
+            expect_key = depth == 1
+        elif c in b"}]":
+            depth -= 1
+            if depth == 0:
+                return passthrough()
+        elif c == ord(",") and depth == 1:
+            expect_key, key = True, None
+        i += 1
+
+
+def read_records(fmt: str, path: str, reader=None) -> Iterator[dict[str, Any]]:
+    # ``reader`` is the opened binary source for csv and geojson; osmium
+    # reads OSM files by path itself.
+    if fmt == "osm":
+        yield from _read_osm(path)
+        return
+    if fmt == "csv":
+        text = io.TextIOWrapper(io.BufferedReader(reader), encoding="utf-8-sig", newline="")
+        dialect = "excel-tab" if path.lower().endswith(".tsv") else "excel"
+        for row in csv.DictReader(text, dialect=dialect):
+            yield {"kind": "csv", "row": row}
+        return
+    for record, error in iter_json_records(_features_stream(reader)):
+        yield {"kind": "json", "record": record, "error": error}
+
+
+def _read_osm(path: str) -> Iterator[dict[str, Any]]:
+    if osmium is None:
+        raise RuntimeError("Reading OSM extracts needs the osmium package (pyosmium)")
+    # Named nodes only; the C++ reader does the decompression and filtering,
+    # and each node is copied out before osmium reuses its buffer.
+    processor = osmium.FileProcessor(path, osmium.osm.NODE).with_filter(osmium.filter.KeyFilter("name"))
+    for node in processor:
+        if not node.location.valid():
+            continue
+        yield {
+            "kind": "osm",
+            "id": node.id,
+            "lat": node.location.lat,
+            "lng": node.location.lon,
+            "tags": {tag.k: tag.v for tag in node.tags},
+        }
+
+
+def _first(mapping: dict[str, Any], names: tuple[str, ...]) -> Any:
+    for name in names:
+        value = mapping.get(name)
+        if value not in (None, ""):
+            return value
+    return None
+
+
+def _get(fields: dict[str, Any], name: str) -> Any:
+    # CSV headers are lower-cased when read.
+    value = fields.get(name)
+    return fields.get(name.lower()) if value is None else value
+
+
+def _fields(raw: dict[str, Any]) -> tuple[dict[str, Any], Optional[float], Optional[float]]:
+    # Returns the record's attributes and its coordinates, per source kind.
+    kind = raw["kind"]
+    if kind == "osm":
+        return {**raw["tags"], "id": f"node/{raw['id']}"}, raw["lat"], raw["lng"]
+    if kind == "csv":
+        row = {key.strip().lower(): value for key, value in raw["row"].items() if key}
+        return row, _first(row, LAT_FIELDS), _first(row, LNG_FIELDS)
+    record = raw["record"]
+    if not isinstance(record, dict):
+        raise ValueError("record must be a JSON object")
+    if record.get("type") == "Feature":
+        properties = dict(record.get("properties") or {})
+        if "id" in record:
+            properties.setdefault("id", record["id"])
+        geometry = record.get("geometry") or {}
+        if geometry.get("type") != "Point":
+            raise ValueError("only Point features can be imported")
+        try:
+            lng, lat = geometry["coordinates"][:2]
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("invalid Point coordinates")
+        return properties, lat, lng
+    return record, record.get("lat"), record.get("lng")
+
+
+def normalize(raw: dict[str, Any], options: dict[str, Any]) -> tuple[Optional[dict], Optional[str], Optional[str]]:
+    # Runs in the worker pool: turns one raw record into a place payload and
+    # its dedupe key, or an error message.
+    if raw.get("error"):
+        return None, None, raw["error"]
+    try:
+        fields, lat, lng = _fields(raw)
+        name = _get(fields, options["name_field"])
+        if not name:
+            raise ValueError(f"missing {options['name_field']!r}")
+        try:
+            lat, lng = float(lat), float(lng)
+        except (TypeError, ValueError):
+            raise ValueError("lat, lng must be numbers")
+        if not (-90.0 <= lat <= 90.0 and -180.0 <= lng <= 180.0):
+            raise ValueError("coordinates out of range")
+        description = _get(fields, options["description_field"]) or ""
+        if not description and raw["kind"] == "osm":
+            kind = next((tag for tag in OSM_KIND_TAGS if tag in fields), None)
+            description = f"{kind}={fields[kind]}" if kind else ""
+        payload = {"name": str(name)[:255], "description": str(description), "lat": lat, "lng": lng}
+
+        dedupe = options["dedupe"]
+        if dedupe == "none":
+            key = None
+        elif dedupe == "coords":
+            key = f"{payload['name'].casefold()}|{lat:.5f}|{lng:.5f}"
+        else:
+            value = _get(fields, dedupe)
+            if value in (None, ""):
+                raise ValueError(f"missing dedupe field {dedupe!r}")
+            key = f"{dedupe}={value}"
+        return payload, key, None
+    except ValueError as exc:
+        return None, None, str(exc)
+
+
+def normalize_batch(batch: list[dict[str, Any]], options: dict[str, Any]) -> list[tuple]:
+    return [normalize(raw, options) for raw in batch]
+
+
+class ImportCheckpoint:
+    # Records consumed from a given source file, rewritten after every
+    # committed batch; a rerun skips that many records without writing them.
+    def __init__(self, path: Optional[Path], source: str):
+        self.path = path
+        stat = os.stat(source)
+        self.source = {"path": os.path.abspath(source), "size": stat.st_size, "mtime": stat.st_mtime}
+        self.records = 0
+
+    def load(self) -> None:
+        if self.path is None or not self.path.exists():
+            return
+        state = json.loads(self.path.read_text())
+        if state.get("source") != self.source:
+            raise ValueError(f"Checkpoint {self.path} belongs to a different or modified source file")
+        self.records = state["records"]
+
+    def save(self, records: int) -> None:
+        self.records = records
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+        with os.fdopen(fd, "w") as fh:
+            json.dump({"source": self.source, "records": records}, fh)
+        os.replace(tmp, self.path)
+
+    def clear(self) -> None:
+        if self.path is not None and self.path.exists():
+            self.path.unlink()
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+import transaction
+from BTrees.OOBTree import OOBTree
+from django.db import transaction as db_transaction
+
+from zodbapp.zodb import get_db
+
+from . import search, services
+from .oids import allocate_oid
+from .spatial import PlaceRow
+from .store import Place, get_places, parse_place_payload
+
+
+# OOBTree of dedupe key -> OID for places written with a key (import_places).
+IMPORT_KEYS_KEY = "place_import_keys"
+
+
+@dataclass
+class BatchResult:
+    batch: int
+    written: int
+    oids: list[str] = field(default_factory=list)
+    errors: list[dict[str, Any]] = field(default_factory=list)
+
+
+class PlaceBatchWriter:
+    def __init__(self, batch_size: int):
+        self.batch_size = batch_size
+        self.batches = 0
+        self.written = 0
+        self._pending: list[tuple[str, str, str, float, float]] = []
+        self._pending_keys: dict[str, str] = {}
+        self._tm = transaction.TransactionManager()
+        self._connection = None
+
+    def _root(self):
+        if self._connection is None:
+            self._connection = get_db().open(transaction_manager=self._tm)
+        return self._connection.root()
+
+    def __enter__(self) -> "PlaceBatchWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self._pending.clear()
+            self._pending_keys.clear()
+            self._tm.abort()
+        self.close()
+
+    @property
+    def full(self) -> bool:
+        return len(self._pending) >= self.batch_size
+
+    def add(self, payload: Any, key: Optional[str] = None) -> Optional[str]:
+        # With a key, a place already written (in this batch or by any earlier
+        # one) under the same key is skipped and None is returned.
+        name, description, lat, lng = parse_place_payload(payload)
+        if key is not None:
+            if key in self._pending_keys:
+                return None
+            keys = self._root().get(IMPORT_KEYS_KEY)
+            if keys is not None and key in keys:
+                return None
+        oid = allocate_oid()
+        self._pending.append((oid, name, description, lat, lng))
+        if key is not None:
+            self._pending_keys[key] = oid
+        return oid
+
+    def flush(self) -> Optional[BatchResult]:
+        if not self._pending:
+            return None
+        pending, self._pending = self._pending, []
+        pending_keys, self._pending_keys = self._pending_keys, {}
+        self.batches += 1
+        result = BatchResult(batch=self.batches, written=0)
+        root = self._root()
+        places = get_places(root, create=True)
+        try:
+            if pending_keys:
+                keys = root.get(IMPORT_KEYS_KEY)
+                if keys is None:
+                    keys = root[IMPORT_KEYS_KEY] = OOBTree()
+                keys.update(pending_keys)
+            for oid, name, description, lat, lng in pending:
+                places[oid] = Place(name=name, description=description, lat=lat, lng=lng)
+                search.index_place(root, oid, name, description)
+            # Commit ZODB inside the SQL transaction: a failed ZODB commit
+            # rolls back the index rows too. The SQL commit still runs after
+            # ZODB's, so if it fails the batch is in ZODB without its
+            # PlaceIndex rows; reindex_places finds and repairs those.
+            with db_transaction.atomic():
+                services.index_places(root, [PlaceRow(oid, name, lat, lng) for oid, name, _d, lat, lng in pending])
+                self._tm.commit()
+        except Exception as exc:
+            self._tm.abort()
+            result.errors.append({"batch": result.batch, "error": str(exc)})
+            return result
+        result.written = len(pending)
+        result.oids = [row[0] for row in pending]
+        self.written += result.written
+        # Drop the committed objects from the pickle cache between batches.
+        self._connection.cacheMinimize()
+        return result
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import codecs
+import json
+import re
+from typing import Any, Iterator, Optional
+
+
+# Free of Django imports, so import_places' worker processes can load it
+# without setting Django up.
+READ_CHUNK_SIZE = 64 * 1024
+MAX_RECORD_SIZE = 1024 * 1024
+
+_decoder = json.JSONDecoder()
+_SEPARATORS = {False: re.compile(r"\s*"), True: re.compile(r"[\s,]*")}
+
+
+def iter_json_records(stream, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[tuple[Any, Optional[str]]]:
+    # Accepts NDJSON or a single JSON array and yields (record, error) pairs
+    # without ever holding more than one chunk plus one record in memory.
+    utf8 = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    buffer = ""
+    pos = 0
+    eof = False
+    in_array: Optional[bool] = None
+
+    def fill() -> bool:
+        nonlocal buffer, pos, eof
+        if eof:
+            return False
+        chunk = stream.read(chunk_size)
+        buffer = buffer[pos:] + utf8.decode(chunk or b"", final=not chunk)
+        pos = 0
+        if not chunk:
+            eof = True
+            return False
+        return True
+
+    while True:
+        pos = _SEPARATORS[bool(in_array)].match(buffer, pos).end()
+        if pos >= len(buffer):
+            if not fill():
+                return
+            continue
+
+        if in_array is None:
+            in_array = buffer[pos] == "["
+            if in_array:
+                pos += 1
+            continue
+        if in_array and buffer[pos] == "]":
+            return
+
+        try:
+            record, end = _decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError as exc:
+            line_end = -1 if in_array else buffer.find("\n", pos)
+            if 0 <= exc.pos <= line_end:
+                # NDJSON: a complete line that does not parse; skip it.
+                yield None, f"Invalid JSON: {exc.msg}"
+                pos = line_end + 1
+                continue
+            if len(buffer) - pos > MAX_RECORD_SIZE:
+                yield None, "record exceeds maximum size"
+                return
+            if fill():
+                continue
+            yield None, f"Invalid JSON: {exc.msg}"
+            return
+
+        if end == len(buffer) and fill():
+            # The value may continue in the next chunk (e.g. a bare number).
+            continue
+        pos = end
+        yield record, None
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import threading
+import time
+
+import transaction
+from BTrees.OOBTree import OOBTree
+from django.core.management.base import BaseCommand
+from ZODB import DB
+from ZODB.POSException import ConflictError
+
+from places.oids import format_oid
+from places.store import Place, ShardedPlaces
+
+
+def _run(container_factory, threads: int, writes: int, block: int) -> tuple[int, int, float]:
+    db = DB(None, pool_size=threads)
+    with db.transaction() as connection:
+        connection.root()["places"] = container_factory()
+    conflicts = [0] * threads
+    barrier = threading.Barrier(threads)
+
+    def worker(index: int) -> None:
+        tm = transaction.TransactionManager()
+        connection = db.open(transaction_manager=tm)
+        # Each worker draws OIDs from its own block, like PlaceOIDAllocator.
+        next_id = 1 + index * block
+        barrier.wait()
+        for _ in range(writes):
+            oid = format_oid(next_id)
+            next_id += 1
+            while True:
+                try:
+                    connection.root()["places"][oid] = Place(name=oid, description="")
+                    tm.commit()
+                    break
+                except ConflictError:
+                    tm.abort()
+                    conflicts[index] += 1
+        connection.close()
+
+    started = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    with db.transaction() as connection:
+        stored = len(connection.root()["places"])
+    db.close()
+    return stored, sum(conflicts), elapsed
+
+
+class Command(BaseCommand):
+    help = "Measure ConflictError rates for concurrent place inserts, single tree vs sharded."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--writes", type=int, default=500, help="Inserts per thread")
+        parser.add_argument("--shards", type=int, default=16)
+        parser.add_argument("--block", type=int, default=1000, help="OID block size per thread")
+
+    def handle(self, *args, **options):
+        threads, writes = options["threads"], options["writes"]
+        layouts = [
+            ("single OOBTree", OOBTree),
+            (f"{options['shards']} shards", lambda: ShardedPlaces(options["shards"])),
+        ]
+        for label, factory in layouts:
+            stored, conflicts, elapsed = _run(factory, threads, writes, options["block"])
+            total = threads * writes
+            self.stdout.write(
+                f"{label:>16}: {stored}/{total} stored, {conflicts} conflicts "
+                f"({conflicts / total:.1%} of commits), {total / elapsed:.0f} inserts/s"
+            )
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import math
+import random
+import time
+
+from django.contrib.gis.geos import Point, Polygon
+from django.core.management.base import BaseCommand
+
+from places.geofences import build_index
+
+
+def _fence(rng: random.Random, lat: float, lng: float, radius: float, vertices: int) -> Polygon:
+    # An irregular star-shaped polygon, closer to a drawn district than a circle.
+    ring = []
+    for i in range(vertices):
+        angle = 2 * math.pi * i / vertices
+        r = radius * rng.uniform(0.6, 1.0)
+        ring.append((lng + r * math.cos(angle), lat + r * math.sin(angle)))
+    ring.append(ring[0])
+    return Polygon(ring, srid=4326)
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+class Command(BaseCommand):
+    help = "Benchmark reverse geofence lookups: grid index vs testing every fence."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fences", type=int, default=50000)
+        parser.add_argument("--points", type=int, default=20000)
+        parser.add_argument("--naive-points", type=int, default=50, help="Points for the every-fence baseline")
+        parser.add_argument("--vertices", type=int, default=16)
+        parser.add_argument("--bbox", default="95,5,106,21", help="min_lng,min_lat,max_lng,max_lat to scatter over")
+        parser.add_argument("--max-radius", type=float, default=0.05, help="Fence radius in degrees")
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        min_lng, min_lat, max_lng, max_lat = (float(v) for v in options["bbox"].split(","))
+
+        def random_point() -> tuple[float, float]:
+            return rng.uniform(min_lat, max_lat), rng.uniform(min_lng, max_lng)
+
+        fences = []
+        for fence_id in range(1, options["fences"] + 1):
+            lat, lng = random_point()
+            radius = rng.uniform(options["max_radius"] / 10, options["max_radius"])
+            fences.append((fence_id, _fence(rng, lat, lng, radius, options["vertices"])))
+
+        started = time.perf_counter()
+        index = build_index(fences)
+        self.stdout.write(f"Indexed {len(index)} fences in {time.perf_counter() - started:.1f}s")
+
+        points = [random_point() for _ in range(options["points"])]
+        timings = []
+        matched = 0
+        for lat, lng in points:
+            started = time.perf_counter()
+            matched += len(index.lookup(lat, lng))
+            timings.append(time.perf_counter() - started)
+        self.stdout.write(
+            f"grid index: mean {sum(timings) / len(timings) * 1e6:.1f}us, "
+            f"p99 {_percentile(timings, 0.99) * 1e6:.1f}us per point, "
+            f"{matched / len(points):.2f} fences matched per point"
+        )
+
+        prepared = [(fence_id, geometry.prepared) for fence_id, geometry in fences]
+        naive = []
+        for lat, lng in points[: options["naive_points"]]:
+            started = time.perf_counter()
+            point = Point(lng, lat, srid=4326)
+            expected = [fence_id for fence_id, fence in prepared if fence.intersects(point)]
+            naive.append(time.perf_counter() - started)
+            if sorted(expected) != sorted(index.lookup(lat, lng)):
+                self.stderr.write(f"Mismatch at {lat},{lng}: {expected}")
+        if naive:
+            self.stdout.write(f"every fence: mean {sum(naive) / len(naive) * 1e6:.1f}us per point")
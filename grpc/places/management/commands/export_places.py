@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import resource
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from places import export
+
+
+class Command(BaseCommand):
+    help = "Stream every place to NDJSON, GeoJSON, Parquet or Arrow with bounded memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=sorted(export.FORMATS), default="ndjson")
+        parser.add_argument("--output", default="-", help="File to write, or - for stdout")
+        parser.add_argument("--chunk-size", type=int, default=settings.PLACES_EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        fmt, chunk_size = options["format"], options["chunk_size"]
+        if not export.available(fmt):
+            raise CommandError(f"--format {fmt} needs pyarrow installed")
+        count = 0
+
+        def counted():
+            nonlocal count
+            for row in export.iter_places(chunk_size):
+                count += 1
+                yield row
+
+        _content_type, writer = export.FORMATS[fmt]
+        started = time.perf_counter()
+        written = 0
+        out = sys.stdout.buffer if options["output"] == "-" else open(options["output"], "wb")
+        try:
+            for data in writer(counted(), chunk_size):
+                out.write(data)
+                written += len(data)
+        finally:
+            if out is not sys.stdout.buffer:
+                out.close()
+        elapsed = time.perf_counter() - started
+        # ru_maxrss is in kilobytes on Linux.
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stderr.write(
+            f"Exported {count} places ({written / 1e6:.1f} MB) in {elapsed:.1f}s, "
+            f"{count / elapsed if elapsed else 0:.0f} places/s, peak RSS {peak_mb:.0f} MB"
+        )
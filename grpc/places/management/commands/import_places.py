@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from places import importers
+from places.ingest import PlaceBatchWriter
+
+
+class Progress:
+    def __init__(self, stream, total_bytes: int):
+        self.stream = stream
+        self.total_bytes = total_bytes
+        self.started = time.perf_counter()
+        self._shown = 0.0
+
+    def show(self, stats: dict[str, int], read_bytes: int, force: bool = False) -> None:
+        now = time.perf_counter()
+        if not force and now - self._shown < 0.5:
+            return
+        self._shown = now
+        elapsed = now - self.started
+        rate = stats["written"] / elapsed if elapsed else 0
+        line = (
+            f"read {stats['read']}  written {stats['written']}  duplicates {stats['duplicates']}  "
+            f"errors {stats['errors']}  {rate:.0f} rows/s"
+        )
+        if self.total_bytes and read_bytes:
+            fraction = min(1.0, read_bytes / self.total_bytes)
+            filled = int(fraction * 30)
+            line = f"[{'#' * filled}{'.' * (30 - filled)}] {fraction:6.1%}  " + line
+        self.stream.write("\r" + line)
+        self.stream.flush()
+
+
+class Command(BaseCommand):
+    help = "Import places from a GeoJSON, CSV or OSM PBF file in committed batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=importers.FORMATS, help="Guessed from the extension by default")
+        parser.add_argument("--batch-size", type=int, default=settings.PLACES_BULK_BATCH_SIZE)
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Parse processes; 0 parses inline")
+        parser.add_argument(
+            "--dedupe",
+            default="coords",
+            help='"coords" (name + coordinates to 5 decimals), "none", or a property/column/tag name such as id',
+        )
+        parser.add_argument("--name-field", default="name")
+        parser.add_argument("--description-field", default="description")
+        parser.add_argument("--checkpoint", help="Resume file (default: var/imports/<file name>.json); empty disables")
+        parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint")
+
+    def handle(self, *args, **options):
+        self.verbosity = options["verbosity"]
+        path = options["path"]
+        if not os.path.exists(path):
+            raise CommandError(f"No such file: {path}")
+        fmt = options["format"] or importers.detect_format(path)
+        if options["checkpoint"] is None:
+            checkpoint_path = settings.BASE_DIR / "var" / "imports" / f"{Path(path).name}.json"
+        else:
+            checkpoint_path = Path(options["checkpoint"]) if options["checkpoint"] else None
+        checkpoint = importers.ImportCheckpoint(checkpoint_path, path)
+        if options["restart"]:
+            checkpoint.clear()
+        try:
+            checkpoint.load()
+        except ValueError as exc:
+            raise CommandError(f"{exc}; pass --restart to start over")
+        if checkpoint.records:
+            self.stderr.write(f"Resuming after {checkpoint.records} records")
+
+        parse_options = {
+            "dedupe": options["dedupe"],
+            "name_field": options["name_field"],
+            "description_field": options["description_field"],
+        }
+        stats = {"read": 0, "written": 0, "duplicates": 0, "errors": 0}
+        progress = Progress(self.stderr, os.path.getsize(path) if fmt != "osm" else 0)
+
+        with open(path, "rb") as fh:
+            reader = importers.CountingReader(fh)
+            records = importers.read_records(fmt, path, reader)
+            # Records already committed by an earlier run are read, not parsed.
+            for _ in islice(records, checkpoint.records):
+                pass
+            stats["read"] = checkpoint.records
+            try:
+                self._run(records, options, parse_options, stats, checkpoint, progress, reader)
+            except RuntimeError as exc:
+                raise CommandError(str(exc))
+
+        progress.show(stats, reader.count, force=True)
+        self.stderr.write("")
+        elapsed = time.perf_counter() - progress.started
+        checkpoint.clear()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {stats['written']} places from {stats['read']} records in {elapsed:.1f}s "
+                f"({stats['written'] / elapsed if elapsed else 0:.0f} rows/s); "
+                f"{stats['duplicates']} duplicates, {stats['errors']} errors"
+            )
+        )
+
+    def _run(self, records, options, parse_options, stats, checkpoint, progress, reader) -> None:
+        batch_size = options["batch_size"]
+        parse = partial(importers.normalize_batch, options=parse_options)
+        # Parse batches of raw records in worker processes, keeping only a few
+        # batches in flight so memory stays bounded on huge files.
+        # places.importers imports nothing from Django, so workers started
+        # with spawn or forkserver can unpickle normalize_batch without
+        # django.setup().
+        batches = iter(lambda: list(islice(records, batch_size)), [])
+        executor = ProcessPoolExecutor(max_workers=options["workers"]) if options["workers"] > 0 else None
+        in_flight: deque = deque()
+        try:
+            with PlaceBatchWriter(batch_size) as writer:
+                while True:
+                    while executor is not None and len(in_flight) < options["workers"] * 2:
+                        batch = next(batches, None)
+                        if batch is None:
+                            break
+                        in_flight.append((len(batch), executor.submit(parse, batch)))
+                    if executor is not None:
+                        if not in_flight:
+                            break
+                        count, future = in_flight.popleft()
+                        parsed = future.result()
+                    else:
+                        batch = next(batches, None)
+                        if batch is None:
+                            break
+                        count, parsed = len(batch), parse(batch)
+
+                    for payload, key, error in parsed:
+                        if error is not None:
+                            stats["errors"] += 1
+                            self._report_error(stats["read"], error)
+                            continue
+                        if writer.add(payload, key) is None:
+                            stats["duplicates"] += 1
+                    stats["read"] += count
+                    # Every parsed batch is committed before the checkpoint
+                    # moves past it, so a crash never skips unwritten rows.
+                    result = writer.flush()
+                    if result is not None:
+                        if result.errors:
+                            raise CommandError(f"Batch failed: {result.errors[0]['error']}")
+                        stats["written"] += result.written
+                    checkpoint.save(stats["read"])
+                    progress.show(stats, reader.count)
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+    def _report_error(self, index: int, error: str) -> None:
+        if self.verbosity >= 2:
+            self.stderr.write(f"\nrecord near {index}: {error}")
@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from places import regions
+
+
+class Command(BaseCommand):
+    help = "Create or replace a named region from a GeoJSON Polygon/MultiPolygon file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("name")
+        parser.add_argument("path", help="GeoJSON geometry or Feature")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options["path"], encoding="utf-8") as fh:
+                geometry = regions.parse_geojson(json.load(fh))
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+        region = regions.save_region(options["name"], geometry)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Saved region {region.name}: {geometry.num_coords} points, "
+                f"{region.simplified.num_coords} after simplification"
+            )
+        )
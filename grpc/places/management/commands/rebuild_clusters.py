@@ -0,0 +1,16 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from places import clusters
+
+
+class Command(BaseCommand):
+    help = "Recompute the PlaceCluster pyramid from PlaceIndex (PostgreSQL only)."
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("rebuild_clusters needs the PostGIS database")
+        total = clusters.rebuild(stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {total} clusters"))
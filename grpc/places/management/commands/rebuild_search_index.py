@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+from itertools import islice
+
+import transaction
+from django.core.management.base import BaseCommand
+from ZODB.POSException import ConflictError
+
+from zodbapp.zodb import get_db
+
+from places import search
+from places.store import get_places
+
+
+class Command(BaseCommand):
+    help = "Add every stored place to the ZODB text index (places already indexed are skipped)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=5000)
+        parser.add_argument("--reset", action="store_true", help="Drop the index and start over")
+
+    def handle(self, *args, **options):
+        tm = transaction.TransactionManager()
+        connection = get_db().open(transaction_manager=tm)
+        try:
+            root = connection.root()
+            if options["reset"] and search.INDEX_KEY in root:
+                del root[search.INDEX_KEY]
+                tm.commit()
+            indexed = 0
+            last = None
+            while True:
+                places = get_places(root)
+                items = places.items(min=last)
+                if last is not None:
+                    items = (item for item in items if item[0] != last)
+                chunk = list(islice(items, options["chunk_size"]))
+                if not chunk:
+                    break
+                try:
+                    for oid, place in chunk:
+                        search.index_place(root, oid, place.name, getattr(place, "description", ""))
+                    tm.commit()
+                except ConflictError:
+                    # Live writers index their own places; redo this chunk.
+                    tm.abort()
+                    continue
+                last = chunk[-1][0]
+                indexed += len(chunk)
+                connection.cacheMinimize()
+                self.stdout.write(f"Indexed {indexed} places")
+        finally:
+            connection.close()
+        self.stdout.write(self.style.SUCCESS(f"Search index covers {indexed} places"))
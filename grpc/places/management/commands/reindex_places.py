@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import transaction
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from zodbapp.workers import init_django
+from zodbapp.zodb import get_db
+
+from places import reconcile
+
+
+class Command(BaseCommand):
+    help = "Reconcile PlaceIndex with the places stored in ZODB, repairing only the differences."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=10000, help="Approximate places per chunk")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+        parser.add_argument(
+            "--checkpoint",
+            default=str(settings.BASE_DIR / "var" / "reindex_places.json"),
+            help="Progress file used to resume; empty to disable",
+        )
+        parser.add_argument("--restart", action="store_true", help="Ignore and replace an existing checkpoint")
+        parser.add_argument("--dry-run", action="store_true", help="Report differences without repairing them")
+
+    def handle(self, *args, **options):
+        checkpoint = reconcile.Checkpoint(
+            Path(options["checkpoint"]) if options["checkpoint"] and not options["dry_run"] else None
+        )
+        if options["restart"]:
+            checkpoint.clear()
+        try:
+            checkpoint.load()
+        except ValueError as exc:
+            raise CommandError(f"{exc}; pass --restart to start over")
+
+        if checkpoint.digits is None:
+            tm = transaction.TransactionManager()
+            connection = get_db().open(transaction_manager=tm)
+            try:
+                limit = reconcile.oid_limit(connection.root())
+            finally:
+                tm.abort()
+                connection.close()
+            checkpoint.digits = reconcile.prefix_digits(limit, options["chunk_size"])
+        chunks = range(reconcile.chunk_count(checkpoint.digits))
+        pending = [chunk for chunk in chunks if chunk not in checkpoint.done]
+        self.stdout.write(
+            f"{len(chunks)} key ranges split on {checkpoint.digits}-digit OIDs, "
+            f"{len(chunks) - len(pending)} already done"
+        )
+
+        # A FileStorage can only be opened by one process; reconcile in
+        # threads of this process then. With ZEO every worker opens its own
+        # client.
+        if settings.ZODB_STORAGE == "zeo":
+            executor = ProcessPoolExecutor(max_workers=options["workers"], initializer=init_django)
+            # Forked workers must not share the parent's database sockets.
+            connections.close_all()
+        else:
+            executor = ThreadPoolExecutor(max_workers=options["workers"])
+
+        started = time.perf_counter()
+        done = 0
+        with executor:
+            futures = [
+                executor.submit(reconcile.reconcile_chunk, chunk, checkpoint.digits, options["dry_run"])
+                for chunk in pending
+            ]
+            for future in as_completed(futures):
+                result = future.result()
+                checkpoint.record(result)
+                done += 1
+                if result.missing or result.changed or result.extra or done % 100 == 0:
+                    self.stdout.write(
+                        f"[{done}/{len(pending)}] chunk {result.chunk}: {result.places} places, "
+                        f"{result.missing} missing, {result.changed} changed, {result.extra} extra"
+                    )
+
+        elapsed = time.perf_counter() - started
+        totals = checkpoint.totals
+        verb = "found" if options["dry_run"] else "repaired"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Checked {totals['places']} places in {elapsed:.1f}s: {verb} {totals['missing']} missing, "
+                f"{totals['changed']} changed, {totals['extra']} extra index rows; "
+                f"{totals['unlocated']} places have no coordinates"
+            )
+        )
+        if not options["dry_run"]:
+            checkpoint.clear()
@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from ZODB.POSException import ConflictError
+
+from places import geofences, outbox
+
+
+class Command(BaseCommand):
+    help = "Drain the ZODB index outbox into PostGIS."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=settings.PLACES_INDEXER_BATCH_SIZE)
+        parser.add_argument("--interval", type=float, default=1.0, help="Seconds to sleep when idle")
+        parser.add_argument("--once", action="store_true", help="Exit once the outbox is empty")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        total = 0
+        geofences.warm()
+        while True:
+            close_old_connections()
+            try:
+                drained = outbox.drain(batch_size)
+            except ConflictError:
+                # Writers kept conflicting with the batch; the outbox is not
+                # empty, so --once keeps going too.
+                self.stderr.write("Outbox batch kept conflicting, retrying")
+                time.sleep(options["interval"])
+                continue
+            total += drained
+            if drained:
+                self.stdout.write(f"Indexed {drained} places ({total} total)")
+                continue
+            if options["once"]:
+                break
+            time.sleep(options["interval"])
+        self.stdout.write(self.style.SUCCESS(f"Outbox drained, {total} places indexed"))
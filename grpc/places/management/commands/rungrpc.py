@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Run the places gRPC server."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--address", default=settings.PLACES_GRPC_ADDRESS)
+        parser.add_argument("--workers", type=int, default=settings.PLACES_GRPC_WORKERS)
+
+    def handle(self, *args, **options):
+        from places import geofences
+        from places.grpc_service import build_server
+
+        geofences.warm()
+        server, port = build_server(options["address"], options["workers"])
+        server.start()
+        self.stdout.write(self.style.SUCCESS(f"Places gRPC server listening on port {port}"))
+        try:
+            server.wait_for_termination()
+        except KeyboardInterrupt:
+            server.stop(grace=5).wait()
@@ -0,0 +1,17 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from zodbapp.zodb import ZODBManager
+
+from places.oids import seed_counter
+
+
+class Command(BaseCommand):
+    help = "Seed the place OID block counter from the existing places tree."
+
+    def handle(self, *args, **options):
+        with ZODBManager() as ctx:
+            counter = seed_counter(ctx.root)
+            next_id = counter.next_id
+        self.stdout.write(self.style.SUCCESS(f"Next place OID: p-{next_id}"))
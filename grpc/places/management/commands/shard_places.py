@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import transaction
+from django.core.management.base import BaseCommand, CommandError
+
+from zodbapp.zodb import get_db
+
+from places.store import ShardedPlaces
+
+
+class Command(BaseCommand):
+    help = "Move the places OOBTree into a ShardedPlaces container. Stop writers first."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--shards", type=int, default=16)
+        parser.add_argument("--chunk-size", type=int, default=10000)
+
+    def handle(self, *args, **options):
+        if options["shards"] < 2:
+            raise CommandError("--shards must be at least 2")
+        tm = transaction.TransactionManager()
+        connection = get_db().open(transaction_manager=tm)
+        try:
+            root = connection.root()
+            source = root.get("places")
+            if source is None or isinstance(source, ShardedPlaces):
+                self.stdout.write("Nothing to do")
+                return
+            target = root["places_resharding"] = ShardedPlaces(options["shards"])
+            tm.commit()
+
+            # Copy in committed chunks so the pickle cache and the transaction
+            # stay bounded however many places there are.
+            moved = 0
+            last = None
+            while True:
+                chunk = list(source.items(min=last, excludemin=last is not None)[: options["chunk_size"]])
+                if not chunk:
+                    break
+                for oid, place in chunk:
+                    target[oid] = place
+                last = chunk[-1][0]
+                moved += len(chunk)
+                tm.commit()
+                connection.cacheMinimize()
+                self.stdout.write(f"Copied {moved} places")
+
+            root["places"] = target
+            del root["places_resharding"]
+            tm.commit()
+        finally:
+            connection.close()
+        self.stdout.write(self.style.SUCCESS(f"Sharded {moved} places into {options['shards']} trees"))
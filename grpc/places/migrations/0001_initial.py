@@ -1,4 +1,4 @@
-from django.db import migrations
+from django.db import migrations, models
 import django.contrib.gis.db.models.fields
 import django.db.models.deletion
 from django.conf import settings
@@ -13,11 +13,11 @@ class Migration(migrations.Migration):
         migrations.CreateModel(
             name="PlaceIndex",
             fields=[
-                ("id", migrations.fields.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
-                ("oid", migrations.fields.CharField(max_length=64, unique=True)),
-                ("name", migrations.fields.CharField(max_length=255)),
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("oid", models.CharField(max_length=64, unique=True)),
+                ("name", models.CharField(max_length=255)),
                 ("location", django.contrib.gis.db.models.fields.PointField(srid=4326)),
-                ("created_at", migrations.fields.DateTimeField(auto_now_add=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
             ],
         ),
     ]
@@ -0,0 +1,28 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("places", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PlaceCluster",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("zoom", models.PositiveSmallIntegerField()),
+                ("cell_x", models.IntegerField()),
+                ("cell_y", models.IntegerField()),
+                ("count", models.IntegerField(default=0)),
+                ("sum_lat", models.FloatField(default=0.0)),
+                ("sum_lng", models.FloatField(default=0.0)),
+                ("oid", models.CharField(max_length=64)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(fields=("zoom", "cell_x", "cell_y"), name="places_cluster_cell"),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+import django.contrib.gis.db.models.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("places", "0002_placecluster"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Region",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("name", models.SlugField(max_length=100, unique=True)),
+                ("geometry", django.contrib.gis.db.models.fields.MultiPolygonField(srid=4326)),
+                ("simplified", django.contrib.gis.db.models.fields.MultiPolygonField(srid=4326)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,31 @@
+import django.contrib.gis.db.models.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # 0001_initial created location as a geometry column while the model has
+    # always declared geography=True; bring the schema in line with it.
+    dependencies = [
+        ("places", "0004_geofence"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="placeindex",
+            name="id",
+            field=models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID"),
+        ),
+        migrations.AlterField(
+            model_name="placeindex",
+            name="location",
+            field=django.contrib.gis.db.models.fields.PointField(geography=True, srid=4326),
+        ),
+        migrations.AddIndex(
+            model_name="placeindex",
+            index=models.Index(fields=["oid"], name="places_plac_oid_483681_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="placeindex",
+            index=models.Index(fields=["name"], name="places_plac_name_c099e1_idx"),
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+# A sequence rather than a row: nextval() never blocks or rolls back, so
+# every worker can bump it on each invalidation without contention. Tiles
+# need the PostGIS backend, so other databases (SpatiaLite) get nothing.
+def create_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("CREATE SEQUENCE IF NOT EXISTS places_tile_generation")
+
+
+def drop_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("DROP SEQUENCE IF EXISTS places_tile_generation")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("places", "0005_placeindex_geography"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_sequence, drop_sequence),
+    ]
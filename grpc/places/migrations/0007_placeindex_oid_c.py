@@ -0,0 +1,35 @@
+from django.db import migrations, models
+from django.db.models.functions import Collate
+
+
+# Key-range scans compare oids in code point order. SQLite (SpatiaLite)
+# has no "C" collation, but its default BINARY collation already orders
+# that way, so the index only exists on PostgreSQL.
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS places_placeindex_oid_c ON places_placeindex ((oid COLLATE "C"))'
+        )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS places_placeindex_oid_c")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("places", "0006_tile_generation"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[migrations.RunPython(create_index, drop_index)],
+            state_operations=[
+                migrations.AddIndex(
+                    model_name="placeindex",
+                    index=models.Index(Collate("oid", "C"), name="places_placeindex_oid_c"),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # oid is unique, so its constraint's index already serves equality
+    # lookups; this btree was a duplicate.
+    dependencies = [
+        ("places", "0007_placeindex_oid_c"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="placeindex",
+            name="places_plac_oid_483681_idx",
+        ),
+    ]
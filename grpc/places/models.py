@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from django.contrib.gis.db import models
+from django.db.models.functions import Collate
 
 
 class PlaceIndex(models.Model):
@@ -11,8 +12,51 @@ class PlaceIndex(models.Model):
 
     class Meta:
         indexes = [
-            models.Index(fields=["oid"]),
             models.Index(fields=["name"]),
+            # Key-range scans in code point order (reindex_places, export).
+            models.Index(Collate("oid", "C"), name="places_placeindex_oid_c"),
         ]
 
 
+class PlaceCluster(models.Model):
+    # One grid cell of the cluster pyramid; see places.clusters.
+    zoom = models.PositiveSmallIntegerField()
+    cell_x = models.IntegerField()
+    cell_y = models.IntegerField()
+    count = models.IntegerField(default=0)
+    sum_lat = models.FloatField(default=0.0)
+    sum_lng = models.FloatField(default=0.0)
+    # First place indexed into the cell, shown when the cluster is expanded.
+    oid = models.CharField(max_length=64)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["zoom", "cell_x", "cell_y"], name="places_cluster_cell"),
+        ]
+
+
+class Region(models.Model):
+    # A named polygon used by within queries. ``simplified`` is what queries
+    # run against; save() recomputes it from ``geometry``, while
+    # queryset.update() does not. Each process caches the simplified shape for
+    # PLACES_REGION_CACHE_TTL, and a save only clears the saving process's
+    # cache, so other workers may serve the old shape until their TTL runs out.
+    name = models.SlugField(max_length=100, unique=True)
+    geometry = models.MultiPolygonField(srid=4326)
+    simplified = models.MultiPolygonField(srid=4326)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def save(self, *args, **kwargs):
+        from .regions import simplify
+
+        self.simplified = simplify(self.geometry)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "geometry" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "simplified"}
+        super().save(*args, **kwargs)
+
+
+class Geofence(models.Model):
+    name = models.CharField(max_length=255)
+    geometry = models.MultiPolygonField(srid=4326)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import os
+import random
+import threading
+import time
+from typing import Optional
+
+import persistent
+import transaction
+from ZODB.POSException import ConflictError
+
+from django.conf import settings
+
+from zodbapp.zodb import get_db
+
+
+COUNTER_KEY = "place_oid_counter"
+OID_PREFIX = "p-"
+
+
+class OIDBlockCounter(persistent.Persistent):
+    # Deliberately no _p_resolveConflict: two workers that read the same
+    # ``next_id`` must not both walk away with the same block, so a
+    # concurrent reservation conflicts and is retried instead of merged.
+    def __init__(self, next_id: int = 1):
+        self.next_id = next_id
+
+    def reserve(self, size: int) -> int:
+        start = self.next_id
+        self.next_id = start + size
+        return start
+
+
+def format_oid(number: int) -> str:
+    return f"{OID_PREFIX}{number}"
+
+
+def parse_oid(oid: str) -> Optional[int]:
+    if not oid.startswith(OID_PREFIX):
+        return None
+    try:
+        return int(oid[len(OID_PREFIX):])
+    except ValueError:
+        return None
+
+
+def highest_existing_oid(root) -> int:
+    places = root.get("places")
+    if places is None:
+        return 0
+    highest = 0
+    for key in places.keys():
+        number = parse_oid(key)
+        if number is not None and number > highest:
+            highest = number
+    return highest
+
+
+def seed_counter(root) -> OIDBlockCounter:
+    counter = root.get(COUNTER_KEY)
+    floor = highest_existing_oid(root) + 1
+    if counter is None:
+        counter = OIDBlockCounter(floor)
+        root[COUNTER_KEY] = counter
+    elif counter.next_id < floor:
+        counter.next_id = floor
+    return counter
+
+
+class PlaceOIDAllocator:
+    def __init__(self, block_size: int, max_attempts: int = 10):
+        self.block_size = block_size
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._next = 0
+        self._end = 0
+
+    def next_oid(self) -> str:
+        with self._lock:
+            if self._pid != os.getpid():
+                # A block reserved before fork() is shared with the parent.
+                self._pid = os.getpid()
+                self._next = self._end = 0
+            if self._next >= self._end:
+                self._next = self._reserve_block()
+                self._end = self._next + self.block_size
+            number = self._next
+            self._next += 1
+        return format_oid(number)
+
+    def _reserve_block(self) -> int:
+        # Runs in its own connection and transaction so the caller's request
+        # transaction never holds the shared counter. get_db() rather than a
+        # stored DB: after a fork it opens this process's own storage.
+        tm = transaction.TransactionManager()
+        for attempt in range(self.max_attempts):
+            connection = get_db().open(transaction_manager=tm)
+            try:
+                root = connection.root()
+                counter = root.get(COUNTER_KEY)
+                if counter is None:
+                    counter = seed_counter(root)
+                start = counter.reserve(self.block_size)
+                tm.commit()
+                return start
+            except ConflictError:
+                tm.abort()
+                time.sleep(random.uniform(0, 0.01 * (2 ** attempt)))
+            finally:
+                connection.close()
+        raise RuntimeError("Could not reserve a place OID block")
+
+
+_allocator: Optional[PlaceOIDAllocator] = None
+_allocator_lock = threading.Lock()
+
+
+def get_allocator() -> PlaceOIDAllocator:
+    global _allocator
+    if _allocator is None:
+        with _allocator_lock:
+            if _allocator is None:
+                _allocator = PlaceOIDAllocator(block_size=settings.PLACES_OID_BLOCK_SIZE)
+    return _allocator
+
+
+def allocate_oid() -> str:
+    return get_allocator().next_oid()
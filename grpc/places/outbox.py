@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import time
+from typing import Iterable, Optional
+
+import persistent
+import transaction
+from BTrees.LOBTree import LOBTree
+from BTrees.Length import Length
+from django.conf import settings
+from django.contrib.gis.geos import Point
+from django.db import transaction as db_transaction
+from ZODB.POSException import ConflictError
+
+from zodbapp.metrics import registry
+from zodbapp.zodb import conflict_backoff, get_db
+
+from . import clusters
+from .models import PlaceIndex
+from .signals import send_indexed
+from .spatial import PlaceRow, get_backend
+
+
+OUTBOX_KEY = "index_outbox"
+PENDING_KEY = "index_outbox_pending"
+STATE_KEY = "index_outbox_state"
+
+
+class OutboxState(persistent.Persistent):
+    def __init__(self):
+        self.high_water_mark = 0
+        self.indexed = 0
+        self.last_drained_at: Optional[float] = None
+
+
+def enabled() -> bool:
+    return settings.PLACES_INDEX_MODE == "outbox" and get_backend().name == "postgis"
+
+
+def enqueue(root, rows: Iterable[PlaceRow]) -> None:
+    outbox = root.get(OUTBOX_KEY)
+    if outbox is None:
+        outbox = root[OUTBOX_KEY] = LOBTree()
+        root[PENDING_KEY] = Length()
+    pending = root[PENDING_KEY]
+    # Keys are insertion timestamps; concurrent appends land in the same
+    # bucket, which BTree conflict resolution merges as long as keys differ.
+    key = time.time_ns()
+    count = 0
+    for row in rows:
+        while key in outbox:
+            key += 1
+        outbox[key] = (row.oid, row.name, row.lat, row.lng)
+        key += 1
+        count += 1
+    pending.change(count)
+
+
+def drain(batch_size: int) -> int:
+    # Returns 0 only when the outbox is empty. A batch that conflicts with
+    # concurrent enqueues is retried; ConflictError is raised once
+    # ZODB_CONFLICT_RETRIES is exhausted.
+    retries = settings.ZODB_CONFLICT_RETRIES
+    for attempt in range(retries + 1):
+        try:
+            return _drain_batch(batch_size)
+        except ConflictError:
+            registry.increment("zodb_conflicts")
+            if attempt == retries:
+                raise
+            registry.increment("zodb_conflict_retries")
+            conflict_backoff(attempt)
+
+
+def _drain_batch(batch_size: int) -> int:
+    tm = transaction.TransactionManager()
+    connection = get_db().open(transaction_manager=tm)
+    try:
+        root = connection.root()
+        outbox = root.get(OUTBOX_KEY)
+        if outbox is None:
+            return 0
+        batch = list(outbox.items()[:batch_size])
+        if not batch:
+            tm.abort()
+            return 0
+        rows = [PlaceRow(oid, name, lat, lng) for _key, (oid, name, lat, lng) in batch]
+        for key, _op in batch:
+            del outbox[key]
+        root[PENDING_KEY].change(-len(batch))
+        state = root.get(STATE_KEY)
+        if state is None:
+            state = root[STATE_KEY] = OutboxState()
+        state.high_water_mark = max(state.high_water_mark, batch[-1][0])
+        state.indexed += len(batch)
+        state.last_drained_at = time.time()
+        # PostGIS commits first and the outbox delete second, so a batch is
+        # applied at least once: if the SQL commit fails the entries stay
+        # queued, and if the ZODB commit then conflicts the batch is applied
+        # again. Re-applying is harmless: rows are upserted, and only rows not
+        # indexed yet (e.g. not repaired by reindex_places) are counted into
+        # the clusters.
+        with db_transaction.atomic():
+            existing = set(
+                PlaceIndex.objects.filter(oid__in=[row.oid for row in rows]).values_list("oid", flat=True)
+            )
+            PlaceIndex.objects.bulk_create(
+                [PlaceIndex(oid=row.oid, name=row.name, location=Point(row.lng, row.lat)) for row in rows],
+                update_conflicts=True,
+                unique_fields=["oid"],
+                update_fields=["name", "location"],
+            )
+            if clusters.enabled():
+                clusters.add_rows(row for row in rows if row.oid not in existing)
+        try:
+            tm.commit()
+        except ConflictError:
+            tm.abort()
+            raise
+        send_indexed(PlaceRow, rows)
+        return len(batch)
+    finally:
+        connection.close()
+
+
+def lag() -> dict[str, float]:
+    # Called on every metrics scrape; without the outbox there is nothing to
+    # report, so no ZODB connection is opened.
+    if not enabled():
+        return {}
+    tm = transaction.TransactionManager()
+    connection = get_db().open(transaction_manager=tm)
+    try:
+        root = connection.root()
+        outbox = root.get(OUTBOX_KEY)
+        if outbox is None:
+            return {"places_outbox_pending": 0, "places_outbox_lag_seconds": 0}
+        try:
+            oldest = outbox.minKey()
+        except ValueError:
+            oldest = None
+        state = root.get(STATE_KEY)
+        return {
+            "places_outbox_pending": root[PENDING_KEY].value,
+            "places_outbox_lag_seconds": (time.time_ns() - oldest) / 1e9 if oldest is not None else 0,
+            "places_outbox_indexed": state.indexed if state is not None else 0,
+            "places_outbox_high_water_mark": state.high_water_mark if state is not None else 0,
+        }
+    finally:
+        tm.abort()
+        connection.close()
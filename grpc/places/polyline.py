@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+from typing import Any
+
+
+def decode(encoded: str, precision: int = 5) -> list[tuple[float, float]]:
+    # Google's encoded polyline format; returns (lng, lat) pairs like GeoJSON.
+    factor = 10.0**precision
+    coords = []
+    index = lat = lng = 0
+    length = len(encoded)
+    while index < length:
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                if index >= length:
+                    raise ValueError("Truncated polyline")
+                byte = ord(encoded[index]) - 63
+                index += 1
+                if byte < 0 or byte > 63:
+                    raise ValueError("Invalid polyline character")
+                result |= (byte & 0x1F) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lng += deltas[1]
+        coords.append((lng / factor, lat / factor))
+    return coords
+
+
+def from_geojson(obj: Any) -> list[tuple[float, float]]:
+    # Accepts a LineString geometry or a Feature wrapping one.
+    if isinstance(obj, dict) and obj.get("type") == "Feature":
+        obj = obj.get("geometry")
+    if not isinstance(obj, dict) or obj.get("type") != "LineString":
+        raise ValueError("Expected a GeoJSON LineString")
+    try:
+        return [(float(point[0]), float(point[1])) for point in obj["coordinates"]]
+    except (KeyError, TypeError, ValueError, IndexError):
+        raise ValueError("Invalid LineString coordinates")
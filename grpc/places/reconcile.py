@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import json
+import math
+import os
+import tempfile
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Optional
+
+import transaction
+from django.contrib.gis.geos import Point
+from django.db import connection as db_connection, transaction as db_transaction
+
+from zodbapp.zodb import get_db
+
+from . import clusters
+from .models import PlaceIndex
+from .oids import COUNTER_KEY, format_oid, highest_existing_oid
+from .signals import send_indexed
+from .spatial import PlaceRow
+from .store import get_places
+
+
+# Coordinates closer than this (degrees, ~1 cm) count as equal.
+COORD_TOLERANCE = 1e-7
+
+
+@dataclass
+class ChunkResult:
+    chunk: int
+    places: int = 0
+    missing: int = 0
+    changed: int = 0
+    extra: int = 0
+    unlocated: int = 0
+
+
+def oid_limit(root) -> int:
+    # Every numeric OID handed out so far is below the counter; without one,
+    # fall back to scanning the store for the highest.
+    counter = root.get(COUNTER_KEY)
+    if counter is not None:
+        return counter.next_id
+    return highest_existing_oid(root) + 1
+
+
+# Chunks are ranges of keys in code point order, bounded by every OID of
+# ``digits`` digits: "p-12" is followed by p-120..p-129, p-1200.. and so on,
+# so each chunk is one contiguous range of every shard, read bucket after
+# bucket, and no bucket is loaded by two chunks. The first and last chunks
+# are open-ended, so together the chunks cover every key, including legacy
+# and non-numeric ones and OIDs above the counter.
+def prefix_digits(limit: int, chunk_size: int) -> int:
+    # A k-digit prefix covers about 1.1 * 10^(d - k) of the OIDs below a
+    # d-digit limit; pick k so the largest chunks hold about chunk_size.
+    digits = len(str(max(limit - 1, 1)))
+    return max(1, digits - int(math.log10(max(chunk_size, 1))))
+
+
+def _boundaries(digits: int) -> list[str]:
+    start = 10 ** (digits - 1)
+    return [format_oid(number) for number in range(start, start * 10)]
+
+
+def chunk_count(digits: int) -> int:
+    return len(_boundaries(digits)) + 1
+
+
+def key_range(chunk: int, digits: int) -> tuple[Optional[str], Optional[str]]:
+    # [low, high); None leaves that end open.
+    bounds = _boundaries(digits)
+    low = bounds[chunk - 1] if chunk > 0 else None
+    high = bounds[chunk] if chunk < len(bounds) else None
+    return low, high
+
+
+def _zodb_rows(items) -> tuple[dict[str, tuple], int]:
+    rows = {}
+    unlocated = 0
+    for oid, place in items:
+        if place.lat is None or place.lng is None:
+            unlocated += 1
+            continue
+        rows[oid] = (place.name, place.lat, place.lng)
+    return rows, unlocated
+
+
+def _postgis_rows(low: Optional[str], high: Optional[str]) -> dict[str, tuple]:
+    # COLLATE "C" compares code points, as Python does, and is answered from
+    # the index added in migration 0007.
+    table = db_connection.ops.quote_name(PlaceIndex._meta.db_table)
+    sql = f"SELECT oid, name, ST_Y(location::geometry), ST_X(location::geometry) FROM {table}"
+    conditions, params = [], []
+    if low is not None:
+        conditions.append('oid COLLATE "C" >= %s')
+        params.append(low)
+    if high is not None:
+        conditions.append('oid COLLATE "C" < %s')
+        params.append(high)
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    with db_connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return {oid: (name, lat, lng) for oid, name, lat, lng in cursor.fetchall()}
+
+
+def _absent_from_zodb(oids: set[str]) -> set[str]:
+    # A place committed after the chunk's snapshot was read already has its
+    # index row (ZODB commits before the SQL transaction holding the row),
+    # so look again with a fresh connection before calling a row extra.
+    tm = transaction.TransactionManager()
+    connection = get_db().open(transaction_manager=tm)
+    try:
+        places = get_places(connection.root())
+        return {oid for oid in oids if oid not in places}
+    finally:
+        tm.abort()
+        connection.close()
+
+
+def _differs(a: tuple, b: tuple) -> bool:
+    return a[0] != b[0] or abs(a[1] - b[1]) > COORD_TOLERANCE or abs(a[2] - b[2]) > COORD_TOLERANCE
+
+
+def reconcile_chunk(chunk: int, digits: int, dry_run: bool = False) -> ChunkResult:
+    low, high = key_range(chunk, digits)
+    tm = transaction.TransactionManager()
+    connection = get_db().open(transaction_manager=tm)
+    try:
+        items = list(get_places(connection.root()).items(min=low, max=high, excludemax=high is not None))
+        # One round trip for the chunk's places rather than a load each.
+        connection.prefetch([place for _oid, place in items])
+        zodb, unlocated = _zodb_rows(items)
+    finally:
+        tm.abort()
+        connection.cacheMinimize()
+        connection.close()
+
+    postgis = _postgis_rows(low, high)
+    missing = zodb.keys() - postgis.keys()
+    extra = postgis.keys() - zodb.keys()
+    if extra:
+        extra = _absent_from_zodb(extra)
+    changed = {oid for oid in zodb.keys() & postgis.keys() if _differs(zodb[oid], postgis[oid])}
+    result = ChunkResult(
+        chunk=chunk,
+        places=len(zodb),
+        missing=len(missing),
+        changed=len(changed),
+        extra=len(extra),
+        unlocated=unlocated,
+    )
+    if dry_run or not (missing or changed or extra):
+        return result
+    with db_transaction.atomic():
+        repair = sorted(missing | changed)
+        if repair:
+            PlaceIndex.objects.bulk_create(
+                [
+                    PlaceIndex(oid=oid, name=zodb[oid][0], location=Point(zodb[oid][2], zodb[oid][1], srid=4326))
+                    for oid in repair
+                ],
+                batch_size=1000,
+                update_conflicts=True,
+                unique_fields=["oid"],
+                update_fields=["name", "location"],
+            )
+        if extra:
+            PlaceIndex.objects.filter(oid__in=sorted(extra)).delete()
+        if clusters.enabled():
+            # Moved rows leave their old cells and join their new ones. The
+            # outbox drain only counts rows it finds missing, so a place
+            # repaired here before its entry drains is counted once.
+            clusters.remove_rows([PlaceRow(oid, *postgis[oid]) for oid in sorted(changed | extra)])
+            clusters.add_rows([PlaceRow(oid, *zodb[oid]) for oid in repair])
+    if repair:
+        send_indexed(PlaceRow, [PlaceRow(oid, *zodb[oid]) for oid in repair])
+    return result
+
+
+class Checkpoint:
+    # Completed chunk ids and the chunk layout they refer to, rewritten
+    # atomically after each chunk so an interrupted run resumes where it
+    # stopped. Any layout covers every key, so a resumed run keeps the one it
+    # started with even if the OID counter has moved on since.
+    def __init__(self, path: Optional[Path]):
+        self.path = path
+        self.digits: Optional[int] = None
+        self.done: set[int] = set()
+        self.totals = asdict(ChunkResult(chunk=0))
+        del self.totals["chunk"]
+
+    def load(self) -> None:
+        if self.path is None or not self.path.exists():
+            return
+        state = json.loads(self.path.read_text())
+        if "digits" not in state:
+            raise ValueError(f"Checkpoint {self.path} was written by an older version of reindex_places")
+        self.digits = state["digits"]
+        self.done = set(state["done"])
+        self.totals.update(state.get("totals", {}))
+
+    def record(self, result: ChunkResult) -> None:
+        self.done.add(result.chunk)
+        for key in self.totals:
+            self.totals[key] += getattr(result, key)
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        state = {"digits": self.digits, "done": sorted(self.done), "totals": self.totals}
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+        with os.fdopen(fd, "w") as fh:
+            json.dump(state, fh)
+        os.replace(tmp, self.path)
+
+    def clear(self) -> None:
+        if self.path is not None and self.path.exists():
+            self.path.unlink()
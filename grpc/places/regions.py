@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import json
+import threading
+from functools import cached_property
+from typing import Any, Optional
+
+from django.conf import settings
+from django.contrib.gis.geos import GEOSException, GEOSGeometry, MultiPolygon, Polygon
+
+from .cache import LocalStore
+from .models import Region
+
+
+# Longest edge, in degrees, of the rings built for a bbox. Geography edges are
+# great circles; short edges keep a box's north and south sides on their parallels.
+BBOX_STEP_DEG = 1.0
+BBOX_MAX_WIDTH_DEG = 90.0
+
+
+class RegionShape:
+    def __init__(self, geometry: GEOSGeometry):
+        self.geometry = geometry
+
+    @cached_property
+    def prepared(self):
+        # GEOS prepared geometry for repeated point tests; built on first use
+        # and kept with the cached region.
+        return self.geometry.prepared
+
+
+def parse_geojson(obj: Any) -> GEOSGeometry:
+    if isinstance(obj, dict) and obj.get("type") == "Feature":
+        obj = obj.get("geometry")
+    if not isinstance(obj, dict) or obj.get("type") not in ("Polygon", "MultiPolygon"):
+        raise ValueError("Expected a GeoJSON Polygon or MultiPolygon")
+    try:
+        geometry = GEOSGeometry(json.dumps(obj), srid=4326)
+    except (GEOSException, ValueError, TypeError):
+        raise ValueError("Invalid GeoJSON geometry")
+    if geometry.num_coords > settings.PLACES_REGION_MAX_POINTS:
+        raise ValueError(f"Polygons may have at most {settings.PLACES_REGION_MAX_POINTS} points")
+    if not geometry.valid:
+        raise ValueError(f"Invalid polygon: {geometry.valid_reason}")
+    return geometry
+
+
+def _box(min_lng: float, min_lat: float, max_lng: float, max_lat: float) -> Polygon:
+    steps = max(1, int((max_lng - min_lng) / BBOX_STEP_DEG))
+    south = [(min_lng + (max_lng - min_lng) * i / steps, min_lat) for i in range(steps + 1)]
+    north = [(lng, max_lat) for lng, _lat in reversed(south)]
+    return Polygon(south + north + [south[0]], srid=4326)
+
+
+def bbox_geometry(min_lng: float, min_lat: float, max_lng: float, max_lat: float) -> MultiPolygon:
+    if not (-90.0 <= min_lat < max_lat <= 90.0 and -180.0 <= min_lng <= 180.0 and -180.0 <= max_lng <= 180.0):
+        raise ValueError("bbox must be min_lng,min_lat,max_lng,max_lat in degrees")
+    # A box crossing the antimeridian (min_lng > max_lng) is split in two, and
+    # wide boxes in narrower slices so no ring spans a hemisphere.
+    spans = [(min_lng, max_lng)] if min_lng < max_lng else [(min_lng, 180.0), (-180.0, max_lng)]
+    boxes = []
+    for west, east in spans:
+        while east - west > BBOX_MAX_WIDTH_DEG:
+            boxes.append(_box(west, min_lat, west + BBOX_MAX_WIDTH_DEG, max_lat))
+            west += BBOX_MAX_WIDTH_DEG
+        if east > west:
+            boxes.append(_box(west, min_lat, east, max_lat))
+    return MultiPolygon(*boxes, srid=4326)
+
+
+def simplify(geometry: GEOSGeometry) -> MultiPolygon:
+    simplified = geometry.simplify(settings.PLACES_REGION_SIMPLIFY_TOLERANCE, preserve_topology=True)
+    if simplified.geom_type == "Polygon":
+        simplified = MultiPolygon(simplified, srid=4326)
+    simplified.srid = 4326
+    return simplified
+
+
+def save_region(name: str, geometry: GEOSGeometry) -> Region:
+    if geometry.geom_type == "Polygon":
+        geometry = MultiPolygon(geometry, srid=4326)
+    region, _created = Region.objects.update_or_create(name=name, defaults={"geometry": geometry})
+    return region
+
+
+_cache: Optional[LocalStore] = None
+_cache_lock = threading.Lock()
+
+
+def _store() -> LocalStore:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LocalStore(settings.PLACES_REGION_CACHE_MAX_ENTRIES)
+    return _cache
+
+
+def get_region(name: str) -> Optional[RegionShape]:
+    # Large district shapes are parsed and prepared once per process, then
+    # served from memory until the TTL runs out or this process saves them.
+    # Saves in other processes are not seen before the TTL runs out.
+    store = _store()
+    cached = store.get(name)
+    if cached is not None:
+        return cached
+    simplified = Region.objects.filter(name=name).values_list("simplified", flat=True).first()
+    if simplified is None:
+        return None
+    cached = RegionShape(simplified)
+    store.set(name, cached, settings.PLACES_REGION_CACHE_TTL)
+    return cached
+
+
+def on_region_changed(sender, instance, **kwargs) -> None:
+    _store().delete([instance.name])
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import math
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import Optional
+
+import persistent
+from BTrees.IIBTree import IIBTree
+from BTrees.Length import Length
+from BTrees.OOBTree import OOBTree
+from django.conf import settings
+
+from .oids import format_oid, parse_oid
+from .spatial import get_backend
+
+
+INDEX_KEY = "search_index"
+MAX_TERM_LENGTH = 64
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class SearchIndex(persistent.Persistent):
+    # ``postings`` maps term -> IIBTree(doc id -> term frequency); doc ids are
+    # the numeric part of place OIDs. Concurrent inserts touch different doc
+    # ids, so BTree conflict resolution merges them, and the Length counters
+    # resolve by summing.
+    def __init__(self):
+        self.postings = OOBTree()
+        self.doc_lengths = IIBTree()
+        self.doc_count = Length()
+        self.total_length = Length()
+
+
+def tokenize(text: str) -> list[str]:
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    return [token[:MAX_TERM_LENGTH] for token in _TOKEN_RE.findall(text)]
+
+
+def get_index(root, create: bool = False) -> Optional[SearchIndex]:
+    index = root.get(INDEX_KEY)
+    if index is None and create:
+        index = root[INDEX_KEY] = SearchIndex()
+    return index
+
+
+def index_place(root, oid: str, name: str, description: str) -> None:
+    # Runs in the transaction that stores the place, so the index never
+    # lists a place that was rolled back.
+    docid = parse_oid(oid)
+    if docid is None:
+        return
+    index = get_index(root, create=True)
+    if docid in index.doc_lengths:
+        return
+    terms = tokenize(name) + tokenize(description)
+    if not terms:
+        return
+    frequencies: dict[str, int] = {}
+    for term in terms:
+        frequencies[term] = frequencies.get(term, 0) + 1
+    for term, tf in frequencies.items():
+        postings = index.postings.get(term)
+        if postings is None:
+            postings = index.postings[term] = IIBTree()
+        postings[docid] = tf
+    index.doc_lengths[docid] = len(terms)
+    index.doc_count.change(1)
+    index.total_length.change(len(terms))
+
+
+def _expand(index: SearchIndex, token: str) -> list[str]:
+    # Every query token also matches terms it is a prefix of, most of which
+    # come from the tail of a query typed as you go.
+    terms = []
+    for term in index.postings.keys(min=token, max=token + "\U0010ffff"):
+        terms.append(term)
+        if len(terms) >= settings.PLACES_SEARCH_MAX_EXPANSIONS:
+            break
+    return terms
+
+
+@dataclass
+class SearchHit:
+    oid: str
+    score: float
+    distance_m: Optional[float] = None
+
+
+def search(
+    root,
+    q: str,
+    limit: int,
+    lat: Optional[float] = None,
+    lng: Optional[float] = None,
+    km: Optional[float] = None,
+) -> list[SearchHit]:
+    index = get_index(root)
+    tokens = list(dict.fromkeys(tokenize(q)))
+    if index is None or not tokens:
+        return []
+    n = index.doc_count.value or 1
+    avgdl = index.total_length.value / n or 1.0
+
+    # BM25 over the expanded terms of each token; a place must match every
+    # token (through any of its expansions) to be returned.
+    scores: Optional[dict[int, float]] = None
+    for token in tokens:
+        token_scores: dict[int, float] = {}
+        for term in _expand(index, token):
+            postings = index.postings[term]
+            df = len(postings)
+            idf = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+            if scores is not None and len(scores) < df:
+                # Later tokens only need the documents still in the running.
+                pairs = ((docid, postings.get(docid)) for docid in scores)
+            else:
+                pairs = postings.items()
+            for docid, tf in pairs:
+                if not tf or (scores is not None and docid not in scores):
+                    continue
+                norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * index.doc_lengths.get(docid, 0) / avgdl)
+                token_scores[docid] = token_scores.get(docid, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+        if scores is None:
+            scores = token_scores
+        else:
+            scores = {docid: scores[docid] + score for docid, score in token_scores.items()}
+        if not scores:
+            return []
+
+    hits = [SearchHit(format_oid(docid), score) for docid, score in scores.items()]
+    if lat is not None and lng is not None and km is not None:
+        # Intersect with the spatial index and reward closeness: a place at
+        # the centre gains PLACES_SEARCH_DISTANCE_WEIGHT, one on the rim none.
+        nearby = {
+            hit.oid: hit.distance_m
+            for hit in get_backend().iter_nearby(root, lat, lng, km, settings.PLACES_SEARCH_SPATIAL_LIMIT)
+        }
+        radius_m = km * 1000.0
+        weight = settings.PLACES_SEARCH_DISTANCE_WEIGHT
+        hits = [hit for hit in hits if hit.oid in nearby]
+        for hit in hits:
+            hit.distance_m = nearby[hit.oid]
+            hit.score += weight * max(0.0, 1.0 - hit.distance_m / radius_m)
+    hits.sort(key=lambda hit: (-hit.score, hit.oid))
+    return hits[:limit]
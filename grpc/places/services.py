@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import base64
+import contextlib
+import functools
+import json
+import threading
+from itertools import islice
+from typing import Any, Iterator, Optional
+
+from django.conf import settings
+from django.db import close_old_connections, transaction as db_transaction
+
+from zodbapp.groupcommit import GroupCommitter
+from zodbapp.zodb import get_db
+
+from . import outbox, search
+from .oids import allocate_oid
+from .signals import send_indexed
+from .spatial import CorridorHit, NearbyHit, NearbyQuery, PlaceRow, get_backend
+from .store import Place, get_places, load_places
+
+
+NEARBY_CHUNK_SIZE = 200
+
+
+def _send_indexed(committed: bool, rows: list[PlaceRow]) -> None:
+    # ZODB commits inside the SQL transaction that inserts the PlaceIndex
+    # rows, so wait for that one too; outside an atomic block on_commit runs
+    # the callback straight away.
+    if committed:
+        db_transaction.on_commit(lambda: send_indexed(PlaceRow, rows))
+
+
+def index_places(root, rows: list[PlaceRow]) -> None:
+    if outbox.enabled():
+        # Queued in the same ZODB transaction as the places; run_indexer
+        # applies them to PostGIS later and sends places_indexed itself.
+        outbox.enqueue(root, rows)
+        return
+    # Clusters are not counted here: the low zooms are a few rows shared by
+    # every place, and locking them until the request commits would
+    # serialize all creates. See places.clusters.
+    get_backend().add(root, rows)
+    # Notify only once the places are visible in both stores; invalidating
+    # caches earlier would let a concurrent reader re-cache the old page or
+    # tile before the commit.
+    root._p_jar.transaction_manager.get().addAfterCommitHook(_send_indexed, args=(rows,))
+
+
+def _stage_place(name: str, description: str, lat: float, lng: float, root) -> PlaceRow:
+    places = get_places(root, create=True)
+    oid = allocate_oid()
+    places[oid] = Place(name=name, description=description, lat=lat, lng=lng)
+    search.index_place(root, oid, name, description)
+    return PlaceRow(oid, name, lat, lng)
+
+
+def create_place(root, name: str, description: str, lat: float, lng: float) -> str:
+    row = _stage_place(name, description, lat, lng, root)
+    index_places(root, [row])
+    return row.oid
+
+
+@contextlib.contextmanager
+def _batch_atomic() -> Iterator[None]:
+    # The committer thread keeps its database connection between batches, so
+    # drop it first if it has gone bad or outlived CONN_MAX_AGE, as Django
+    # does at the start of every request.
+    close_old_connections()
+    with db_transaction.atomic():
+        yield
+
+
+_group_committer: Optional[GroupCommitter] = None
+_group_committer_lock = threading.Lock()
+
+
+def get_group_committer() -> GroupCommitter:
+    global _group_committer
+    if _group_committer is None:
+        with _group_committer_lock:
+            if _group_committer is None:
+                _group_committer = GroupCommitter(
+                    get_db,
+                    window=settings.ZODB_GROUP_COMMIT_WINDOW_MS / 1000.0,
+                    max_batch=settings.ZODB_GROUP_COMMIT_MAX_BATCH,
+                    before_commit=index_places,
+                    commit_context=_batch_atomic,
+                )
+    return _group_committer
+
+
+def create_place_grouped(name: str, description: str, lat: float, lng: float) -> str:
+    # Runs on the committer thread, in a transaction shared with other
+    # concurrent creates rather than the caller's: the place is committed to
+    # both stores when this returns, even if the caller's request later rolls
+    # back. The whole batch is indexed with one multi-row insert.
+    row = get_group_committer().submit(functools.partial(_stage_place, name, description, lat, lng))
+    return row.oid
+
+
+def _encode_key(position: float, oid: str) -> str:
+    raw = json.dumps([position, oid], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def encode_cursor(hit: NearbyHit) -> str:
+    return _encode_key(hit.distance_m, hit.oid)
+
+
+def encode_corridor_cursor(hit: CorridorHit) -> str:
+    # Same shape as nearby cursors, keyed on the position along the line.
+    return _encode_key(hit.fraction, hit.oid)
+
+
+def decode_cursor(cursor: str) -> tuple[float, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        distance_m, oid = json.loads(raw)
+        return float(distance_m), str(oid)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+
+def iter_nearby(
+    connection,
+    root,
+    lat: float,
+    lng: float,
+    km: float,
+    limit: Optional[int] = None,
+    after: Optional[tuple[float, str]] = None,
+) -> Iterator[tuple[NearbyHit, Optional[Place]]]:
+    # Places are resolved one prefetch per chunk, so the number of storage
+    # round trips grows with chunks rather than rows.
+    hits = get_backend().iter_nearby(root, lat, lng, km, limit, chunk_size=NEARBY_CHUNK_SIZE, after=after)
+    places = get_places(root)
+    while True:
+        chunk = list(islice(hits, NEARBY_CHUNK_SIZE))
+        if not chunk:
+            return
+        loaded = load_places(connection, places, (hit.oid for hit in chunk))
+        for hit in chunk:
+            yield hit, loaded.get(hit.oid)
+
+
+def corridor_page(
+    connection, root, coords: list[tuple[float, float]], buffer_m: float, page_size: int, after=None
+) -> tuple[list[tuple[CorridorHit, Optional[Place]]], Optional[str]]:
+    # One extra row tells us whether another page exists.
+    hits = list(get_backend().iter_corridor(root, coords, buffer_m, page_size + 1, after=after))
+    next_cursor = encode_corridor_cursor(hits[page_size - 1]) if len(hits) > page_size else None
+    hits = hits[:page_size]
+    loaded = load_places(connection, get_places(root), (hit.oid for hit in hits))
+    return [(hit, loaded.get(hit.oid)) for hit in hits], next_cursor
+
+
+def within_page(
+    connection, root, shape, page_size: int, after: Optional[str] = None
+) -> tuple[list[tuple[PlaceRow, Optional[Place]]], Optional[str]]:
+    rows = list(get_backend().iter_within(root, shape, page_size + 1, after=after))
+    next_cursor = rows[page_size - 1].oid if len(rows) > page_size else None
+    rows = rows[:page_size]
+    loaded = load_places(connection, get_places(root), (row.oid for row in rows))
+    return [(row, loaded.get(row.oid)) for row in rows], next_cursor
+
+
+def nearby_batch(
+    connection, root, queries: list[NearbyQuery]
+) -> list[list[tuple[NearbyHit, Optional[Place]]]]:
+    # Points close together share places; each one is loaded once, in a
+    # single prefetch over the union of every query's hits.
+    grouped = get_backend().nearby_batch(root, queries)
+    oids = {hit.oid for hits in grouped for hit in hits}
+    loaded = load_places(connection, get_places(root), oids)
+    return [[(hit, loaded.get(hit.oid)) for hit in hits] for hits in grouped]
+
+
+def nearest(
+    connection, root, lat: float, lng: float, k: int, max_km: Optional[float] = None
+) -> list[tuple[NearbyHit, Optional[Place]]]:
+    hits = get_backend().nearest(root, lat, lng, k, max_km)
+    loaded = load_places(connection, get_places(root), (hit.oid for hit in hits))
+    return [(hit, loaded.get(hit.oid)) for hit in hits]
+
+
+def place_result(hit: NearbyHit | CorridorHit | PlaceRow, place: Optional[Place]) -> dict[str, Any]:
+    return {
+        "oid": hit.oid,
+        "name": hit.name,
+        "lat": hit.lat,
+        "lng": hit.lng,
+        "description": getattr(place, "description", ""),
+    }
@@ -0,0 +1,25 @@
+import logging
+
+from django.dispatch import Signal
+
+
+logger = logging.getLogger(__name__)
+
+# Sent with ``rows`` (a list of spatial.PlaceRow) once new places are visible
+# in the spatial index: after the ZODB and SQL commits, or after run_indexer
+# applied them when the outbox is in use.
+places_indexed = Signal()
+
+# Sent with ``matches`` ({place oid: [geofence id, ...]}) for the places of an
+# indexed batch that fall inside at least one geofence.
+geofences_matched = Signal()
+
+
+def send_indexed(sender, rows) -> None:
+    # Receivers are independent caches and hooks; one that fails must not
+    # keep the others from running, and there is no caller left to raise to.
+    for receiver, result in places_indexed.send_robust(sender=sender, rows=rows):
+        if isinstance(result, Exception):
+            logger.error(
+                "places_indexed receiver %r failed", receiver, exc_info=(type(result), result, result.__traceback__)
+            )
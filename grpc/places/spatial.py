@@ -0,0 +1,349 @@
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Optional
+
+from BTrees.OOBTree import OOBTree
+from django.conf import settings
+from django.contrib.gis.db.models import GeometryField
+from django.contrib.gis.db.models.functions import Distance, GeometryDistance, LineLocatePoint
+from django.contrib.gis.geos import LineString, Point
+from django.contrib.gis.measure import D
+from django.db import connection
+from django.db.models import Q
+from django.db.models.functions import Cast
+
+from . import geohash
+from .models import PlaceIndex
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional for the postgis backend
+    np = None
+
+
+EARTH_RADIUS_M = 6371008.8
+CELL_PRECISION = 9
+NEAREST_START_KM = 1.0
+# Half the Earth's circumference: a circle this size covers the globe.
+MAX_SEARCH_KM = 20038.0
+
+
+@dataclass
+class PlaceRow:
+    oid: str
+    name: str
+    lat: float
+    lng: float
+
+
+@dataclass
+class NearbyQuery:
+    lat: float
+    lng: float
+    km: float
+    limit: int
+
+
+@dataclass
+class NearbyHit:
+    oid: str
+    name: str
+    lat: float
+    lng: float
+    distance_m: float
+
+
+@dataclass
+class CorridorHit:
+    oid: str
+    name: str
+    lat: float
+    lng: float
+    distance_m: float
+    # Position of the closest point of the line, 0 at its start and 1 at its end.
+    fraction: float
+
+
+_BATCH_SQL = """
+SELECT q.idx, hit.oid, hit.name, hit.lat, hit.lng, hit.distance_m
+FROM unnest(%(idx)s::int[], %(lat)s::float8[], %(lng)s::float8[], %(radius)s::float8[], %(lim)s::int[])
+    AS q(idx, lat, lng, radius_m, lim)
+CROSS JOIN LATERAL (
+    SELECT p.oid, p.name, ST_Y(p.location::geometry) AS lat, ST_X(p.location::geometry) AS lng,
+           ST_Distance(p.location, ST_SetSRID(ST_MakePoint(q.lng, q.lat), 4326)::geography) AS distance_m
+    FROM {table} AS p
+    WHERE ST_DWithin(p.location, ST_SetSRID(ST_MakePoint(q.lng, q.lat), 4326)::geography, q.radius_m)
+    ORDER BY distance_m, p.oid
+    LIMIT q.lim
+) AS hit
+ORDER BY q.idx, hit.distance_m, hit.oid
+"""
+
+
+class PostGISBackend:
+    name = "postgis"
+
+    def add(self, root, rows: Iterable[PlaceRow]) -> None:
+        PlaceIndex.objects.bulk_create(
+            [PlaceIndex(oid=row.oid, name=row.name, location=Point(row.lng, row.lat)) for row in rows]
+        )
+
+    def iter_nearby(
+        self,
+        root,
+        lat: float,
+        lng: float,
+        km: float,
+        limit: Optional[int] = None,
+        chunk_size: int = 500,
+        after: Optional[tuple[float, str]] = None,
+    ) -> Iterator[NearbyHit]:
+        ref = Point(lng, lat)
+        qs = (
+            PlaceIndex.objects.filter(location__distance_lte=(ref, D(km=km)))
+            .annotate(distance=Distance("location", ref))
+            .order_by("distance", "oid")
+            .only("oid", "name", "location")
+        )
+        if after is not None:
+            distance_m, oid = after
+            qs = qs.filter(Q(distance__gt=D(m=distance_m)) | Q(distance=D(m=distance_m), oid__gt=oid))
+        if limit is not None:
+            qs = qs[:limit]
+        for idx in qs.iterator(chunk_size=chunk_size):
+            yield NearbyHit(idx.oid, idx.name, idx.location.y, idx.location.x, idx.distance.m)
+
+    def nearby(self, root, lat: float, lng: float, km: float, limit: int) -> list[NearbyHit]:
+        return list(self.iter_nearby(root, lat, lng, km, limit))
+
+    def nearby_batch(self, root, queries: list[NearbyQuery]) -> list[list[NearbyHit]]:
+        # All queries travel as parallel arrays and run as one LATERAL join:
+        # one statement and one round trip whatever the number of points.
+        results: list[list[NearbyHit]] = [[] for _ in queries]
+        if not queries:
+            return results
+        sql = _BATCH_SQL.format(table=connection.ops.quote_name(PlaceIndex._meta.db_table))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                sql,
+                {
+                    "idx": list(range(len(queries))),
+                    "lat": [q.lat for q in queries],
+                    "lng": [q.lng for q in queries],
+                    "radius": [q.km * 1000.0 for q in queries],
+                    "lim": [q.limit for q in queries],
+                },
+            )
+            for idx, oid, name, lat, lng, distance_m in cursor.fetchall():
+                results[idx].append(NearbyHit(oid, name, lat, lng, distance_m))
+        return results
+
+    def iter_corridor(
+        self,
+        root,
+        coords: list[tuple[float, float]],
+        buffer_m: float,
+        limit: Optional[int] = None,
+        chunk_size: int = 500,
+        after: Optional[tuple[float, str]] = None,
+    ) -> Iterator[CorridorHit]:
+        # ST_DWithin against the whole line is answered from the geography
+        # index; ST_LineLocatePoint needs geometry, so only that side is cast.
+        line = LineString(coords, srid=4326)
+        qs = (
+            PlaceIndex.objects.filter(location__dwithin=(line, D(m=buffer_m)))
+            .annotate(
+                fraction=LineLocatePoint(line, Cast("location", GeometryField(srid=4326))),
+                distance=Distance("location", line),
+            )
+            .order_by("fraction", "oid")
+            .only("oid", "name", "location")
+        )
+        if after is not None:
+            fraction, oid = after
+            qs = qs.filter(Q(fraction__gt=fraction) | Q(fraction=fraction, oid__gt=oid))
+        if limit is not None:
+            qs = qs[:limit]
+        for idx in qs.iterator(chunk_size=chunk_size):
+            yield CorridorHit(idx.oid, idx.name, idx.location.y, idx.location.x, idx.distance.m, idx.fraction)
+
+    def iter_within(
+        self,
+        root,
+        shape,
+        limit: Optional[int] = None,
+        chunk_size: int = 500,
+        after: Optional[str] = None,
+    ) -> Iterator[PlaceRow]:
+        # ST_Intersects on geography starts with an index-assisted && on the
+        # shape's box, then tests only the rows inside it.
+        qs = (
+            PlaceIndex.objects.filter(location__intersects=shape.geometry)
+            .order_by("oid")
+            .only("oid", "name", "location")
+        )
+        if after is not None:
+            qs = qs.filter(oid__gt=after)
+        if limit is not None:
+            qs = qs[:limit]
+        for idx in qs.iterator(chunk_size=chunk_size):
+            yield PlaceRow(idx.oid, idx.name, idx.location.y, idx.location.x)
+
+    def nearest(self, root, lat: float, lng: float, k: int, max_km: Optional[float] = None) -> list[NearbyHit]:
+        # ORDER BY location <-> ref LIMIT k walks the GiST index nearest-first
+        # and stops after k rows, however many places surround the point. On
+        # geography <-> is the sphere distance in metres.
+        ref = Point(lng, lat, srid=4326)
+        qs = PlaceIndex.objects.all()
+        if max_km is not None:
+            qs = qs.filter(location__dwithin=(ref, D(km=max_km)))
+        qs = qs.annotate(knn=GeometryDistance("location", ref)).order_by("knn").only("oid", "name", "location")
+        hits = [NearbyHit(idx.oid, idx.name, idx.location.y, idx.location.x, idx.knn) for idx in qs[:k]]
+        # Ties are broken here; a second ORDER BY key would stop the index scan.
+        hits.sort(key=lambda hit: (hit.distance_m, hit.oid))
+        return hits
+
+
+class ZODBCellBackend:
+    # Points live in one OOBTree keyed "<geohash>|<oid>", so every geohash
+    # prefix (a coarser cell) is a contiguous key range and any cell size can
+    # be scanned without maintaining one tree per precision.
+    name = "zodb"
+    root_key = "place_cells"
+
+    def _cells(self, root, create: bool = False):
+        cells = root.get(self.root_key)
+        if cells is None and create:
+            cells = root[self.root_key] = OOBTree()
+        return cells
+
+    def add(self, root, rows: Iterable[PlaceRow]) -> None:
+        cells = self._cells(root, create=True)
+        for row in rows:
+            key = f"{geohash.encode(row.lat, row.lng, CELL_PRECISION)}|{row.oid}"
+            cells[key] = (row.lat, row.lng, row.name)
+
+    def candidates(self, root, lat: float, lng: float, km: float) -> list[tuple[str, tuple]]:
+        cells = self._cells(root)
+        if cells is None:
+            return []
+        found = []
+        for prefix in geohash.covering_cells(lat, lng, km, max_precision=CELL_PRECISION):
+            found.extend(cells.items(min=prefix, max=prefix + "~"))
+        return found
+
+    def nearby(
+        self,
+        root,
+        lat: float,
+        lng: float,
+        km: float,
+        limit: Optional[int],
+        after: Optional[tuple[float, str]] = None,
+    ) -> list[NearbyHit]:
+        found = self.candidates(root, lat, lng, km)
+        if not found:
+            return []
+        lats = [value[0] for _key, value in found]
+        lngs = [value[1] for _key, value in found]
+        distances = haversine_m(lat, lng, lats, lngs)
+        radius_m = km * 1000.0
+        hits = [
+            NearbyHit(key.split("|", 1)[1], value[2], value[0], value[1], float(distance))
+            for (key, value), distance in zip(found, distances)
+            if distance <= radius_m
+        ]
+        if after is not None:
+            hits = [hit for hit in hits if (hit.distance_m, hit.oid) > after]
+        hits.sort(key=lambda hit: (hit.distance_m, hit.oid))
+        return hits[:limit]
+
+    def iter_nearby(
+        self,
+        root,
+        lat: float,
+        lng: float,
+        km: float,
+        limit: Optional[int] = None,
+        chunk_size: int = 500,
+        after: Optional[tuple[float, str]] = None,
+    ) -> Iterator[NearbyHit]:
+        return iter(self.nearby(root, lat, lng, km, limit, after))
+
+    def nearby_batch(self, root, queries: list[NearbyQuery]) -> list[list[NearbyHit]]:
+        return [self.nearby(root, q.lat, q.lng, q.km, q.limit) for q in queries]
+
+    def iter_within(
+        self,
+        root,
+        shape,
+        limit: Optional[int] = None,
+        chunk_size: int = 500,
+        after: Optional[str] = None,
+    ) -> Iterator[PlaceRow]:
+        # Scan the cells under the circle around the shape's envelope, then
+        # test each candidate against the prepared geometry.
+        min_lng, min_lat, max_lng, max_lat = shape.geometry.extent
+        lat, lng = (min_lat + max_lat) / 2, (min_lng + max_lng) / 2
+        corners = haversine_m(lat, lng, [min_lat, min_lat, max_lat, max_lat], [min_lng, max_lng, min_lng, max_lng])
+        km = float(max(corners)) / 1000.0 + 0.001
+        rows = []
+        for key, (place_lat, place_lng, name) in self.candidates(root, lat, lng, km):
+            oid = key.split("|", 1)[1]
+            if after is not None and oid <= after:
+                continue
+            if shape.prepared.intersects(Point(place_lng, place_lat, srid=4326)):
+                rows.append(PlaceRow(oid, name, place_lat, place_lng))
+        rows.sort(key=lambda row: row.oid)
+        return iter(rows[:limit])
+
+    def nearest(self, root, lat: float, lng: float, k: int, max_km: Optional[float] = None) -> list[NearbyHit]:
+        # Widen the search circle until it holds k places; everything inside
+        # it has been ranked, so its first k hits are the k nearest.
+        limit_km = max_km if max_km is not None else MAX_SEARCH_KM
+        km = min(NEAREST_START_KM, limit_km)
+        while True:
+            hits = self.nearby(root, lat, lng, km, k)
+            if len(hits) >= k or km >= limit_km:
+                return hits
+            km = min(km * 4, limit_km)
+
+
+def haversine_m(lat: float, lng: float, lats, lngs):
+    if np is not None:
+        lat1 = np.radians(lat)
+        lat2 = np.radians(np.asarray(lats, dtype=np.float64))
+        dlat = lat2 - lat1
+        dlng = np.radians(np.asarray(lngs, dtype=np.float64) - lng)
+        a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2) ** 2
+        return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+    lat1 = math.radians(lat)
+    distances = []
+    for other_lat, other_lng in zip(lats, lngs):
+        lat2 = math.radians(other_lat)
+        dlat = lat2 - lat1
+        dlng = math.radians(other_lng - lng)
+        a = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlng / 2) ** 2
+        distances.append(2 * EARTH_RADIUS_M * math.asin(math.sqrt(min(a, 1.0))))
+    return distances
+
+
+BACKENDS = {
+    PostGISBackend.name: PostGISBackend,
+    ZODBCellBackend.name: ZODBCellBackend,
+}
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        name = settings.PLACES_SPATIAL_BACKEND
+        try:
+            _backend = BACKENDS[name]()
+        except KeyError:
+            raise ValueError(f"Unknown PLACES_SPATIAL_BACKEND: {name!r}")
+    return _backend
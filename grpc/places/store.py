@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import heapq
+import zlib
+from typing import Any, Iterable, Optional
+
+from BTrees.OOBTree import OOBTree
+from django.conf import settings
+import persistent
+
+
+class Place(persistent.Persistent):
+    # Class-level defaults keep places stored before coordinates were
+    # recorded in ZODB loadable.
+    lat: Optional[float] = None
+    lng: Optional[float] = None
+
+    def __init__(self, name: str, description: str, lat: Optional[float] = None, lng: Optional[float] = None):
+        self.name = name
+        self.description = description
+        self.lat = lat
+        self.lng = lng
+
+
+class ShardedPlaces(persistent.Persistent):
+    # Spreads places over independent OOBTrees by OID hash so concurrent
+    # inserts rarely touch the same bucket. The container itself is written
+    # once, at creation, and never becomes a conflict hot spot.
+    def __init__(self, shards: int):
+        self.shards = tuple(OOBTree() for _ in range(shards))
+
+    def _shard(self, oid: str) -> OOBTree:
+        return self.shards[zlib.crc32(oid.encode("utf-8")) % len(self.shards)]
+
+    def get(self, oid: str, default=None):
+        return self._shard(oid).get(oid, default)
+
+    def __getitem__(self, oid: str):
+        return self._shard(oid)[oid]
+
+    def __setitem__(self, oid: str, place) -> None:
+        self._shard(oid)[oid] = place
+
+    def __delitem__(self, oid: str) -> None:
+        del self._shard(oid)[oid]
+
+    def __contains__(self, oid: str) -> bool:
+        return oid in self._shard(oid)
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self.shards)
+
+    def keys(self, min=None, max=None, excludemin=False, excludemax=False):
+        return heapq.merge(
+            *(shard.keys(min=min, max=max, excludemin=excludemin, excludemax=excludemax) for shard in self.shards)
+        )
+
+    def items(self, min=None, max=None, excludemin=False, excludemax=False):
+        return heapq.merge(
+            *(shard.items(min=min, max=max, excludemin=excludemin, excludemax=excludemax) for shard in self.shards),
+            key=lambda item: item[0],
+        )
+
+    def values(self, min=None, max=None, excludemin=False, excludemax=False):
+        return (value for _key, value in self.items(min, max, excludemin, excludemax))
+
+
+def new_places_container():
+    shards = settings.PLACES_SHARDS
+    return ShardedPlaces(shards) if shards > 1 else OOBTree()
+
+
+def get_places(root, create: bool = False):
+    places = root.get("places")
+    if places is None:
+        if not create:
+            return OOBTree()
+        places = root["places"] = new_places_container()
+    return places
+
+
+def parse_place_payload(payload: Any) -> tuple[str, str, float, float]:
+    if not isinstance(payload, dict):
+        raise ValueError("place must be a JSON object")
+    name = payload.get("name")
+    description = payload.get("description", "")
+    lat = payload.get("lat")
+    lng = payload.get("lng")
+    if not name or lat is None or lng is None:
+        raise ValueError("name, lat, lng are required")
+    try:
+        lat = float(lat)
+        lng = float(lng)
+    except (TypeError, ValueError):
+        raise ValueError("lat, lng must be numbers")
+    return name, description or "", lat, lng
+
+
+def load_places(connection, places, oids: Iterable[str]) -> dict[str, Place]:
+    found = {}
+    for oid in oids:
+        place = places.get(oid)
+        if place is not None:
+            found[oid] = place
+    # One prefetch round trip for every ghost instead of a load per attribute
+    # access; storages without prefetch support treat this as a no-op.
+    connection.prefetch(found.values())
+    for place in found.values():
+        place._p_activate()
+    return found
@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import random
+
+from django.test import SimpleTestCase, override_settings
+
+from places import cache
+from places.spatial import haversine_m
+
+
+@override_settings(PLACES_NEARBY_CACHE_GRID_DEG=0.005, PLACES_NEARBY_CACHE_KM_STEP=0.5)
+class SnapTests(SimpleTestCase):
+    def test_snapped_circle_contains_requested_circle(self):
+        # Every point within km of the query is within the snapped radius of
+        # the snapped centre when the centre moved by no more than the margin.
+        rng = random.Random(7)
+        for _ in range(2000):
+            lat = rng.uniform(-80, 80)
+            lng = rng.uniform(-179, 179)
+            km = rng.choice([0.0, 0.5, 1.0, rng.uniform(0, 25)])
+            snapped_lat, snapped_lng, snapped_km = cache.snap(lat, lng, km)
+            [moved_m] = haversine_m(snapped_lat, snapped_lng, [lat], [lng])
+            self.assertGreaterEqual(snapped_km * 1000, km * 1000 + moved_m)
+
+    def test_worst_case_corner(self):
+        # Half a cell off on both axes, at the equator where a degree of
+        # longitude is longest.
+        lat, lng, km = 0.0025, 100.0025, 1.0
+        snapped_lat, snapped_lng, snapped_km = cache.snap(lat, lng, km)
+        [moved_m] = haversine_m(snapped_lat, snapped_lng, [lat], [lng])
+        self.assertGreater(moved_m, 390)
+        self.assertEqual(snapped_km, 1.5)
+
+    def test_nearby_queries_share_a_key(self):
+        self.assertEqual(cache.snap(13.75631, 100.50181, 0.9), cache.snap(13.75649, 100.50149, 1.1))
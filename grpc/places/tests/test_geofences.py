@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import math
+import random
+
+from django.contrib.gis.geos import MultiPolygon, Point, Polygon
+from django.test import SimpleTestCase
+
+from places.geofences import GeofenceIndex
+
+
+def _fence(rng: random.Random, lat: float, lng: float, radius: float) -> Polygon:
+    ring = []
+    for i in range(12):
+        angle = 2 * math.pi * i / 12
+        r = radius * rng.uniform(0.4, 1.0)
+        ring.append((lng + r * math.cos(angle), lat + r * math.sin(angle)))
+    ring.append(ring[0])
+    return Polygon(ring, srid=4326)
+
+
+class GeofenceIndexTests(SimpleTestCase):
+    def test_matches_every_fence_test(self):
+        rng = random.Random(3)
+        fences = []
+        for fence_id in range(1, 301):
+            lat, lng = rng.uniform(13, 14), rng.uniform(100, 101)
+            # Mostly small fences crossing a few cells, some covering whole
+            # cells and a few past max_cells.
+            radius = rng.choice([0.01, 0.05, 0.2, 0.6])
+            fences.append((fence_id, _fence(rng, lat, lng, radius)))
+        fences.append((301, MultiPolygon(_fence(rng, 13.2, 100.2, 0.1), _fence(rng, 13.8, 100.8, 0.1), srid=4326)))
+
+        index = GeofenceIndex(grid_deg=0.05, max_cells=400)
+        for fence_id, geometry in fences:
+            index.add(fence_id, geometry)
+        self.assertEqual(len(index), len(fences))
+        self.assertTrue(index.covering)
+        self.assertTrue(index.crossing)
+        self.assertTrue(index.oversized)
+
+        prepared = [(fence_id, geometry.prepared) for fence_id, geometry in fences]
+        points = [(rng.uniform(12.5, 14.5), rng.uniform(99.5, 101.5)) for _ in range(500)]
+        # Points on cell edges and corners.
+        points += [(13.25, 100.5), (13.0, 100.0), (13.35, 100.05)]
+        matched = 0
+        for lat, lng in points:
+            point = Point(lng, lat, srid=4326)
+            expected = sorted(fence_id for fence_id, fence in prepared if fence.intersects(point))
+            self.assertEqual(sorted(index.lookup(lat, lng)), expected, (lat, lng))
+            matched += bool(expected)
+        self.assertGreater(matched, 25)
+
+    def test_empty(self):
+        index = GeofenceIndex(grid_deg=0.05, max_cells=400)
+        self.assertEqual(len(index), 0)
+        self.assertEqual(index.lookup(13.5, 100.5), [])
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import os
+import tempfile
+from concurrent import futures
+
+import grpc
+from django.test import TransactionTestCase, override_settings
+
+from places import oids, services
+from places.grpc_service import PlacesServicer, places_pb2, places_pb2_grpc
+from zodbapp import zodb
+
+
+class PlacesServicerTests(TransactionTestCase):
+    # The servicer runs on the server's own threads with their own database
+    # connections, so nothing can be hidden in a test-case transaction.
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        settings = override_settings(
+            ZODB_STORAGE="file",
+            ZODB_FILE_PATH=os.path.join(tmp.name, "zodb", "Data.fs"),
+            ZODB_GROUP_COMMIT_ENABLED=False,
+            PLACES_TILE_CACHE_DIR=os.path.join(tmp.name, "tiles"),
+            PLACES_BULK_BATCH_SIZE=2,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(self._reset_db)
+
+        executor = futures.ThreadPoolExecutor(max_workers=4)
+        server = grpc.server(executor)
+        places_pb2_grpc.add_PlacesServicer_to_server(PlacesServicer(), server)
+        port = server.add_insecure_port("127.0.0.1:0")
+        server.start()
+        channel = grpc.insecure_channel(f"127.0.0.1:{port}")
+        self.stub = places_pb2_grpc.PlacesStub(channel)
+
+        def stop():
+            channel.close()
+            server.stop(None).wait()
+            # Ends the worker threads, which closes their database connections.
+            executor.shutdown(wait=True)
+
+        self.addCleanup(stop)
+
+    def _reset_db(self):
+        if zodb._db is not None:
+            zodb._db.close()
+        zodb._db = zodb._db_pid = None
+        oids._allocator = None
+        services._group_committer = None
+
+    def _create(self, name, lat, lng, description=""):
+        request = places_pb2.CreatePlaceRequest(name=name, description=description, lat=lat, lng=lng)
+        return self.stub.CreatePlace(request, timeout=30).oid
+
+    def test_create_place(self):
+        reply = self.stub.CreatePlace(
+            places_pb2.CreatePlaceRequest(name="Cafe", description="Espresso", lat=13.7563, lng=100.5018),
+            timeout=30,
+        )
+        self.assertTrue(reply.oid.startswith("p-"))
+        self.assertEqual(reply.name, "Cafe")
+
+        [result] = self.stub.StreamNearby(places_pb2.NearbyRequest(lat=13.7563, lng=100.5018, km=1), timeout=30)
+        self.assertEqual((result.oid, result.name, result.description), (reply.oid, "Cafe", "Espresso"))
+        self.assertAlmostEqual(result.distance_m, 0, places=3)
+
+    def test_create_place_rejects_missing_name(self):
+        with self.assertRaises(grpc.RpcError) as raised:
+            self._create("", 13.7563, 100.5018)
+        self.assertEqual(raised.exception.code(), grpc.StatusCode.INVALID_ARGUMENT)
+
+    def test_bulk_create_places(self):
+        requests = [
+            places_pb2.CreatePlaceRequest(name="A", lat=13.70, lng=100.50),
+            places_pb2.CreatePlaceRequest(name="B", lat=13.71, lng=100.50),
+            places_pb2.CreatePlaceRequest(name="", lat=13.72, lng=100.50),
+            places_pb2.CreatePlaceRequest(name="C", lat=13.73, lng=100.50),
+        ]
+        reply = self.stub.BulkCreatePlaces(iter(requests), timeout=30)
+        self.assertEqual((reply.received, reply.written, reply.batches), (4, 3, 2))
+        self.assertEqual([error.index for error in reply.errors], [2])
+
+        results = self.stub.StreamNearby(places_pb2.NearbyRequest(lat=13.70, lng=100.50, km=10), timeout=30)
+        self.assertEqual([result.name for result in results], ["A", "B", "C"])
+
+    def test_stream_nearby_orders_and_limits(self):
+        far = self._create("Far", 13.7563, 100.5318)
+        near = self._create("Near", 13.7563, 100.5028)
+        self._create("Out of range", 14.7563, 100.5018)
+
+        results = list(
+            self.stub.StreamNearby(places_pb2.NearbyRequest(lat=13.7563, lng=100.5018, km=5), timeout=30)
+        )
+        self.assertEqual([result.oid for result in results], [near, far])
+        self.assertLess(results[0].distance_m, results[1].distance_m)
+
+        results = list(
+            self.stub.StreamNearby(
+                places_pb2.NearbyRequest(lat=13.7563, lng=100.5018, km=5, limit=1), timeout=30
+            )
+        )
+        self.assertEqual([result.oid for result in results], [near])
+
+    def test_track_nearby(self):
+        here = self._create("Here", 13.7563, 100.5018)
+        there = self._create("There", 13.8563, 100.5018)
+        positions = [
+            places_pb2.NearbyRequest(lat=13.7563, lng=100.5018, km=1),
+            # Unchanged positions are skipped.
+            places_pb2.NearbyRequest(lat=13.7563, lng=100.5018, km=1),
+            places_pb2.NearbyRequest(lat=13.8563, lng=100.5018, km=1),
+        ]
+        updates = list(self.stub.TrackNearby(iter(positions), timeout=30))
+        self.assertEqual([update.sequence for update in updates], [1, 2])
+        self.assertEqual([[place.oid for place in update.places] for update in updates], [[here], [there]])
+        self.assertEqual(updates[1].position.lat, 13.8563)
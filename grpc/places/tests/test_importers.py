@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import io
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+from django.test import SimpleTestCase
+
+from places.importers import read_records
+
+
+def _feature(name, lng, lat, **properties):
+    return {
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [lng, lat]},
+        "properties": {"name": name, **properties},
+    }
+
+
+def _records(data: bytes) -> list:
+    return [raw["record"] for raw in read_records("geojson", "places.geojson", io.BytesIO(data))]
+
+
+class GeoJSONContainerTests(SimpleTestCase):
+    def test_feature_collection(self):
+        features = [_feature("a", 100.5, 13.7), _feature("b", 100.6, 13.8)]
+        data = json.dumps({"type": "FeatureCollection", "features": features}).encode()
+        self.assertEqual(_records(data), features)
+
+    def test_nested_features_key_before_the_collection_array(self):
+        features = [_feature("a", 100.5, 13.7)]
+        collection = {
+            "type": "FeatureCollection",
+            "metadata": {"features": [1, 2, 3], "note": 'a "features": [ in a string'},
+            "features": features,
+        }
+        self.assertEqual(_records(json.dumps(collection).encode()), features)
+
+    def test_ndjson_features_with_a_features_property(self):
+        features = [_feature(f"p{i}", 100.5, 13.7, features=[i, i + 1]) for i in range(3)]
+        data = "".join(json.dumps(feature) + "\n" for feature in features).encode()
+        self.assertEqual(_records(data), features)
+
+    def test_text_sequence_and_bare_array(self):
+        features = [_feature("a", 100.5, 13.7), _feature("b", 100.6, 13.8)]
+        sequence = b"".join(b"\x1e" + json.dumps(feature).encode() + b"\n" for feature in features)
+        self.assertEqual(_records(sequence), features)
+        self.assertEqual(_records(json.dumps(features).encode()), features)
+
+
+class WorkerImportTests(SimpleTestCase):
+    def test_importers_do_not_import_django(self):
+        # Spawned import_places workers unpickle normalize_batch without
+        # setting Django up.
+        code = "import sys, places.importers; sys.exit('django' in sys.modules)"
+        project = Path(__file__).resolve().parents[2]
+        result = subprocess.run([sys.executable, "-c", code], cwd=project, capture_output=True)
+        self.assertEqual(result.returncode, 0, result.stderr.decode())
@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+from unittest import mock
+
+from django.test import SimpleTestCase
+from ZODB import DB
+from ZODB.MappingStorage import MappingStorage
+
+from places import oids
+
+
+class PlaceOIDAllocatorTests(SimpleTestCase):
+    def test_reserves_through_current_db_after_fork(self):
+        parent, child = DB(MappingStorage()), DB(MappingStorage())
+        self.addCleanup(parent.close)
+        self.addCleanup(child.close)
+        allocator = oids.PlaceOIDAllocator(block_size=10)
+        with mock.patch.object(oids, "get_db", return_value=parent):
+            self.assertEqual(allocator.next_oid(), "p-1")
+
+        # As seen from a forked worker: another pid, and get_db() reopened.
+        allocator._pid = -1
+        with mock.patch.object(oids, "get_db", return_value=child):
+            allocator.next_oid()
+        with child.transaction() as connection:
+            self.assertEqual(connection.root()[oids.COUNTER_KEY].next_id, 11)
+        with parent.transaction() as connection:
+            self.assertEqual(connection.root()[oids.COUNTER_KEY].next_id, 11)
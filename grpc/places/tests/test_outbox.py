@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+from ZODB.POSException import ConflictError
+
+from places import outbox
+
+
+@override_settings(ZODB_CONFLICT_RETRIES=2, ZODB_CONFLICT_BACKOFF_MS=0)
+class DrainTests(SimpleTestCase):
+    def test_conflicts_are_retried(self):
+        with mock.patch.object(outbox, "_drain_batch", side_effect=[ConflictError(), 5]) as batch:
+            self.assertEqual(outbox.drain(10), 5)
+        self.assertEqual(batch.call_count, 2)
+
+    def test_persistent_conflict_is_not_reported_as_empty(self):
+        with mock.patch.object(outbox, "_drain_batch", side_effect=ConflictError()) as batch:
+            with self.assertRaises(ConflictError):
+                outbox.drain(10)
+        self.assertEqual(batch.call_count, 3)
+
+    def test_once_stops_only_when_empty(self):
+        drained = [ConflictError(), 3, ConflictError(), 0]
+        out, err = StringIO(), StringIO()
+        with mock.patch.object(outbox, "drain", side_effect=drained) as drain:
+            call_command("run_indexer", "--once", "--interval", "0", stdout=out, stderr=err)
+        self.assertEqual(drain.call_count, 4)
+        self.assertIn("3 places indexed", out.getvalue())
+        self.assertEqual(err.getvalue().count("conflicting"), 2)
+
+
+class LagTests(SimpleTestCase):
+    @override_settings(PLACES_INDEX_MODE="sync")
+    def test_disabled_outbox_opens_no_connection(self):
+        with mock.patch.object(outbox, "get_db") as get_db:
+            self.assertEqual(outbox.lag(), {})
+        get_db.assert_not_called()
@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+from django.test import SimpleTestCase
+
+from places import reconcile
+from places.store import ShardedPlaces
+
+
+class KeyRangeTests(SimpleTestCase):
+    def setUp(self):
+        self.places = ShardedPlaces(4)
+        self.keys = [f"p-{n}" for n in range(1, 2500)] + ["p-abc", "p-", "legacy-7", "zz", "p-99999999"]
+        for key in self.keys:
+            self.places[key] = key
+
+    def test_chunks_cover_every_key_once(self):
+        for digits in (1, 2, 3):
+            seen = []
+            for chunk in range(reconcile.chunk_count(digits)):
+                low, high = reconcile.key_range(chunk, digits)
+                seen.extend(self.places.keys(min=low, max=high, excludemax=high is not None))
+            self.assertEqual(sorted(seen), sorted(self.keys))
+
+    def test_prefix_digits_targets_chunk_size(self):
+        self.assertEqual(reconcile.prefix_digits(10_000_000, 10_000), 3)
+        self.assertEqual(reconcile.prefix_digits(50, 10_000), 1)
+        self.assertEqual(reconcile.prefix_digits(1, 1), 1)
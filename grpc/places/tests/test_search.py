@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+from django.test import SimpleTestCase, override_settings
+
+from places import search
+from places.oids import format_oid
+
+
+@override_settings(PLACES_SEARCH_MAX_EXPANSIONS=50)
+class SearchTests(SimpleTestCase):
+    def setUp(self):
+        # get_index only needs a mapping, so a dict stands in for the root.
+        self.root = {}
+
+    def _index(self, number, name, description=""):
+        search.index_place(self.root, format_oid(number), name, description)
+
+    def _oids(self, q, limit=10):
+        return [hit.oid for hit in search.search(self.root, q, limit)]
+
+    def test_tokenize(self):
+        self.assertEqual(search.tokenize("Café  DU-Monde, 2nd"), ["café", "du", "monde", "2nd"])
+        # NFKC folds the full-width letters and casefold the sharp s.
+        self.assertEqual(search.tokenize("ＡＢＣ Straße"), ["abc", "strasse"])
+        self.assertEqual(search.tokenize(""), [])
+        self.assertEqual(search.tokenize(None), [])
+        self.assertEqual(search.tokenize("x" * 100), ["x" * search.MAX_TERM_LENGTH])
+
+    def test_index_place_counts(self):
+        self._index(1, "Blue Cafe", "cafe by the river")
+        self._index(1, "Blue Cafe", "indexed twice")
+        self._index(2, "", "")
+        search.index_place(self.root, "not-an-oid", "Ignored", "")
+        index = search.get_index(self.root)
+        self.assertEqual(index.doc_count.value, 1)
+        self.assertEqual(index.total_length.value, 6)
+        self.assertEqual(dict(index.postings["cafe"]), {1: 2})
+
+    def test_prefix_expansion(self):
+        self._index(1, "Coffee House")
+        self._index(2, "Coffin Maker")
+        self._index(3, "Tea House")
+        index = search.get_index(self.root)
+        self.assertEqual(search._expand(index, "cof"), ["coffee", "coffin"])
+        self.assertEqual(search._expand(index, "coffee"), ["coffee"])
+        self.assertEqual(search._expand(index, "zzz"), [])
+        self.assertEqual(self._oids("cof"), [format_oid(1), format_oid(2)])
+        with override_settings(PLACES_SEARCH_MAX_EXPANSIONS=1):
+            self.assertEqual(search._expand(index, "cof"), ["coffee"])
+
+    def test_every_token_must_match(self):
+        self._index(1, "Coffee House")
+        self._index(2, "Coffee Cart")
+        self._index(3, "Tea House")
+        self.assertEqual(self._oids("coffee house"), [format_oid(1)])
+        self.assertEqual(self._oids("house coff"), [format_oid(1)])
+        self.assertEqual(self._oids("coffee pizza"), [])
+        self.assertEqual(self._oids(""), [])
+
+    def test_ranking(self):
+        # Rarer terms weigh more, and so do repeats within shorter documents.
+        self._index(1, "Noodle Bar", "noodle noodle")
+        self._index(2, "Noodle Bar and Grill", "a bar that also serves noodle soup")
+        self._index(3, "Sports Bar")
+        self._index(4, "Wine Bar")
+        self.assertEqual(self._oids("noodle"), [format_oid(1), format_oid(2)])
+        hits = search.search(self.root, "bar noodle", 10)
+        self.assertEqual([hit.oid for hit in hits], [format_oid(1), format_oid(2)])
+        self.assertGreater(hits[0].score, hits[1].score)
+        [bar] = search.search(self.root, "bar", 1)
+        [noodle] = search.search(self.root, "noodle", 1)
+        self.assertLess(bar.score, noodle.score)
+
+    def test_ties_and_limit(self):
+        for number in (3, 1, 2):
+            self._index(number, "Park")
+        self.assertEqual(self._oids("park"), [format_oid(1), format_oid(2), format_oid(3)])
+        self.assertEqual(self._oids("park", limit=2), [format_oid(1), format_oid(2)])
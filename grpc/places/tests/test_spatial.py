@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+from django.test import SimpleTestCase
+
+from places import geohash
+from places.spatial import CELL_PRECISION, PlaceRow, ZODBCellBackend
+
+
+class ZODBCellBackendTests(SimpleTestCase):
+    def setUp(self):
+        self.backend = ZODBCellBackend()
+        self.root = {}
+        self.backend.add(
+            self.root,
+            [
+                PlaceRow("p-1", "Here", 13.7563, 100.5018),
+                PlaceRow("p-2", "Five metres north", 13.756345, 100.5018),
+            ],
+        )
+
+    def test_zero_radius_finds_place_at_exact_coordinates(self):
+        hits = self.backend.nearby(self.root, 13.7563, 100.5018, 0, None)
+        self.assertEqual([hit.oid for hit in hits], ["p-1"])
+
+    def test_tiny_radius(self):
+        hits = self.backend.nearby(self.root, 13.7563, 100.5018, 0.001, None)
+        self.assertEqual([hit.oid for hit in hits], ["p-1"])
+        hits = self.backend.nearby(self.root, 13.7563, 100.5018, 0.01, None)
+        self.assertEqual([hit.oid for hit in hits], ["p-1", "p-2"])
+
+    def test_covering_cells_never_finer_than_stored_keys(self):
+        cells = geohash.covering_cells(13.7563, 100.5018, 0, max_precision=CELL_PRECISION)
+        self.assertEqual({len(cell) for cell in cells}, {CELL_PRECISION})
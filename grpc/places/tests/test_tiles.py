@@ -0,0 +1,16 @@
+from __future__ import annotations
+
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from places import tiles
+from places.spatial import PlaceRow, ZODBCellBackend
+
+
+class TileInvalidationTests(SimpleTestCase):
+    def test_skipped_without_postgis(self):
+        with mock.patch.object(tiles, "get_backend", return_value=ZODBCellBackend()):
+            with mock.patch.object(tiles, "invalidate_points") as invalidate:
+                tiles.on_places_indexed(PlaceRow, rows=[PlaceRow("p-1", "Here", 13.7563, 100.5018)])
+        invalidate.assert_not_called()
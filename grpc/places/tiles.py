@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import hashlib
+import math
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.db import connection
+
+from .cache import CachedPage, LocalStore
+from .models import PlaceIndex
+from .spatial import get_backend
+
+
+LAYER_NAME = "places"
+MAX_LAT = 85.0511287798066
+# Bumped by every invalidation in any worker (migration 0006). A render that
+# overlaps a bump is served but not kept, so it cannot put back a tile that
+# was just dropped.
+GENERATION_SEQUENCE = "places_tile_generation"
+
+_memory: Optional[LocalStore] = None
+_memory_lock = threading.Lock()
+
+
+def _store() -> LocalStore:
+    global _memory
+    if _memory is None:
+        with _memory_lock:
+            if _memory is None:
+                _memory = LocalStore(settings.PLACES_TILE_MEMORY_MAX_ENTRIES)
+    return _memory
+
+
+def valid_tile(z: int, x: int, y: int) -> bool:
+    return 0 <= z <= settings.PLACES_TILE_MAX_ZOOM and 0 <= x < 2**z and 0 <= y < 2**z
+
+
+def _key(z: int, x: int, y: int) -> str:
+    return f"places:tile:{z}:{x}:{y}"
+
+
+def _path(z: int, x: int, y: int) -> Optional[Path]:
+    if not settings.PLACES_TILE_CACHE_DIR:
+        return None
+    return Path(settings.PLACES_TILE_CACHE_DIR) / str(z) / str(x) / f"{y}.mvt"
+
+
+def _fresh(mtime: float) -> bool:
+    ttl = settings.PLACES_TILE_DISK_TTL
+    return not ttl or time.time() - mtime < ttl
+
+
+def _generation() -> int:
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT last_value, is_called FROM {GENERATION_SEQUENCE}")
+        last_value, is_called = cursor.fetchone()
+    return last_value if is_called else 0
+
+
+def _bump_generation() -> None:
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT nextval(%s)", [GENERATION_SEQUENCE])
+
+
+def _page(body: bytes, last_modified: float) -> CachedPage:
+    return CachedPage(
+        body=body,
+        etag='"%s"' % hashlib.sha1(body).hexdigest()[:20],
+        last_modified=last_modified,
+    )
+
+
+_TILE_SQL = """
+WITH bounds AS (
+    SELECT ST_TileEnvelope(%(z)s, %(x)s, %(y)s) AS env,
+           ST_Transform(ST_TileEnvelope(%(z)s, %(x)s, %(y)s, margin => %(margin)s), 4326) AS query
+)
+SELECT ST_AsMVT(tile, %(layer)s, %(extent)s, 'geom')
+FROM (
+    SELECT p.oid, p.name,
+           ST_AsMVTGeom(ST_Transform(p.location::geometry, 3857), bounds.env,
+                        %(extent)s, %(buffer)s, true) AS geom
+    FROM {table} AS p, bounds
+    WHERE p.location && bounds.query::geography
+) AS tile
+WHERE tile.geom IS NOT NULL
+"""
+
+
+def render(z: int, x: int, y: int) -> bytes:
+    extent = settings.PLACES_TILE_EXTENT
+    buffer = settings.PLACES_TILE_BUFFER
+    sql = _TILE_SQL.format(table=connection.ops.quote_name(PlaceIndex._meta.db_table))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            sql,
+            {
+                "z": z,
+                "x": x,
+                "y": y,
+                "margin": buffer / extent,
+                "layer": LAYER_NAME,
+                "extent": extent,
+                "buffer": buffer,
+            },
+        )
+        row = cursor.fetchone()
+    return bytes(row[0]) if row and row[0] is not None else b""
+
+
+def _write_atomic(path: Path, body: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(body)
+        os.replace(tmp, path)
+    except BaseException:
+        _unlink(tmp)
+        raise
+
+
+def _unlink(path) -> None:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def get_tile(z: int, x: int, y: int) -> CachedPage:
+    store = _store()
+    key = _key(z, x, y)
+    path = _path(z, x, y)
+    page = store.get(key)
+    if page is not None:
+        # The file is shared by every worker; a memory entry is only good
+        # while the file it was read from (or written to) is still there.
+        if path is None:
+            return page
+        try:
+            if path.stat().st_mtime == page.last_modified and _fresh(page.last_modified):
+                return page
+        except FileNotFoundError:
+            pass
+    if path is not None:
+        try:
+            body = path.read_bytes()
+            mtime = path.stat().st_mtime
+            if _fresh(mtime):
+                page = _page(body, mtime)
+                store.set(key, page, settings.PLACES_TILE_MEMORY_TTL)
+                return page
+        except FileNotFoundError:
+            pass
+
+    generation = _generation()
+    body = render(z, x, y)
+    if path is None:
+        page = _page(body, time.time())
+    else:
+        _write_atomic(path, body)
+        page = _page(body, path.stat().st_mtime)
+    # The file is written before the generation is re-read: an invalidation
+    # that bumped it after this check unlinks the file after it, and one that
+    # bumped it before is caught here.
+    if _generation() != generation:
+        if path is not None:
+            _unlink(path)
+        return page
+    store.set(key, page, settings.PLACES_TILE_MEMORY_TTL)
+    return page
+
+
+def tile_fraction(lat: float, lng: float, z: int) -> tuple[float, float]:
+    n = 2**z
+    lat = max(-MAX_LAT, min(MAX_LAT, lat))
+    fx = (lng + 180.0) / 360.0 * n
+    fy = (1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n
+    return fx, fy
+
+
+def tiles_for_point(lat: float, lng: float, max_zoom: int) -> set[tuple[int, int, int]]:
+    # A point is drawn in its own tile and, within the render buffer, in the
+    # neighbouring ones, so those go stale together.
+    margin = settings.PLACES_TILE_BUFFER / settings.PLACES_TILE_EXTENT
+    tiles = set()
+    for z in range(max_zoom + 1):
+        n = 2**z
+        fx, fy = tile_fraction(lat, lng, z)
+        xs = {x % n for x in range(math.floor(fx - margin), math.floor(fx + margin) + 1)}
+        ys = {y for y in range(math.floor(fy - margin), math.floor(fy + margin) + 1) if 0 <= y < n}
+        tiles.update((z, x, y) for x in xs for y in ys)
+    return tiles
+
+
+def invalidate_points(points: Iterable[tuple[float, float]]) -> None:
+    tiles = set()
+    for lat, lng in points:
+        tiles |= tiles_for_point(lat, lng, settings.PLACES_TILE_MAX_ZOOM)
+    if not tiles:
+        return
+    _bump_generation()
+    for z, x, y in tiles:
+        path = _path(z, x, y)
+        if path is not None:
+            _unlink(path)
+    # With a disk cache, memory entries are checked against their file on
+    # read; dropping them too keeps this process from stat-ing dead tiles.
+    _store().delete(_key(z, x, y) for z, x, y in tiles)
+
+
+def on_places_indexed(sender, rows, **kwargs) -> None:
+    # Tiles are only served by the postgis backend (see views.place_tile);
+    # there is nothing cached, and no generation sequence, otherwise.
+    if get_backend().name != "postgis":
+        return
+    invalidate_points((row.lat, row.lng) for row in rows)
@@ -5,7 +5,16 @@ from . import views
 
 urlpatterns = [
     path("api/places/create", views.create_place, name="create_place"),
+    path("api/places/bulk", views.bulk_create_places, name="bulk_create_places"),
     path("api/places/nearby", views.nearby_places, name="nearby_places"),
+    path("api/places/nearby/batch", views.nearby_batch, name="nearby_batch"),
+    path("api/places/corridor", views.corridor_places, name="corridor_places"),
+    path("api/places/within", views.within_places, name="within_places"),
+    path("api/places/search", views.search_places, name="search_places"),
+    path("api/places/nearest", views.nearest_places, name="nearest_places"),
+    path("api/places/clusters", views.place_clusters, name="place_clusters"),
+    path("api/places/export", views.export_places, name="export_places"),
+    path("api/places/tiles/<int:z>/<int:x>/<int:y>.mvt", views.place_tile, name="place_tile"),
 ]
 
 
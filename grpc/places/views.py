@@ -3,21 +3,22 @@ from __future__ import annotations
 import json
 from typing import Any
 
-from django.contrib.gis.geos import Point
-from django.contrib.gis.measure import D
-from django.http import JsonResponse
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from django.views.decorators.csrf import csrf_exempt
 
-from .models import PlaceIndex
+from zodbapp import profiling
+from zodbapp.zodb import ZODBManager
 
-from BTrees.OOBTree import OOBTree
-import persistent
-
-
-class Place(persistent.Persistent):
-    def __init__(self, name: str, description: str):
-        self.name = name
-        self.description = description
+from . import cache, clusters, export, polyline, regions, search, services, tiles
+from .ingest import PlaceBatchWriter
+from .jsonstream import iter_json_records
+from .spatial import NearbyQuery
+# Place is re-exported here so pickles referencing places.views.Place still load.
+from .store import Place, get_places, load_places, parse_place_payload  # noqa: F401
 
 
 def _bad_request(message: str, status: int = 400):
@@ -33,34 +34,75 @@ def create_place(request):
     except Exception:
         return _bad_request("Invalid JSON")
 
-    name = payload.get("name")
-    description = payload.get("description", "")
-    lat = payload.get("lat")
-    lng = payload.get("lng")
-
-    if not name or lat is None or lng is None:
-        return _bad_request("name, lat, lng are required")
-
-    # Store in ZODB
-    zroot = request.zodb_root
-    if "places" not in zroot:
-        zroot["places"] = OOBTree()
-
-    place_obj = Place(name=name, description=description)
-    # Generate an oid
-    oid = f"p-{len(zroot['places']) + 1}"
-    zroot["places"][oid] = place_obj
-
-    # Index in PostGIS
-    PlaceIndex.objects.create(
-        oid=oid,
-        name=name,
-        location=Point(float(lng), float(lat)),
-    )
+    try:
+        name, description, lat, lng = parse_place_payload(payload)
+    except ValueError as exc:
+        return _bad_request(str(exc))
+
+    if settings.ZODB_GROUP_COMMIT_ENABLED:
+        oid = services.create_place_grouped(name, description, lat, lng)
+    else:
+        oid = services.create_place(request.zodb_root, name, description, lat, lng)
 
     return JsonResponse({"oid": oid, "name": name})
 
 
+@csrf_exempt
+def bulk_create_places(request):
+    if request.method != "POST":
+        return _bad_request("Method not allowed", 405)
+    response = StreamingHttpResponse(
+        _bulk_create_progress(request, settings.PLACES_BULK_BATCH_SIZE),
+        content_type="application/x-ndjson",
+    )
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+def _bulk_create_progress(stream, batch_size: int):
+    received = 0
+    pending_errors: list[dict[str, Any]] = []
+
+    def report(result) -> str:
+        errors = pending_errors + result.errors
+        pending_errors.clear()
+        line = {
+            "batch": result.batch,
+            "written": result.written,
+            "received": received,
+            "errors": errors,
+        }
+        return json.dumps(line) + "\n"
+
+    with PlaceBatchWriter(batch_size) as writer:
+        for index, (record, error) in enumerate(iter_json_records(stream)):
+            received += 1
+            if error is None:
+                try:
+                    writer.add(record)
+                except ValueError as exc:
+                    error = str(exc)
+            if error is not None:
+                pending_errors.append({"index": index, "error": error})
+                if len(pending_errors) >= batch_size:
+                    yield json.dumps({"received": received, "errors": pending_errors}) + "\n"
+                    pending_errors.clear()
+            if writer.full:
+                yield report(writer.flush())
+        result = writer.flush()
+        if result is not None:
+            yield report(result)
+        yield json.dumps(
+            {
+                "done": True,
+                "received": received,
+                "written": writer.written,
+                "batches": writer.batches,
+                "errors": pending_errors,
+            }
+        ) + "\n"
+
+
 def nearby_places(request):
     try:
         lat = float(request.GET.get("lat"))
@@ -69,24 +111,305 @@ def nearby_places(request):
     except Exception:
         return _bad_request("lat, lng must be numbers")
 
-    ref = Point(lng, lat)
-    qs = PlaceIndex.objects.filter(location__distance_lte=(ref, D(km=km))).distance(ref).order_by("distance")
+    stream = request.GET.get("format") == "ndjson"
+    try:
+        limit = int(request.GET["limit"]) if "limit" in request.GET else None
+    except ValueError:
+        return _bad_request("limit must be an integer")
+    if limit is not None and limit < 1:
+        return _bad_request("limit must be positive")
+    try:
+        after = services.decode_cursor(request.GET["cursor"]) if "cursor" in request.GET else None
+    except ValueError as exc:
+        return _bad_request(str(exc))
+
+    if stream:
+        # No page cap: rows go out as the database cursor yields them.
+        response = StreamingHttpResponse(
+            _stream_nearby(lat, lng, km, limit, after), content_type="application/x-ndjson"
+        )
+        response["X-Accel-Buffering"] = "no"
+        return response
 
-    zroot = request.zodb_root
-    places = zroot.get("places", OOBTree())
-    results: list[dict[str, Any]] = []
-    for idx in qs[:50]:
-        po = places.get(idx.oid)
+    page_size = min(limit or settings.PLACES_NEARBY_PAGE_SIZE, settings.PLACES_NEARBY_MAX_PAGE_SIZE)
+    if not cache.cacheable(km):
+        data = _nearby_page(request, lat, lng, km, page_size, after)
+        with profiling.phase("serialize"):
+            return JsonResponse(data)
+
+    lat, lng, km = cache.snap(lat, lng, km)
+    key = cache.page_key(lat, lng, km, page_size, request.GET.get("cursor"))
+    page = cache.get_page(key)
+    if page is None:
+        data = _nearby_page(request, lat, lng, km, page_size, after)
+        with profiling.phase("serialize"):
+            body = json.dumps(data, cls=DjangoJSONEncoder).encode("utf-8")
+        page = cache.set_page(key, body)
+    response = HttpResponse(page.body, content_type="application/json")
+    response["ETag"] = page.etag
+    response["Last-Modified"] = http_date(page.last_modified)
+    return get_conditional_response(
+        request, etag=page.etag, last_modified=int(page.last_modified), response=response
+    )
+
+
+@csrf_exempt
+def nearby_batch(request):
+    if request.method != "POST":
+        return _bad_request("Method not allowed", 405)
+    try:
+        payload = json.loads(request.body.decode("utf-8"))
+    except Exception:
+        return _bad_request("Invalid JSON")
+    if not isinstance(payload, list):
+        return _bad_request("Expected a JSON array of queries")
+    if len(payload) > settings.PLACES_NEARBY_BATCH_MAX_QUERIES:
+        return _bad_request(f"At most {settings.PLACES_NEARBY_BATCH_MAX_QUERIES} queries per batch")
+
+    queries = []
+    for index, item in enumerate(payload):
+        try:
+            limit = int(item.get("limit", settings.PLACES_NEARBY_PAGE_SIZE))
+            query = NearbyQuery(
+                lat=float(item["lat"]),
+                lng=float(item["lng"]),
+                km=float(item.get("km", 5)),
+                limit=min(limit, settings.PLACES_NEARBY_MAX_PAGE_SIZE),
+            )
+        except Exception:
+            return _bad_request(f"Query {index}: lat, lng, km must be numbers and limit an integer")
+        if query.limit < 1 or query.km <= 0:
+            return _bad_request(f"Query {index}: km and limit must be positive")
+        queries.append(query)
+
+    grouped = services.nearby_batch(request.zodb_connection, request.zodb_root, queries)
+    results = []
+    for rows in grouped:
+        page = []
+        for hit, place in rows:
+            row = services.place_result(hit, place)
+            row["distance_m"] = hit.distance_m
+            page.append(row)
+        results.append(page)
+    return JsonResponse({"results": results})
+
+
+@csrf_exempt
+def corridor_places(request):
+    if request.method != "POST":
+        return _bad_request("Method not allowed", 405)
+    if services.get_backend().name != "postgis":
+        return _bad_request("Corridor search needs the postgis spatial backend", 404)
+    try:
+        payload = json.loads(request.body.decode("utf-8"))
+    except Exception:
+        return _bad_request("Invalid JSON")
+    if not isinstance(payload, dict):
+        return _bad_request("Expected a JSON object")
+
+    try:
+        if "polyline" in payload:
+            coords = polyline.decode(str(payload["polyline"]), int(payload.get("precision", 5)))
+        else:
+            coords = polyline.from_geojson(payload.get("line"))
+    except ValueError as exc:
+        return _bad_request(str(exc))
+    if not 2 <= len(coords) <= settings.PLACES_CORRIDOR_MAX_POINTS:
+        return _bad_request(f"The line needs 2 to {settings.PLACES_CORRIDOR_MAX_POINTS} points")
+    try:
+        buffer_m = float(payload.get("buffer_m", 500))
+        limit = int(payload.get("limit", settings.PLACES_NEARBY_PAGE_SIZE))
+        after = services.decode_cursor(payload["cursor"]) if payload.get("cursor") else None
+    except (TypeError, ValueError):
+        return _bad_request("buffer_m must be a number, limit an integer and cursor a valid cursor")
+    if not 0 < buffer_m <= settings.PLACES_CORRIDOR_MAX_BUFFER_M:
+        return _bad_request(f"buffer_m must be between 0 and {settings.PLACES_CORRIDOR_MAX_BUFFER_M}")
+    if limit < 1:
+        return _bad_request("limit must be positive")
+    page_size = min(limit, settings.PLACES_NEARBY_MAX_PAGE_SIZE)
+
+    rows, next_cursor = services.corridor_page(
+        request.zodb_connection, request.zodb_root, coords, buffer_m, page_size, after
+    )
+    results = []
+    for hit, place in rows:
+        row = services.place_result(hit, place)
+        row["distance_m"] = hit.distance_m
+        row["fraction"] = hit.fraction
+        results.append(row)
+    return JsonResponse({"results": results, "next_cursor": next_cursor})
+
+
+@csrf_exempt
+def within_places(request):
+    # GET takes bbox= or region=; POST takes a JSON object that may also
+    # carry an ad-hoc GeoJSON "geometry".
+    if request.method == "POST":
+        try:
+            params = json.loads(request.body.decode("utf-8"))
+        except Exception:
+            return _bad_request("Invalid JSON")
+        if not isinstance(params, dict):
+            return _bad_request("Expected a JSON object")
+    elif request.method == "GET":
+        params = request.GET
+    else:
+        return _bad_request("Method not allowed", 405)
+
+    try:
+        if params.get("region"):
+            shape = regions.get_region(str(params["region"]))
+            if shape is None:
+                return _bad_request("Unknown region", 404)
+        elif params.get("bbox"):
+            bbox = params["bbox"]
+            values = bbox.split(",") if isinstance(bbox, str) else bbox
+            min_lng, min_lat, max_lng, max_lat = (float(v) for v in values)
+            shape = regions.RegionShape(regions.bbox_geometry(min_lng, min_lat, max_lng, max_lat))
+        elif request.method == "POST" and params.get("geometry"):
+            shape = regions.RegionShape(regions.parse_geojson(params["geometry"]))
+        else:
+            return _bad_request("One of bbox, region or geometry is required")
+        limit = int(params.get("limit", settings.PLACES_NEARBY_PAGE_SIZE))
+    except (TypeError, ValueError) as exc:
+        return _bad_request(str(exc) or "Invalid bbox or limit")
+    if limit < 1:
+        return _bad_request("limit must be positive")
+    page_size = min(limit, settings.PLACES_NEARBY_MAX_PAGE_SIZE)
+
+    rows, next_cursor = services.within_page(
+        request.zodb_connection, request.zodb_root, shape, page_size, params.get("cursor") or None
+    )
+    results = [services.place_result(row, place) for row, place in rows]
+    return JsonResponse({"results": results, "next_cursor": next_cursor})
+
+
+def search_places(request):
+    q = request.GET.get("q", "").strip()
+    if not q:
+        return _bad_request("q is required")
+    try:
+        limit = int(request.GET.get("limit", settings.PLACES_NEARBY_PAGE_SIZE))
+        spatial = [request.GET.get(key) for key in ("lat", "lng", "km")]
+        lat, lng, km = (float(value) for value in spatial) if any(spatial) else (None, None, None)
+    except (TypeError, ValueError):
+        return _bad_request("limit must be an integer; lat, lng and km must be numbers given together")
+    if limit < 1:
+        return _bad_request("limit must be positive")
+    if km is not None:
+        # km divides the distance bonus in search.search.
+        if km <= 0:
+            return _bad_request("km must be positive")
+        if not (-90.0 <= lat <= 90.0 and -180.0 <= lng <= 180.0):
+            return _bad_request("lat or lng out of range")
+    limit = min(limit, settings.PLACES_NEARBY_MAX_PAGE_SIZE)
+
+    root = request.zodb_root
+    hits = search.search(root, q, limit, lat, lng, km)
+    loaded = load_places(request.zodb_connection, get_places(root), (hit.oid for hit in hits))
+    results = []
+    for hit in hits:
+        place = loaded.get(hit.oid)
+        if place is None:
+            continue
         results.append(
             {
-                "oid": idx.oid,
-                "name": idx.name,
-                "lat": idx.location.y,
-                "lng": idx.location.x,
-                "description": getattr(po, "description", ""),
+                "oid": hit.oid,
+                "name": place.name,
+                "description": place.description,
+                "lat": place.lat,
+                "lng": place.lng,
+                "score": hit.score,
+                "distance_m": hit.distance_m,
             }
         )
+    return JsonResponse({"results": results})
+
+
+def nearest_places(request):
+    try:
+        lat = float(request.GET.get("lat"))
+        lng = float(request.GET.get("lng"))
+        k = int(request.GET.get("k", 10))
+        max_km = float(request.GET["max_km"]) if "max_km" in request.GET else None
+    except Exception:
+        return _bad_request("lat, lng, max_km must be numbers and k an integer")
+    if k < 1:
+        return _bad_request("k must be positive")
+    if max_km is not None and max_km <= 0:
+        return _bad_request("max_km must be positive")
+    k = min(k, settings.PLACES_NEARBY_MAX_PAGE_SIZE)
 
+    results = []
+    for hit, place in services.nearest(request.zodb_connection, request.zodb_root, lat, lng, k, max_km):
+        row = services.place_result(hit, place)
+        row["distance_m"] = hit.distance_m
+        results.append(row)
     return JsonResponse({"results": results})
 
 
+def _nearby_page(request, lat: float, lng: float, km: float, page_size: int, after) -> dict[str, Any]:
+    # One extra row tells us whether another page exists.
+    rows = list(
+        services.iter_nearby(
+            request.zodb_connection, request.zodb_root, lat, lng, km, limit=page_size + 1, after=after
+        )
+    )
+    next_cursor = services.encode_cursor(rows[page_size - 1][0]) if len(rows) > page_size else None
+    with profiling.phase("serialize"):
+        results = [services.place_result(hit, place) for hit, place in rows[:page_size]]
+    return {"results": results, "next_cursor": next_cursor}
+
+
+def _stream_nearby(lat: float, lng: float, km: float, limit, after):
+    # The request's connection is closed once the view returns, so the
+    # stream holds its own for as long as it is being consumed.
+    with ZODBManager() as ctx:
+        for hit, place in services.iter_nearby(ctx.connection, ctx.root, lat, lng, km, limit, after):
+            row = services.place_result(hit, place)
+            row["cursor"] = services.encode_cursor(hit)
+            yield json.dumps(row) + "\n"
+
+
+def place_tile(request, z: int, x: int, y: int):
+    if services.get_backend().name != "postgis":
+        return _bad_request("Tiles need the postgis spatial backend", 404)
+    if not tiles.valid_tile(z, x, y):
+        return _bad_request("Tile out of range", 404)
+    page = tiles.get_tile(z, x, y)
+    response = HttpResponse(page.body, content_type="application/vnd.mapbox-vector-tile")
+    response["ETag"] = page.etag
+    response["Last-Modified"] = http_date(page.last_modified)
+    return get_conditional_response(
+        request, etag=page.etag, last_modified=int(page.last_modified), response=response
+    )
+
+
+def place_clusters(request):
+    try:
+        min_lng, min_lat, max_lng, max_lat = (float(v) for v in request.GET["bbox"].split(","))
+        zoom = int(request.GET["zoom"])
+    except (KeyError, ValueError):
+        return _bad_request("bbox=min_lng,min_lat,max_lng,max_lat and an integer zoom are required")
+    if not clusters.enabled():
+        return _bad_request("Clustering is disabled", 404)
+    limit = settings.PLACES_CLUSTER_MAX_RESULTS
+    results, truncated = clusters.in_bbox(min_lng, min_lat, max_lng, max_lat, zoom, limit)
+    return JsonResponse({"zoom": zoom, "clusters": results, "truncated": truncated})
+
+
+def export_places(request):
+    if not settings.PLACES_EXPORT_HTTP_ENABLED:
+        raise Http404()
+    fmt = request.GET.get("format", "ndjson")
+    if fmt not in export.FORMATS:
+        return _bad_request(f"format must be one of {', '.join(sorted(export.FORMATS))}")
+    if not export.available(fmt):
+        return _bad_request(f"format {fmt} needs pyarrow installed on the server", 501)
+    content_type, _writer = export.FORMATS[fmt]
+    response = StreamingHttpResponse(
+        export.export(fmt, settings.PLACES_EXPORT_CHUNK_SIZE), content_type=content_type
+    )
+    response["Content-Disposition"] = f'attachment; filename="places.{fmt}"'
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import contextlib
+import threading
+import time
+from typing import Any, Callable, ContextManager, Optional
+
+import transaction
+
+from .metrics import registry
+
+
+class _Pending:
+    def __init__(self, work: Callable[[Any], Any]):
+        self.work = work
+        self.done = False
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+    def result(self) -> Any:
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+# Coalesces writes from concurrent callers into shared ZODB transactions.
+# Callers queue a unit of work and wait; a dedicated committer thread waits up
+# to ``window`` seconds after the first item (or until ``max_batch`` items are
+# queued), runs every queued unit of work in one connection and commits once.
+# Running batches on their own thread keeps them out of any transaction the
+# callers have open, e.g. a request's SQL atomic block, so an acknowledged
+# item is committed whatever the caller does afterwards.
+# ``before_commit(root, values)`` runs inside ``commit_context()`` right
+# before the commit, so batch-wide side effects share the batch's fate. A
+# failed batch is retried item by item so one bad request cannot fail its
+# neighbours.
+class GroupCommitter:
+    def __init__(
+        self,
+        db_factory: Callable[[], Any],
+        window: float,
+        max_batch: int,
+        before_commit: Optional[Callable[[Any, list[Any]], None]] = None,
+        commit_context: Callable[[], ContextManager] = contextlib.nullcontext,
+    ):
+        self.db_factory = db_factory
+        self.window = window
+        self.max_batch = max_batch
+        self.before_commit = before_commit
+        self.commit_context = commit_context
+        self._cond = threading.Condition()
+        self._queue: list[_Pending] = []
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, work: Callable[[Any], Any]) -> Any:
+        item = _Pending(work)
+        with self._cond:
+            self._queue.append(item)
+            self._ensure_committer()
+            self._cond.notify_all()
+            while not item.done:
+                self._cond.wait()
+        return item.result()
+
+    def _ensure_committer(self) -> None:
+        # Called with the condition held. Also restarts the committer in a
+        # forked worker, which does not inherit the parent's threads.
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._loop, name="group-commit", daemon=True)
+            self._thread.start()
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                batch = self._collect()
+            try:
+                self._run(batch)
+            except BaseException as exc:
+                for item in batch:
+                    if not item.done:
+                        item.error = exc
+                        item.done = True
+            with self._cond:
+                self._cond.notify_all()
+
+    def _collect(self) -> list[_Pending]:
+        # Called with the condition held; wait() releases it so callers can
+        # keep enqueueing during the window.
+        deadline = time.monotonic() + self.window
+        while len(self._queue) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self._cond.wait(remaining)
+        batch = self._queue[: self.max_batch]
+        del self._queue[: self.max_batch]
+        return batch
+
+    def _run(self, batch: list[_Pending]) -> None:
+        registry.observe("zodb_group_commit_batch_size", len(batch))
+        try:
+            values = self._commit(batch)
+        except Exception as exc:
+            if len(batch) == 1:
+                batch[0].error = exc
+                batch[0].done = True
+                return
+            registry.increment("zodb_group_commit_batch_retries")
+            for item in batch:
+                self._run([item])
+            return
+        for item, value in zip(batch, values):
+            item.value = value
+            item.done = True
+
+    def _commit(self, batch: list[_Pending]) -> list[Any]:
+        tm = transaction.TransactionManager()
+        connection = self.db_factory().open(transaction_manager=tm)
+        try:
+            root = connection.root()
+            values = [item.work(root) for item in batch]
+            with self.commit_context():
+                if self.before_commit is not None:
+                    self.before_commit(root, values)
+                tm.commit()
+            return values
+        except BaseException:
+            tm.abort()
+            raise
+        finally:
+            connection.close()
@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from zodbapp.zeo import start_zeo_subprocess
+
+
+class Command(BaseCommand):
+    help = "Run a ZEO server for ZODB_FILE_PATH on ZEO_ADDRESS."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--address", default=settings.ZEO_ADDRESS)
+        parser.add_argument("--file", default=settings.ZODB_FILE_PATH)
+
+    def handle(self, *args, **options):
+        os.makedirs(os.path.dirname(os.path.abspath(options["file"])), exist_ok=True)
+        process = start_zeo_subprocess(options["address"], options["file"])
+        self.stdout.write(self.style.SUCCESS(f"ZEO serving {options['file']} on {options['address']}"))
+        try:
+            process.wait()
+        except KeyboardInterrupt:
+            process.terminate()
+            process.wait()
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+import transaction
+from BTrees.OOBTree import OOBTree
+from django.core.management.base import BaseCommand, CommandError
+from ZODB.DB import DB
+from ZODB.POSException import ConflictError
+
+from zodbapp.zeo import find_free_port, start_zeo_subprocess
+
+
+def _worker(args) -> tuple[int, int]:
+    from ZEO.ClientStorage import ClientStorage
+
+    worker, address, writes, batch = args
+    db = DB(ClientStorage(address), pool_size=1)
+    conflicts = 0
+    try:
+        connection = db.open()
+        written = 0
+        while written < writes:
+            size = min(batch, writes - written)
+            try:
+                tree = connection.root()["stress"]
+                for i in range(written, written + size):
+                    tree[f"w{worker}-{i}"] = i
+                transaction.commit()
+                written += size
+            except ConflictError:
+                transaction.abort()
+                conflicts += 1
+                time.sleep(random.uniform(0, 0.005))
+        connection.close()
+    finally:
+        db.close()
+    return written, conflicts
+
+
+class Command(BaseCommand):
+    help = "Start a local ZEO server and hammer it from several worker processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+        parser.add_argument("--writes", type=int, default=2000, help="Keys written per worker")
+        parser.add_argument("--batch", type=int, default=10, help="Keys per transaction")
+
+    def handle(self, *args, **options):
+        from ZEO.ClientStorage import ClientStorage
+
+        workers = options["workers"]
+        writes = options["writes"]
+        with tempfile.TemporaryDirectory() as tmp:
+            port = find_free_port()
+            server = start_zeo_subprocess(f"127.0.0.1:{port}", os.path.join(tmp, "Data.fs"))
+            address = ("127.0.0.1", port)
+            try:
+                db = DB(ClientStorage(address))
+                with db.transaction() as connection:
+                    connection.root()["stress"] = OOBTree()
+
+                started = time.perf_counter()
+                with multiprocessing.Pool(workers) as pool:
+                    results = pool.map(
+                        _worker,
+                        [(worker, address, writes, options["batch"]) for worker in range(workers)],
+                    )
+                elapsed = time.perf_counter() - started
+
+                with db.transaction() as connection:
+                    stored = len(connection.root()["stress"])
+                db.close()
+            finally:
+                server.terminate()
+                server.wait()
+
+        written = sum(r[0] for r in results)
+        conflicts = sum(r[1] for r in results)
+        self.stdout.write(
+            f"{workers} workers wrote {written} keys in {elapsed:.2f}s "
+            f"({written / elapsed:.0f} keys/s), {conflicts} conflicts retried"
+        )
+        if stored != workers * writes:
+            raise CommandError(f"Expected {workers * writes} keys, found {stored}")
+        self.stdout.write(self.style.SUCCESS("ZEO stress run OK"))
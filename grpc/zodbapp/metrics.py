@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import bisect
+import threading
+from typing import Any, Callable, Sequence
+
+
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self) -> dict[str, Any]:
+        cumulative = []
+        running = 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            running += count
+            cumulative.append((bound, running))
+        return {"buckets": cumulative, "sum": self.sum, "count": self.count}
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: dict[str, float] = {}
+        self._histograms: dict[str, Histogram] = {}
+        self._collectors: list[Callable[[], dict[str, float]]] = []
+
+    def add_collector(self, collector: Callable[[], dict[str, float]]) -> None:
+        # Collectors are called on every scrape and return gauge values that
+        # live outside this process (e.g. state stored in ZODB).
+        self._collectors.append(collector)
+
+    def collect(self) -> dict[str, float]:
+        gauges: dict[str, float] = {}
+        for collector in list(self._collectors):
+            gauges.update(collector())
+        return gauges
+
+    def increment(self, name: str, amount: float = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def observe(self, name: str, value: float, buckets: Sequence[float] = COUNT_BUCKETS) -> None:
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram(buckets)
+            histogram.observe(value)
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "histograms": {name: h.snapshot() for name, h in self._histograms.items()},
+            }
+
+
+registry = MetricsRegistry()
+
+
+def render_prometheus(snapshot: dict[str, Any], gauges: dict[str, float]) -> str:
+    lines = []
+    for name, value in sorted(snapshot["counters"].items()):
+        lines.append(f"# TYPE {name}_total counter")
+        lines.append(f"{name}_total {value}")
+    for name, value in sorted(gauges.items()):
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    for name, histogram in sorted(snapshot["histograms"].items()):
+        lines.append(f"# TYPE {name} histogram")
+        for bound, count in histogram["buckets"]:
+            lines.append(f'{name}_bucket{{le="{bound}"}} {count}')
+        lines.append(f"{name}_sum {histogram['sum']}")
+        lines.append(f"{name}_count {histogram['count']}")
+    return "\n".join(lines) + "\n"
@@ -1,10 +1,136 @@
 from __future__ import annotations
 
+import contextlib
+import logging
+import random
+import threading
+import time
 from typing import Callable
 
 import transaction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections, transaction as db_transaction
+from django.http import HttpResponse
+from django.utils.functional import SimpleLazyObject
+from ZODB.POSException import ConflictError
 
-from .zodb import open_connection
+from . import profiling
+from .metrics import LATENCY_BUCKETS, registry
+from .zodb import conflict_backoff, open_connection
+
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "TRACE"})
+
+
+class RequestZODB:
+    def __init__(self, read_only: bool):
+        self.read_only = read_only
+        self._connection = None
+        self._root = None
+
+    @property
+    def opened(self) -> bool:
+        return self._connection is not None
+
+    def _open(self) -> None:
+        if self._connection is None:
+            started = time.perf_counter()
+            self._connection, self._root = open_connection()
+            profiling.record("zodb_open", time.perf_counter() - started)
+            self._connection.getTransferCounts(clear=True)
+            registry.increment("zodb_connections_opened")
+
+    @property
+    def connection(self):
+        self._open()
+        return self._connection
+
+    @property
+    def root(self):
+        self._open()
+        return self._root
+
+    @property
+    def changed(self) -> bool:
+        return self.opened and self._connection.modified
+
+    def finish(self) -> None:
+        if not self.changed:
+            transaction.abort()
+            return
+        if self.read_only:
+            logger.warning("Discarding ZODB changes made during a read-only request")
+            transaction.abort()
+            return
+        started = time.perf_counter()
+        transaction.commit()
+        elapsed = time.perf_counter() - started
+        registry.observe("zodb_commit_seconds", elapsed, LATENCY_BUCKETS)
+        profiling.record("zodb_commit", elapsed)
+        registry.increment("zodb_commits")
+
+    def close(self) -> None:
+        if self._connection is None:
+            return
+        loads, stores = self._connection.getTransferCounts(clear=True)
+        registry.observe("zodb_loads_per_request", loads)
+        registry.observe("zodb_stores_per_request", stores)
+        profiling.count("zodb_loads", loads)
+        profiling.count("zodb_stores", stores)
+        self._connection.close()
+        self._connection = self._root = None
+
+
+class RequestProfilingMiddleware:
+    # Sits just outside ZODBTransactionMiddleware so the breakdown includes
+    # its connection open and commit. Timings stop when the view returns, so
+    # the body of a streaming response is not covered.
+    def __init__(self, get_response: Callable):
+        if not settings.REQUEST_PROFILING_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profile = profiling.RequestProfile()
+        sampler = None
+        if random.random() < settings.REQUEST_PROFILING_SAMPLE_RATE:
+            sampler = profiling.StackSampler(
+                threading.get_ident(), settings.REQUEST_PROFILING_SAMPLE_INTERVAL_MS / 1000.0
+            )
+            sampler.start()
+        try:
+            with profiling.activate(profile), contextlib.ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profiling.sql_wrapper))
+                response = self.get_response(request)
+        finally:
+            profile.finish()
+            if sampler is not None:
+                sampler.stop()
+        response["Server-Timing"] = profile.server_timing()
+
+        entry = {
+            "method": request.method,
+            "path": request.get_full_path(),
+            "status": response.status_code,
+            "at": time.time(),
+            "total_ms": round(profile.total * 1000, 2),
+            "phases_ms": {name: round(seconds * 1000, 2) for name, seconds in profile.phases.items()},
+            "counts": profile.counts,
+            "stacks": None,
+        }
+        if sampler is not None and profile.total * 1000 >= settings.REQUEST_PROFILING_SAMPLE_THRESHOLD_MS:
+            try:
+                entry["stacks"] = profiling.dump_stacks(
+                    settings.REQUEST_PROFILING_DIR, request.method, request.path, profile.total, sampler
+                )
+            except OSError:
+                logger.exception("Could not write profile stacks")
+        profiling.slowest().add(profile.total, entry)
+        return response
 
 
 class ZODBTransactionMiddleware:
@@ -12,17 +138,48 @@ class ZODBTransactionMiddleware:
         self.get_response = get_response
 
     def __call__(self, request):
-        connection, root = open_connection()
-        request.zodb_connection = connection
-        request.zodb_root = root
+        retries = settings.ZODB_CONFLICT_RETRIES
+        for attempt in range(retries + 1):
+            try:
+                return self._attempt(request)
+            except ConflictError:
+                registry.increment("zodb_conflicts")
+                if attempt == retries:
+                    raise
+                registry.increment("zodb_conflict_retries")
+                profiling.count("zodb_retries")
+                conflict_backoff(attempt)
+
+    def _attempt(self, request):
+        read_only = request.method in SAFE_METHODS
+        zodb = RequestZODB(read_only=read_only)
+        request.zodb = zodb
+        request.zodb_connection = SimpleLazyObject(lambda: zodb.connection)
+        request.zodb_root = SimpleLazyObject(lambda: zodb.root)
+        request._zodb_conflict = None
         try:
-            response = self.get_response(request)
-            transaction.commit()
+            # SQL written by a write request commits together with ZODB, so a
+            # retried attempt does not leave rows from the failed one behind.
+            with contextlib.nullcontext() if read_only else db_transaction.atomic():
+                response = self.get_response(request)
+                if request._zodb_conflict is not None:
+                    if not read_only:
+                        db_transaction.set_rollback(True)
+                    raise request._zodb_conflict
+                zodb.finish()
             return response
         except Exception:
             transaction.abort()
             raise
         finally:
-            connection.close()
-
+            zodb.close()
 
+    def process_exception(self, request, exception):
+        # Django turns view exceptions into logged 500 responses before they
+        # reach __call__. Answer conflicts with a placeholder instead, which
+        # _attempt swaps for the stored conflict so the request is retried;
+        # only a conflict on the last attempt is logged.
+        if isinstance(exception, ConflictError):
+            request._zodb_conflict = exception
+            return HttpResponse(status=409)
+        return None
@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import heapq
+import itertools
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Iterator, Optional
+
+from django.conf import settings
+
+
+@dataclass
+class RequestProfile:
+    # Seconds spent per phase and counters (SQL queries, ZODB loads, ...)
+    # for one request; whatever is not claimed by a phase is reported as "app".
+    started: float = field(default_factory=time.perf_counter)
+    phases: dict[str, float] = field(default_factory=dict)
+    counts: dict[str, int] = field(default_factory=dict)
+    total: float = 0.0
+
+    def add(self, phase: str, seconds: float) -> None:
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def count(self, name: str, amount: int = 1) -> None:
+        self.counts[name] = self.counts.get(name, 0) + amount
+
+    def finish(self) -> None:
+        self.total = time.perf_counter() - self.started
+        self.phases["app"] = max(0.0, self.total - sum(s for p, s in self.phases.items() if p != "app"))
+
+    def server_timing(self) -> str:
+        parts = [f"total;dur={self.total * 1000:.1f}"]
+        for phase, seconds in self.phases.items():
+            desc = ""
+            if phase == "sql":
+                desc = f';desc="{self.counts.get("sql_queries", 0)} queries"'
+            parts.append(f"{phase};dur={seconds * 1000:.1f}{desc}")
+        if "zodb_loads" in self.counts:
+            parts.append(f'zodb;desc="{self.counts["zodb_loads"]} loads"')
+        return ", ".join(parts)
+
+
+_current: contextvars.ContextVar[Optional[RequestProfile]] = contextvars.ContextVar("request_profile", default=None)
+
+
+def current() -> Optional[RequestProfile]:
+    return _current.get()
+
+
+@contextlib.contextmanager
+def activate(profile: RequestProfile) -> Iterator[RequestProfile]:
+    token = _current.set(profile)
+    try:
+        yield profile
+    finally:
+        _current.reset(token)
+
+
+def record(phase: str, seconds: float) -> None:
+    profile = _current.get()
+    if profile is not None:
+        profile.add(phase, seconds)
+
+
+def count(name: str, amount: int = 1) -> None:
+    profile = _current.get()
+    if profile is not None:
+        profile.count(name, amount)
+
+
+@contextlib.contextmanager
+def phase(name: str) -> Iterator[None]:
+    # Times a block of a view (e.g. serialization) when the request is being
+    # profiled; a no-op otherwise.
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add(name, time.perf_counter() - started)
+
+
+def sql_wrapper(execute, sql, params, many, context):
+    # Installed with connection.execute_wrapper() for the whole request.
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        record("sql", time.perf_counter() - started)
+        count("sql_queries")
+
+
+class SlowestRequests:
+    # The N slowest requests seen by this process, kept in a min-heap so a
+    # faster request is rejected by one comparison.
+    def __init__(self, size: int):
+        self.size = size
+        self._heap: list[tuple[float, int, dict[str, Any]]] = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float, entry: dict[str, Any]) -> None:
+        if self.size <= 0:
+            return
+        item = (seconds, next(self._seq), entry)
+        with self._lock:
+            if len(self._heap) < self.size:
+                heapq.heappush(self._heap, item)
+            elif seconds > self._heap[0][0]:
+                heapq.heapreplace(self._heap, item)
+
+    def snapshot(self) -> list[dict[str, Any]]:
+        with self._lock:
+            items = sorted(self._heap, key=lambda item: -item[0])
+        return [entry for _seconds, _seq, entry in items]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._heap.clear()
+
+
+_slowest: Optional[SlowestRequests] = None
+
+
+def slowest() -> SlowestRequests:
+    global _slowest
+    if _slowest is None:
+        _slowest = SlowestRequests(settings.REQUEST_PROFILING_SLOWEST)
+    return _slowest
+
+
+class StackSampler:
+    # Samples one thread's Python stack every ``interval`` seconds from a
+    # background thread and counts the stacks in collapsed form
+    # ("outer;...;inner count"), which flamegraph.pl and speedscope read.
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if names:
+                self.stacks[";".join(reversed(names))] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {samples}\n" for stack, samples in self.stacks.most_common())
+
+
+def dump_stacks(directory: str, method: str, path: str, seconds: float, sampler: StackSampler) -> str:
+    os.makedirs(directory, exist_ok=True)
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_")[:80] or "root"
+    name = f"{time.strftime('%Y%m%dT%H%M%S')}-{method}-{slug}-{seconds * 1000:.0f}ms.folded"
+    filename = os.path.join(directory, name)
+    with open(filename, "w") as fh:
+        fh.write(sampler.collapsed())
+    return filename
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import threading
+
+import transaction
+from django.test import SimpleTestCase
+from ZODB import DB
+from ZODB.MappingStorage import MappingStorage
+
+from zodbapp.groupcommit import GroupCommitter
+
+
+class GroupCommitterTests(SimpleTestCase):
+    def setUp(self):
+        self.db = DB(MappingStorage())
+        self.addCleanup(self.db.close)
+
+    def _work(self, key):
+        def work(root):
+            root[key] = threading.current_thread().name
+            return key
+
+        return work
+
+    def test_batches_commit_on_committer_thread(self):
+        contexts = []
+
+        def before_commit(root, values):
+            contexts.append((threading.current_thread().name, sorted(values)))
+
+        committer = GroupCommitter(lambda: self.db, window=0.05, max_batch=64, before_commit=before_commit)
+        results = {}
+        threads = [
+            threading.Thread(target=lambda k=f"k{i}": results.update({k: committer.submit(self._work(k))}))
+            for i in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(results), sorted(results.values()))
+        self.assertEqual({name for name, _values in contexts}, {"group-commit"})
+        self.assertEqual(sorted(v for _name, values in contexts for v in values), sorted(results))
+        connection = self.db.open(transaction_manager=transaction.TransactionManager())
+        self.assertEqual({connection.root()[key] for key in results}, {"group-commit"})
+        connection.close()
+
+    def test_failing_item_does_not_fail_its_batch(self):
+        committer = GroupCommitter(lambda: self.db, window=0.05, max_batch=64)
+        errors = []
+
+        def bad(root):
+            raise ValueError("bad")
+
+        def submit(work):
+            try:
+                committer.submit(work)
+            except ValueError as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=submit, args=(work,)) for work in (self._work("ok"), bad)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(errors), 1)
+        connection = self.db.open(transaction_manager=transaction.TransactionManager())
+        self.assertIn("ok", connection.root())
+        connection.close()
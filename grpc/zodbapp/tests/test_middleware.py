@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from django.http import HttpResponse
+from django.test import SimpleTestCase, override_settings
+from django.urls import path
+from ZODB.POSException import ConflictError
+
+
+attempts = []
+
+
+def conflicting(request):
+    attempts.append(request.method)
+    if len(attempts) < 2:
+        raise ConflictError()
+    return HttpResponse("ok")
+
+
+def always_conflicting(request):
+    raise ConflictError()
+
+
+urlpatterns = [
+    path("conflicting", conflicting),
+    path("always-conflicting", always_conflicting),
+]
+
+
+@override_settings(
+    ROOT_URLCONF=__name__,
+    MIDDLEWARE=["zodbapp.middleware.ZODBTransactionMiddleware"],
+    ZODB_CONFLICT_RETRIES=2,
+    ZODB_CONFLICT_BACKOFF_MS=0,
+)
+class ZODBTransactionMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        attempts.clear()
+
+    def test_conflict_is_retried_without_error_log(self):
+        with self.assertNoLogs("django.request"):
+            response = self.client.get("/conflicting")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(attempts, ["GET", "GET"])
+
+    def test_last_conflict_is_raised(self):
+        with self.assertRaises(ConflictError):
+            self.client.get("/always-conflicting")
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+import tempfile
+import time
+
+import transaction
+from django.test import SimpleTestCase, override_settings
+from persistent.mapping import PersistentMapping
+
+from zodbapp import zodb
+from zodbapp.zeo import find_free_port, start_zeo_subprocess
+
+
+WORKERS = 3
+
+
+def _worker(number, number_of_workers, barrier, results) -> None:
+    # Runs in a forked child: get_db() must open a client of its own rather
+    # than reuse the parent's.
+    db = zodb.get_db()
+    for manager in zodb.ZODBManager.attempts(retries=20):
+        with manager as ctx:
+            ctx.root[f"worker-{number}"] = os.getpid()
+    # Every worker holds its cache slot at the same time.
+    barrier.wait(timeout=30)
+    # Invalidations from the other clients arrive asynchronously, so a new
+    # transaction can start before the last commit is visible.
+    deadline = time.monotonic() + 10
+    while True:
+        with db.transaction() as connection:
+            seen = sorted(key for key in connection.root() if key.startswith("worker-"))
+        if len(seen) >= number_of_workers or time.monotonic() > deadline:
+            break
+        time.sleep(0.05)
+    results.put(
+        {
+            "number": number,
+            "same_db": db is zodb.get_db(),
+            "cache_path": db.storage._cache.path,
+            "cache_bytes": db.storage._cache.maxsize,
+            "pool_size": db.getPoolSize(),
+            "cache_size": db.getCacheSize(),
+            "seen": seen,
+        }
+    )
+    db.close()
+
+
+class ZEOWorkerTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        tmp = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(tmp.cleanup)
+        cls.tmp = tmp.name
+        port = find_free_port()
+        server = start_zeo_subprocess(f"127.0.0.1:{port}", os.path.join(cls.tmp, "Data.fs"))
+
+        def stop():
+            server.terminate()
+            server.wait()
+
+        cls.addClassCleanup(stop)
+        cls.address = f"127.0.0.1:{port}"
+
+    def setUp(self):
+        self.cache_dir = os.path.join(self.tmp, f"cache-{self._testMethodName}")
+        settings = override_settings(
+            ZODB_STORAGE="zeo",
+            ZEO_ADDRESS=self.address,
+            ZEO_CLIENT_CACHE_DIR=self.cache_dir,
+            ZEO_CLIENT_CACHE_NAME="test",
+            ZEO_CLIENT_CACHE_SLOTS=WORKERS + 1,
+            ZEO_CLIENT_CACHE_SIZE_MB=2,
+            ZODB_POOL_SIZE=2,
+            ZODB_CACHE_SIZE=10,
+            ZODB_CACHE_SIZE_BYTES=0,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(self._reset_db)
+
+    def _reset_db(self):
+        if zodb._db is not None and zodb._db_pid == os.getpid():
+            zodb._db.close()
+        zodb._db = zodb._db_pid = None
+        if zodb._cache_slot_lock is not None:
+            zodb._cache_slot_lock.close()
+            zodb._cache_slot_lock = None
+
+    def _run_workers(self, numbers):
+        context = multiprocessing.get_context("fork")
+        barrier = context.Barrier(len(numbers))
+        results = context.Queue()
+        processes = [context.Process(target=_worker, args=(number, len(numbers), barrier, results)) for number in numbers]
+        for process in processes:
+            process.start()
+        collected = [results.get(timeout=60) for _process in processes]
+        for process in processes:
+            process.join(timeout=60)
+            self.assertEqual(process.exitcode, 0)
+        return sorted(collected, key=lambda result: result["number"])
+
+    def test_workers_claim_separate_cache_slots(self):
+        # The parent holds slot 0, as a server's master process would.
+        zodb.get_db()
+        results = self._run_workers(range(WORKERS))
+
+        paths = [result["cache_path"] for result in results]
+        self.assertEqual(len(set(paths)), WORKERS)
+        for slot in range(1, WORKERS + 1):
+            self.assertIn(os.path.join(self.cache_dir, f"test-{slot}-1.zec"), paths)
+        for result in results:
+            self.assertTrue(result["same_db"])
+            self.assertEqual(result["cache_bytes"], 2 * 1024 * 1024)
+            self.assertEqual(result["pool_size"], 2)
+            self.assertEqual(result["cache_size"], 10)
+            # Each worker sees the others' commits through the server.
+            self.assertEqual(result["seen"], [f"worker-{number}" for number in range(WORKERS)])
+
+        # A restarted worker takes the first free slot and its cache file.
+        [restarted] = self._run_workers([WORKERS])
+        self.assertEqual(restarted["cache_path"], os.path.join(self.cache_dir, "test-1-1.zec"))
+
+    def test_slots_exhausted(self):
+        with override_settings(ZEO_CLIENT_CACHE_SLOTS=1):
+            zodb.get_db()
+            with self.assertRaisesRegex(RuntimeError, "No free ZEO client cache slot"):
+                zodb.open_storage()
+
+    def test_pool_and_cache_size(self):
+        db = zodb.get_db()
+        with db.transaction() as connection:
+            connection.root()["items"] = [PersistentMapping(n=n) for n in range(50)]
+
+        tm = transaction.TransactionManager()
+        connection = db.open(transaction_manager=tm)
+        self.assertEqual(sum(item["n"] for item in connection.root()["items"]), sum(range(50)))
+        connection.cacheGC()
+        self.assertLessEqual(db.cacheSize(), 10)
+        tm.abort()
+        connection.close()
+
+        client_cache = zodb.db_stats(db)["client_cache"]
+        self.assertEqual(client_cache["size_bytes"], 2 * 1024 * 1024)
+        self.assertGreater(client_cache["adds"], 0)
+
+        # Connections beyond the pool size are discarded when closed.
+        opened = [db.open(transaction_manager=transaction.TransactionManager()) for _ in range(4)]
+        for connection in opened:
+            connection.close()
+        self.assertEqual(len(db.connectionDebugInfo()), 2)
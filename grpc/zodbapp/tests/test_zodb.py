@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import transaction
+from BTrees.OOBTree import OOBTree
+from django.test import SimpleTestCase
+from persistent.mapping import PersistentMapping
+from ZODB.MappingStorage import MappingStorage
+
+from zodbapp.zodb import TrackingDB, db_stats
+
+
+class TrackingConnectionTests(SimpleTestCase):
+    def setUp(self):
+        self.db = TrackingDB(MappingStorage())
+        self.addCleanup(self.db.close)
+        with self.db.transaction() as connection:
+            connection.root()["tree"] = OOBTree()
+        self.tm = transaction.TransactionManager()
+        self.connection = self.db.open(transaction_manager=self.tm)
+        self.addCleanup(self.connection.close)
+
+    def test_reads_are_not_changes(self):
+        self.assertEqual(len(self.connection.root()["tree"]), 0)
+        self.assertFalse(self.connection.modified)
+
+    def test_modification_until_commit(self):
+        self.connection.root()["tree"]["a"] = 1
+        self.assertTrue(self.connection.modified)
+        self.tm.commit()
+        self.assertFalse(self.connection.modified)
+
+    def test_new_object_until_abort(self):
+        self.connection.add(PersistentMapping())
+        self.assertTrue(self.connection.modified)
+        self.tm.abort()
+        self.assertFalse(self.connection.modified)
+
+
+class DbStatsTests(SimpleTestCase):
+    def test_connection_caches(self):
+        db = TrackingDB(MappingStorage())
+        self.addCleanup(db.close)
+        with db.transaction() as connection:
+            connection.root()["items"] = [PersistentMapping(n=n) for n in range(5)]
+        tm = transaction.TransactionManager()
+        connection = db.open(transaction_manager=tm)
+        self.addCleanup(connection.close)
+        for item in connection.root()["items"]:
+            item["n"]
+
+        stats = db_stats(db)
+        self.assertEqual(stats["connections"], 1)
+        self.assertEqual(stats["cache_non_ghosts"], 6)
+        self.assertEqual(stats["connection_caches"][0]["non_ghosts"], 6)
+        self.assertNotIn("client_cache", stats)
@@ -0,0 +1,9 @@
+from django.urls import path
+
+from . import views
+
+
+urlpatterns = [
+    path("api/_metrics/zodb", views.zodb_metrics, name="zodb_metrics"),
+    path("api/_debug/requests", views.slowest_requests, name="slowest_requests"),
+]
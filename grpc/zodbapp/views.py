@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse
+
+from . import profiling
+from .metrics import registry, render_prometheus
+from .zodb import db_stats, get_db
+
+
+def zodb_metrics(request):
+    if not settings.ZODB_METRICS_ENABLED:
+        raise Http404()
+    stats = db_stats(get_db())
+    snapshot = registry.snapshot()
+    collected = registry.collect()
+    if request.GET.get("format") == "prometheus":
+        gauges = {
+            f"zodb_{key}": value
+            for key, value in stats.items()
+            if isinstance(value, (int, float)) and not isinstance(value, bool)
+        }
+        for key, value in stats.get("client_cache", {}).items():
+            gauges[f"zodb_client_cache_{key}"] = value
+        gauges.update(collected)
+        return HttpResponse(
+            render_prometheus(snapshot, gauges),
+            content_type="text/plain; version=0.0.4",
+        )
+    return JsonResponse({"db": stats, "gauges": collected, **snapshot})
+
+
+def slowest_requests(request):
+    if not (settings.ZODB_METRICS_ENABLED and settings.REQUEST_PROFILING_ENABLED):
+        raise Http404()
+    return JsonResponse({"requests": profiling.slowest().snapshot()})
@@ -0,0 +1,12 @@
+from __future__ import annotations
+
+import django
+from django.apps import apps
+
+
+def init_django() -> None:
+    # ProcessPoolExecutor initializer. Spawned and forkserver workers start
+    # without Django; forked ones already have it. This module imports no
+    # models, so a worker can unpickle the initializer before setup.
+    if not apps.ready:
+        django.setup()
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import socket
+import subprocess
+import sys
+import time
+
+
+def find_free_port(host: str = "127.0.0.1") -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(host: str, port: int, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"ZEO server did not start on {host}:{port}")
+            time.sleep(0.1)
+
+
+def start_zeo_subprocess(address: str, file_path: str, wait: bool = True) -> subprocess.Popen:
+    process = subprocess.Popen(
+        [sys.executable, "-m", "ZEO.runzeo", "-a", address, "-f", file_path]
+    )
+    if wait and "/" not in address:
+        host, _, port = address.rpartition(":")
+        try:
+            wait_for_port(host or "127.0.0.1", int(port))
+        except TimeoutError:
+            process.terminate()
+            raise
+    return process
@@ -1,37 +1,172 @@
 from __future__ import annotations
 
 import os
+import random
+import time
 from dataclasses import dataclass
-from typing import Optional
+from typing import Any, Optional
 
 import ZODB
+from ZODB.Connection import Connection
 from ZODB.DB import DB
 from ZODB.FileStorage import FileStorage
+from ZODB.POSException import ConflictError
 import transaction
+import zc.lockfile
 
 from django.conf import settings
 
+from .metrics import LATENCY_BUCKETS, registry
+
 
 _db: Optional[DB] = None
+_db_pid: Optional[int] = None
+_cache_slot_lock = None
 
 
-def get_db() -> DB:
-    global _db
-    if _db is None:
+def parse_zeo_address(address: str):
+    if "/" in address:
+        return address
+    host, _, port = address.rpartition(":")
+    return (host or "127.0.0.1", int(port))
+
+
+def _claim_cache_slot(cache_dir: str, name: str) -> str:
+    # ZEO persistent caches are single-process; give each worker the first
+    # free numbered slot so a restarted worker reuses a warm cache file.
+    global _cache_slot_lock
+    os.makedirs(cache_dir, exist_ok=True)
+    for slot in range(settings.ZEO_CLIENT_CACHE_SLOTS):
+        try:
+            _cache_slot_lock = zc.lockfile.LockFile(os.path.join(cache_dir, f"{name}-{slot}.slot"))
+        except zc.lockfile.LockError:
+            continue
+        return f"{name}-{slot}"
+    raise RuntimeError(f"No free ZEO client cache slot in {cache_dir}")
+
+
+def open_storage():
+    if settings.ZODB_STORAGE == "file":
         file_path = settings.ZODB_FILE_PATH
         os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        storage = FileStorage(file_path)
-        _db = DB(storage)
+        return FileStorage(file_path)
+    if settings.ZODB_STORAGE == "zeo":
+        from ZEO.ClientStorage import ClientStorage
+
+        client = None
+        cache_dir = settings.ZEO_CLIENT_CACHE_DIR or None
+        if cache_dir:
+            client = _claim_cache_slot(cache_dir, settings.ZEO_CLIENT_CACHE_NAME)
+        return ClientStorage(
+            parse_zeo_address(settings.ZEO_ADDRESS),
+            cache_size=settings.ZEO_CLIENT_CACHE_SIZE_MB * 1024 * 1024,
+            client=client,
+            var=cache_dir,
+            wait_timeout=settings.ZEO_WAIT_TIMEOUT,
+        )
+    raise ValueError(f"Unknown ZODB_STORAGE: {settings.ZODB_STORAGE!r}")
+
+
+class TrackingConnection(Connection):
+    # Records whether the current transaction modified or added anything.
+    # Persistent objects report every change through register() (which ZODB
+    # documents as overridable) and new objects go through add(); the flag is
+    # cleared whenever the transaction manager starts or completes one.
+    modified = False
+
+    def register(self, obj):
+        self.modified = True
+        super().register(obj)
+
+    def add(self, obj):
+        self.modified = True
+        super().add(obj)
+
+    def newTransaction(self, transaction, sync=True):
+        self.modified = False
+        super().newTransaction(transaction, sync)
+
+    def afterCompletion(self, transaction):
+        self.modified = False
+        super().afterCompletion(transaction)
+
+
+class TrackingDB(DB):
+    # Set on the class: DB() already pools the connection it creates the root
+    # object with.
+    klass = TrackingConnection
+
+
+def get_db() -> DB:
+    global _db, _db_pid
+    if _db is None or _db_pid != os.getpid():
+        # A DB inherited across fork() shares the parent's storage socket or
+        # file lock, so every worker process opens its own.
+        _db = TrackingDB(
+            open_storage(),
+            pool_size=settings.ZODB_POOL_SIZE,
+            cache_size=settings.ZODB_CACHE_SIZE,
+            cache_size_bytes=settings.ZODB_CACHE_SIZE_BYTES,
+        )
+        _db_pid = os.getpid()
     return _db
 
 
 def open_connection():
     db = get_db()
+    started = time.perf_counter()
     connection = db.open()
+    registry.observe("zodb_connection_open_seconds", time.perf_counter() - started, LATENCY_BUCKETS)
     root = connection.root()
     return connection, root
 
 
+def db_stats(db: DB) -> dict[str, Any]:
+    # No object-cache hit ratio: persistent's cache records an access by
+    # moving the object in its LRU ring, without a counter or hook, so only
+    # the misses (zodb_loads_per_request) can be measured.
+    connections = [
+        {"connection": detail["connection"], "objects": detail["size"], "non_ghosts": detail["ngsize"]}
+        for detail in db.cacheDetailSize()
+    ]
+    stats: dict[str, Any] = {
+        "storage": settings.ZODB_STORAGE,
+        "storage_size_bytes": db.getSize(),
+        "pool_size": db.getPoolSize(),
+        "connections": len(connections),
+        "cache_size": db.getCacheSize(),
+        "cache_size_bytes": db.getCacheSizeBytes(),
+        "cache_objects": sum(c["objects"] for c in connections),
+        "cache_non_ghosts": db.cacheSize(),
+        "connection_caches": connections,
+    }
+    client_cache = getattr(db.storage, "_cache", None)
+    if client_cache is not None and hasattr(client_cache, "getStats"):
+        # The ZEO client cache answers connection-cache misses (the storage
+        # loads in zodb_loads_per_request) without a server round trip when
+        # it can. Its counters cover every connection of this process since
+        # the cache was opened, so they are reported on their own rather than
+        # as a ratio of the per-request loads.
+        adds, added_bytes, evicts, evicted_bytes, hits = client_cache.getStats()
+        stats["client_cache"] = {
+            "size_bytes": client_cache.maxsize,
+            "objects": len(client_cache),
+            "hits": hits,
+            "adds": adds,
+            "added_bytes": added_bytes,
+            "evictions": evicts,
+            "evicted_bytes": evicted_bytes,
+        }
+    return stats
+
+
+def conflict_backoff(attempt: int) -> None:
+    # Full jitter: concurrent losers of the same conflict spread out instead
+    # of colliding again on the next attempt.
+    ceiling = settings.ZODB_CONFLICT_BACKOFF_MS / 1000.0 * (2 ** attempt)
+    time.sleep(random.uniform(0, ceiling))
+
+
 @dataclass
 class ZODBContext:
     connection: any
@@ -39,15 +174,46 @@ class ZODBContext:
 
 
 class ZODBManager:
+    def __init__(self, retry_conflicts: bool = False):
+        self.retry_conflicts = retry_conflicts
+        self.conflicted = False
+
+    @classmethod
+    def attempts(cls, retries: Optional[int] = None):
+        # for manager in ZODBManager.attempts():
+        #     with manager as ctx:
+        #         ...
+        if retries is None:
+            retries = settings.ZODB_CONFLICT_RETRIES
+        for attempt in range(retries + 1):
+            manager = cls(retry_conflicts=attempt < retries)
+            yield manager
+            if not manager.conflicted:
+                return
+            registry.increment("zodb_conflict_retries")
+            conflict_backoff(attempt)
+
     def __enter__(self) -> ZODBContext:
         self.connection, self.root = open_connection()
         return ZODBContext(connection=self.connection, root=self.root)
 
     def __exit__(self, exc_type, exc, tb):
-        if exc is None:
-            transaction.commit()
-        else:
-            transaction.abort()
-        self.connection.close()
-
-
+        try:
+            if exc is None:
+                try:
+                    transaction.commit()
+                except ConflictError:
+                    transaction.abort()
+                    registry.increment("zodb_conflicts")
+                    if not self.retry_conflicts:
+                        raise
+                    self.conflicted = True
+            else:
+                transaction.abort()
+                if isinstance(exc, ConflictError):
+                    registry.increment("zodb_conflicts")
+                    if self.retry_conflicts:
+                        self.conflicted = True
+                        return True
+        finally:
+            self.connection.close()